@@ -1,73 +1,217 @@
-from aws_tools.all_tools import stock_performance_returns, get_news_for_stock, code_execution_tool, get_technical_analysis_for_stock, get_financial_info_for_stock, stock_performance_returns
-from bedrock_agentcore.tools.code_interpreter_client import CodeInterpreter, code_session
-from strands.models import BedrockModel
-from strands import Agent, tool
-from strands_tools import calculator
+from aws_tools.all_tools import stock_performance_returns, get_news_for_stock, get_technical_analysis_for_stock, get_financial_info_for_stock
+from aws_tools.all_tools import code_execution_tool_for, query_market_data, get_daily_features, render_chart, backtest_strategy
+from aws_tools.all_tools import get_news_for_stocks, get_technical_analysis_for_stocks, get_financial_info_for_stocks, stock_performance_returns_for_stocks
+import os
+from aws_runtime.registry import LazyRegistry
+from aws_runtime.model_tiers import tier_configs, tiered_model
+from aws_runtime.instrumentation import tool_timing_hooks
+from aws_runtime.recording import recorded_model, recorded_tools
+from aws_runtime.token_budget import ContextBudget
+from strands import Agent
 from aws_prompts.prompt import *
 
+# Cache points after the system prompt, the tool definitions and the conversation so far, on the models
+# Bedrock supports prompt caching for (Claude); the others ignore it
+PROMPT_CACHE_ENABLED = os.getenv('PROMPT_CACHE_ENABLED', 'true').lower() == 'true'
+PROMPT_CACHE_TTL = os.getenv('PROMPT_CACHE_TTL') or None
 
-Claude37 = BedrockModel(model_id="us.anthropic.claude-3-7-sonnet-20250219-v1:0", max_tokens=64000)
-Llama4 = BedrockModel(model_id="us.meta.llama4-maverick-17b-instruct-v1:0", max_tokens=4096)
-NovaPremier = BedrockModel(model_id="us.amazon.nova-premier-v1:0")
-Claude4 = BedrockModel(model_id="global.anthropic.claude-sonnet-4-20250514-v1:0", max_tokens=64000)
-OpenAI = BedrockModel(model_id="openai.gpt-oss-120b-1:0", region_name="us-west-2", max_tokens=8192)
-Claude4opus = BedrockModel(model_id="us.anthropic.claude-opus-4-20250514-v1:0", max_tokens=32000)
-
-
-
-planner_agent = Agent(
-    name="planner",
-    model=OpenAI,
-    system_prompt=planner_prompt,
-)
-
-
-critic_agent = Agent(
-    name="critic",
-    model=NovaPremier,
-    system_prompt=critic_prompt
-)
-
-financial_analyst_agent = Agent(
-    name="financialAnalyst",
-    model=Claude37,
-    tools=[calculator, get_news_for_stock, get_technical_analysis_for_stock, get_financial_info_for_stock, stock_performance_returns],
-    system_prompt=system_prompt_financial,
-
-)
-
-coding_agent = Agent(
-    name="coder",
-    model=OpenAI,
-    tools=[code_execution_tool],
-    system_prompt=system_prompt_coding,
-)
-
-
-chart_agent = Agent(
-    name="charts",
-    model=Claude4,
-    system_prompt=chart_generator_prompt,
-    tools=[code_execution_tool]
-)
-
-market_data_agent = Agent(
-    name="marketDataResearch",
-    model=Claude37,
-    system_prompt=full_market_data_prompt,
-    tools=[code_execution_tool]
-)
-
-final_response_agent = Agent(
-    name="finalResponse",
-    model=Llama4,
-    system_prompt="""You are an experience HTML coder, make sure all text is properly formatted. 
-                     Do not add explanations just make sure the full text is valid html.
-                     The code can use class names from Tailwind CSS to make things more readable.
-                     If there are headers and titles make sure they use H2/H3. For tables use striped and borders.
-                     Use some colors when needed to highlight important things.
-                     Make sure to format the html to according to the type of information you are presenting, 
-                     add spaces or separator, boxes or other constructs to make the information visually pleasant. Do not start with ````HTML or other markdown style.
-                     Never use white fonts because the background is white
-                     """
-)
+
+def bedrock_model(model_id, region_name=None, max_attempts=None, **config):
+    """A BedrockModel on the shared client of its region, with prompt caching where the model supports it.
+
+    ``max_attempts`` overrides the client's botocore attempts (BEDROCK_MAX_ATTEMPTS). Every call takes a slot from the process-wide Bedrock limiter (BEDROCK_MAX_CONCURRENCY); with RECORD_MODE
+    set it is recorded or replayed (see aws_runtime.recording).
+    """
+    from strands.models import BedrockModel
+    from strands.models.model import CacheConfig
+    from aws_runtime.bedrock_clients import get_bedrock_client
+    from aws_runtime.model_limits import LimitedModel
+
+    if PROMPT_CACHE_ENABLED:
+        config['cache_config'] = CacheConfig(strategy="auto", ttl=PROMPT_CACHE_TTL, tools_ttl=True)
+    model = BedrockModel(model_id=model_id, region_name=region_name, **config)
+    model.client = get_bedrock_client(model.client.meta.region_name, max_attempts)
+    return LimitedModel(recorded_model(model))
+
+
+# Model name -> (model id, region (None: the default region), model settings)
+MODEL_SPECS = {
+    'Claude37': ("us.anthropic.claude-3-7-sonnet-20250219-v1:0", None, {'max_tokens': 64000}),
+    'Llama4': ("us.meta.llama4-maverick-17b-instruct-v1:0", None, {'max_tokens': 4096}),
+    'NovaPremier': ("us.amazon.nova-premier-v1:0", None, {}),
+    'Claude4': ("global.anthropic.claude-sonnet-4-20250514-v1:0", None, {'max_tokens': 64000}),
+    'OpenAI': ("openai.gpt-oss-120b-1:0", "us-west-2", {'max_tokens': 8192}),
+    'Claude4opus': ("us.anthropic.claude-opus-4-20250514-v1:0", None, {'max_tokens': 32000}),
+    'ClaudeHaiku': ("us.anthropic.claude-3-5-haiku-20241022-v1:0", None, {'max_tokens': 8192}),
+}
+
+
+def _build_model(key):
+    name, max_tokens, max_attempts = (key.split(':') + ['', ''])[:3]
+    model_id, region_name, config = MODEL_SPECS[name]
+    if max_tokens:
+        config = dict(config, max_tokens=int(max_tokens))
+    return bedrock_model(model_id, region_name, int(max_attempts) if max_attempts else None, **config)
+
+
+# Models are built (with their Bedrock client) the first time an agent needs them; "name:max_tokens:max_attempts"
+# keys are copies of a model with another output budget or number of botocore attempts
+MODELS = LazyRegistry(_build_model, MODEL_SPECS)
+
+
+def model_variant(name, max_tokens=None, max_attempts=None):
+    """``MODELS[name]``, or a copy of it with a different output budget or botocore attempts; built once."""
+    if not max_tokens and not max_attempts:
+        return MODELS.get(name)
+    return MODELS.get(f'{name}:{max_tokens or ""}:{max_attempts or ""}')
+
+
+# Models per agent role, in order of preference: the next one takes over when a model is throttled, failing or does
+# not start answering within MODEL_FIRST_TOKEN_TIMEOUT; hedged roles also ask it after MODEL_HEDGE_DELAY
+# (see aws_runtime.model_tiers). MODEL_TIERS overrides any of this per role.
+MODEL_ROLES = {
+    'planner': {'models': ['OpenAI', 'Claude4'], 'hedge': True},
+    'critic': {'models': ['NovaPremier', 'Claude4']},
+    'financialAnalyst': {'models': ['Claude37', 'Claude4']},
+    'marketDataResearch': {'models': ['Claude37', 'Claude4']},
+    'coder': {'models': ['OpenAI', 'Claude4']},
+    'charts': {'models': ['Claude4', 'Claude37']},
+    'finalResponse': {'models': ['Llama4', 'ClaudeHaiku'], 'hedge': True},
+    'quickAnswer': {'models': ['ClaudeHaiku', 'Claude4']},
+    'contextSummary': {'models': ['ClaudeHaiku', 'Llama4']},
+}
+ROLE_TIERS = tier_configs(MODEL_ROLES, MODEL_SPECS)
+ROLE_MODELS = LazyRegistry(lambda role: tiered_model(role, ROLE_TIERS[role], model_variant), ROLE_TIERS)
+
+
+def warm_models():
+    """Build every role's models now instead of on first use; returns all built models."""
+    ROLE_MODELS.warm()
+    return MODELS.built()
+
+
+def _agent_tools(name):
+    if name in ('financialAnalyst', 'quickAnswer'):
+        # sympy makes this the slowest import of all; only these two agents use it
+        from strands_tools import calculator
+    if name == 'coder':
+        tools = [code_execution_tool_for("coder")]
+    elif name == 'charts':
+        tools = [render_chart, code_execution_tool_for("charts")]
+    elif name == 'marketDataResearch':
+        tools = [query_market_data, get_daily_features, backtest_strategy, code_execution_tool_for("marketDataResearch")]
+    elif name == 'financialAnalyst':
+        tools = [calculator, get_news_for_stock, get_technical_analysis_for_stock, get_financial_info_for_stock,
+                 stock_performance_returns, get_news_for_stocks, get_technical_analysis_for_stocks,
+                 get_financial_info_for_stocks, stock_performance_returns_for_stocks, query_market_data,
+                 get_daily_features, backtest_strategy]
+    else:
+        tools = [calculator, get_news_for_stocks, get_technical_analysis_for_stocks, get_financial_info_for_stocks,
+                 stock_performance_returns_for_stocks, get_daily_features, query_market_data]
+    return recorded_tools(tools)
+
+
+# Models and tools are stateless and shared; agents hold a conversation, so every request builds its own
+AGENT_TOOLS = LazyRegistry(_agent_tools, ['financialAnalyst', 'coder', 'charts', 'marketDataResearch', 'quickAnswer'])
+
+# Keeps each agent's prompt within AGENT_CONTEXT_BUDGET tokens (see aws_runtime.token_budget)
+context_budget = ContextBudget(summarizer_factory=lambda: create_context_summary_agent())
+
+
+def create_planner_agent():
+    return Agent(
+        name="planner",
+        model=ROLE_MODELS.get("planner"),
+        system_prompt=planner_prompt,
+    )
+
+
+def create_critic_agent():
+    return Agent(
+        name="critic",
+        model=ROLE_MODELS.get("critic"),
+        system_prompt=critic_prompt
+    )
+
+
+def create_financial_analyst_agent():
+    return Agent(
+        name="financialAnalyst",
+        model=ROLE_MODELS.get("financialAnalyst"),
+        tools=AGENT_TOOLS.get("financialAnalyst"),
+        hooks=[tool_timing_hooks, context_budget],
+        system_prompt=system_prompt_financial,
+    )
+
+
+def create_coding_agent():
+    return Agent(
+        name="coder",
+        model=ROLE_MODELS.get("coder"),
+        tools=AGENT_TOOLS.get("coder"),
+        hooks=[tool_timing_hooks, context_budget],
+        system_prompt=system_prompt_coding,
+    )
+
+
+def create_chart_agent():
+    return Agent(
+        name="charts",
+        model=ROLE_MODELS.get("charts"),
+        system_prompt=chart_generator_prompt,
+        tools=AGENT_TOOLS.get("charts"),
+        hooks=[tool_timing_hooks, context_budget],
+    )
+
+
+def create_market_data_agent():
+    return Agent(
+        name="marketDataResearch",
+        model=ROLE_MODELS.get("marketDataResearch"),
+        system_prompt=full_market_data_prompt,
+        tools=AGENT_TOOLS.get("marketDataResearch"),
+        hooks=[tool_timing_hooks, context_budget],
+    )
+
+
+def create_final_response_agent():
+    return Agent(
+        name="finalResponse",
+        model=ROLE_MODELS.get("finalResponse"),
+        system_prompt=html_response_prompt
+    )
+
+
+def create_quick_answer_agent():
+    """Answers simple lookups on its own when the router sends a request past the planner and swarm."""
+    return Agent(
+        name="quickAnswer",
+        model=ROLE_MODELS.get("quickAnswer"),
+        tools=AGENT_TOOLS.get("quickAnswer"),
+        hooks=[tool_timing_hooks, context_budget],
+        system_prompt=quick_answer_prompt,
+    )
+
+
+def create_context_summary_agent():
+    """Condenses an agent's older turns when its prompt outgrows the context budget."""
+    return Agent(
+        name="contextSummary",
+        model=ROLE_MODELS.get("contextSummary"),
+        system_prompt=context_summary_prompt,
+        callback_handler=None,
+    )
+
+
+# Agent name -> factory; every call builds a new agent on the shared models and tools
+AGENT_FACTORIES = {
+    'planner': create_planner_agent,
+    'critic': create_critic_agent,
+    'financialAnalyst': create_financial_analyst_agent,
+    'coder': create_coding_agent,
+    'charts': create_chart_agent,
+    'marketDataResearch': create_market_data_agent,
+    'finalResponse': create_final_response_agent,
+    'quickAnswer': create_quick_answer_agent,
+    'contextSummary': create_context_summary_agent,
+}
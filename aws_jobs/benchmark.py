@@ -0,0 +1,273 @@
+"""Replay a fixed prompt set through the entrypoint against stubbed models and tools.
+
+Usage:
+    python -m aws_jobs.benchmark                             # built-in prompts, 3 runs each
+    python -m aws_jobs.benchmark --runs 10 --concurrency 4 --json report.json
+    python -m aws_jobs.benchmark --prompts prompts.json --mode swarm
+    python -m aws_jobs.benchmark --replay .recordings   # replay a RECORD_MODE=record session instead
+
+Every model answers after a fixed time to first token and at a fixed token rate
+(MODEL_PROFILES) and every tool sleeps for a fixed latency (TOOL_LATENCIES), so
+runs are repeatable, need no AWS credentials and cost nothing. The report lists
+p50/p95 latency and the estimated Bedrock cost per request for each stage of
+the request traces (see aws_runtime.instrumentation). --time-scale shrinks all
+simulated latencies; reported times shrink with it.
+
+With --replay, models and tools answer from a recording of real calls (see
+aws_runtime.recording) at their recorded latency times --time-scale; the
+prompts must be the ones that were recorded.
+"""
+import os
+
+# Every run must reach the graph, and the admission limits must not shape the numbers
+os.environ.setdefault('RESULT_CACHE_BACKEND', 'none')
+os.environ.setdefault('MAX_CONCURRENT_REQUESTS', '1000')
+os.environ.setdefault('PREWARM', 'off')
+
+import argparse
+import asyncio
+import json
+import math
+import time
+
+from strands.event_loop.streaming import process_stream
+from strands.tools.structured_output import convert_pydantic_to_tool_spec
+from strands.tools.tools import PythonAgentTool
+
+import aws_agents.all_agents as all_agents
+import aws_runtime.router as router
+import main
+from aws_runtime.instrumentation import add_trace_listener
+from aws_runtime.recording import (Recorder, RecordingModel, RecordingTool, as_agent_tool, recorded_function,
+                                  recorded_tools)
+
+PROMPTS = [
+    'What is the price of AAPL?',
+    'Show the 1 month return of MSFT and NVDA',
+    'What is the RSI of TSLA?',
+    'Compare the fundamentals and recent news of AMZN and GOOGL and chart their performance this year',
+    'Build a momentum analysis of the largest semiconductor stocks and recommend a portfolio',
+]
+# Seconds to first token and output tokens per second
+MODEL_PROFILES = {
+    'us.anthropic.claude-3-7-sonnet-20250219-v1:0': (1.2, 60),
+    'global.anthropic.claude-sonnet-4-20250514-v1:0': (1.0, 70),
+    'us.anthropic.claude-opus-4-20250514-v1:0': (2.0, 35),
+    'us.anthropic.claude-3-5-haiku-20241022-v1:0': (0.5, 120),
+    'us.meta.llama4-maverick-17b-instruct-v1:0': (0.4, 150),
+    'us.amazon.nova-premier-v1:0': (0.9, 80),
+    'openai.gpt-oss-120b-1:0': (0.5, 200),
+}
+DEFAULT_MODEL_PROFILE = (1.0, 80)
+ANSWER_TOKENS = 400
+# Seconds per tool call
+TOOL_LATENCIES = {'code_execution_tool': 3.0, 'render_chart': 0.3, 'query_market_data': 0.6, 'get_daily_features': 0.2,
+                  'backtest_strategy': 1.0}
+DEFAULT_TOOL_LATENCY = 0.4
+# What the stubbed planner returns in fan-out mode
+STUB_PLAN = {
+    'summary': 'Benchmark plan',
+    'tasks': [
+        {'id': 'fundamentals', 'agent': 'financialAnalyst', 'instruction': 'Fundamentals and news', 'depends_on': []},
+        {'id': 'prices', 'agent': 'marketDataResearch', 'instruction': 'Price history', 'depends_on': []},
+        {'id': 'analysis', 'agent': 'coder', 'instruction': 'Compute statistics', 'depends_on': ['prices']},
+        {'id': 'chart', 'agent': 'charts', 'instruction': 'Chart the analysis', 'depends_on': ['analysis']},
+    ],
+}
+
+
+class StubModel:
+    """Stands in for a BedrockModel: calls the agent's first tool once, then answers, with simulated timing.
+
+    Claude models report the system prompt and tool definitions as a prompt
+    cache write the first time they see them and as a cache read afterwards,
+    as Bedrock does with PROMPT_CACHE_ENABLED.
+    """
+
+    def __init__(self, model_id, time_scale=1.0):
+        self.model_id = model_id
+        self.ttft, self.tokens_per_second = MODEL_PROFILES.get(model_id, DEFAULT_MODEL_PROFILE)
+        self.time_scale = time_scale
+        self.caches = all_agents.PROMPT_CACHE_ENABLED and 'anthropic' in model_id
+        self.cached_prefixes = set()
+
+    def update_config(self, **model_config):
+        pass
+
+    def get_config(self):
+        return {'model_id': self.model_id}
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        """Like BedrockModel: stream() with the output model as the only tool, whose input is the output."""
+        tool_spec = convert_pydantic_to_tool_spec(output_model)
+        async for event in process_stream(self.stream(prompt, [tool_spec], system_prompt)):
+            yield event
+        _, message, _, _ = event['stop']
+        for block in message['content']:
+            if block.get('toolUse', {}).get('name') == tool_spec['name']:
+                yield {'output': output_model(**block['toolUse']['input'])}
+                return
+        raise ValueError(f'Stub model did not call {tool_spec["name"]}')
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        names = [spec['name'] for spec in tool_specs or []]
+        called = any('toolResult' in block for message in messages for block in message['content'])
+        prefix = (system_prompt or '') + json.dumps(tool_specs or [])
+        input_tokens = (len(json.dumps(messages, default=str)) + len(prefix)) // 4
+        usage = {}
+        if self.caches:
+            cached = 'cacheReadInputTokens' if prefix in self.cached_prefixes else 'cacheWriteInputTokens'
+            self.cached_prefixes.add(prefix)
+            usage[cached] = len(prefix) // 4
+            input_tokens -= usage[cached]
+        tools = [name for name in names if name not in ('handoff_to_agent', 'ResearchPlan')]
+        if 'ResearchPlan' in names and not called:
+            tool, text = 'ResearchPlan', json.dumps(STUB_PLAN)
+        elif tools and not called:
+            tool, text = tools[0], '{}'
+        else:
+            tool, text = None, '<div class="p-4"><p>Benchmark answer.</p></div>'
+        output_tokens = len(text) // 4 if tool else ANSWER_TOKENS
+        started = time.perf_counter()
+        await asyncio.sleep(self.ttft * self.time_scale)
+        yield {'messageStart': {'role': 'assistant'}}
+        if tool:
+            yield {'contentBlockStart': {'start': {'toolUse': {'toolUseId': f'stub-{time.monotonic_ns()}', 'name': tool}}}}
+            yield {'contentBlockDelta': {'delta': {'toolUse': {'input': text}}}}
+        else:
+            yield {'contentBlockDelta': {'delta': {'text': text}}}
+        await asyncio.sleep(output_tokens / self.tokens_per_second * self.time_scale)
+        yield {'contentBlockStop': {}}
+        yield {'messageStop': {'stopReason': 'tool_use' if tool else 'end_turn'}}
+        yield {'metadata': {'usage': {'inputTokens': input_tokens, 'outputTokens': output_tokens,
+                                      'totalTokens': input_tokens + output_tokens + sum(usage.values()), **usage},
+                            'metrics': {'latencyMs': int((time.perf_counter() - started) * 1000)}}}
+
+
+def stub_tool(tool, time_scale=1.0):
+    spec = as_agent_tool(tool).tool_spec
+    latency = TOOL_LATENCIES.get(spec['name'], DEFAULT_TOOL_LATENCY) * time_scale
+
+    async def run(tool_use, **kwargs):
+        await asyncio.sleep(latency)
+        return {'toolUseId': tool_use['toolUseId'], 'status': 'success', 'content': [{'text': '{"rows": []}'}]}
+
+    return PythonAgentTool(spec['name'], spec, run)
+
+
+def stub_daily_features(stock_symbols, fields=None, **kwargs):
+    rows = [{'symbol': symbol, 'Date': '2025-01-10', **{field: 100.0 for field in fields or []}}
+            for symbol in stock_symbols]
+    return json.dumps({'row_count': len(rows), 'truncated': False, 'missing_symbols': [], 'rows': rows})
+
+
+def swap_model(model, inner):
+    model.model = inner
+    return model
+
+
+def install_stubs(time_scale=1.0):
+    """Swap every model, tool list and data lookup the agents and router use for stubs."""
+    # Swapped inside the shared LimitedModels as they are built, so the role tiers built from them pick the stubs up
+    all_agents.MODELS.wrap(lambda name, model: swap_model(model, StubModel(model.get_config()['model_id'], time_scale)))
+    all_agents.AGENT_TOOLS.wrap(lambda name, tools: [stub_tool(tool, time_scale) for tool in tools])
+    router.get_daily_features = stub_daily_features
+    # Questions the rules cannot place would reach the router model; send them to the graph
+    router.get_classifier = lambda: (lambda prompt: router.Route(router.GRAPH, 'research', [], None, 'stub'))
+
+
+def install_replay(directory, time_scale=1.0):
+    """Serve every model, tool and router call from a recording made with RECORD_MODE=record."""
+    recorder = Recorder(directory, 'replay', time_scale)
+    all_agents.MODELS.wrap(lambda name, model: swap_model(model, RecordingModel(model.model, recorder)))
+    all_agents.AGENT_TOOLS.wrap(lambda name, tools: recorded_tools(tools, recorder))
+    router.get_daily_features = RecordingTool(router.get_daily_features, recorder)
+    classifier = router.get_classifier()
+    classifier._converse = recorded_function(f'router:{classifier.model_id}', classifier._client.converse, recorder)
+    return recorder
+
+
+def percentile(values, q):
+    """Nearest-rank percentile: the smallest value with at least ``q`` percent of the values at or below it."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def report(summaries):
+    requests = len(summaries)
+    stages = {'total': [summary['total_ms'] for summary in summaries]}
+    costs = {'total': sum(summary['cost_usd'] for summary in summaries)}
+    calls = {'total': requests}
+    for summary in summaries:
+        for key, stage in summary['stages'].items():
+            stages.setdefault(key, []).append(stage['total_ms'])
+            costs[key] = costs.get(key, 0.0) + stage.get('cost_usd', 0.0)
+            calls[key] = calls.get(key, 0) + stage['count']
+    routes = {}
+    for summary in summaries:
+        routes.setdefault(summary.get('route', 'cache'), []).append(summary['total_ms'])
+    return {
+        'requests': requests,
+        'routes': {route: {'requests': len(times), 'p50_ms': percentile(times, 50), 'p95_ms': percentile(times, 95)}
+                   for route, times in routes.items()},
+        'stages': {key: {'requests': len(times), 'calls_per_request': round(calls[key] / len(times), 2),
+                         'p50_ms': percentile(times, 50), 'p95_ms': percentile(times, 95),
+                         'cost_per_request_usd': round(costs[key] / requests, 6)}
+                   for key, times in stages.items()},
+    }
+
+
+def print_report(result):
+    print(f"\n{result['requests']} requests")
+    for route, row in result['routes'].items():
+        print(f"  route {route:<10} {row['requests']:>5} requests  p50 {row['p50_ms']:>9.1f} ms  p95 {row['p95_ms']:>9.1f} ms")
+    print(f"\n{'stage':<60} {'calls/req':>9} {'p50 ms':>10} {'p95 ms':>10} {'$/req':>10}")
+    for key, row in sorted(result['stages'].items(), key=lambda item: -item[1]['p95_ms']):
+        print(f"{key:<60} {row['calls_per_request']:>9} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f} "
+              f"{row['cost_per_request_usd']:>10.6f}")
+
+
+async def run_benchmark(prompts, runs=3, concurrency=1, mode=None):
+    summaries = []
+    add_trace_listener(summaries.append)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(prompt):
+        payload = {'prompt': prompt}
+        if mode:
+            payload['research_mode'] = mode
+        async with semaphore:
+            await main.strands_agent_bedrock(payload)
+
+    await asyncio.gather(*(run_one(prompt) for _ in range(runs) for prompt in prompts))
+    return summaries
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prompts', help='JSON file with a list of prompts (default: the built-in set)')
+    parser.add_argument('--runs', type=int, default=3, help='Runs of every prompt')
+    parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight at once')
+    parser.add_argument('--mode', choices=['fanout', 'swarm'], help='Research mode (default: RESEARCH_MODE)')
+    parser.add_argument('--replay', metavar='DIR', help='Replay this recording instead of using stubs')
+    parser.add_argument('--time-scale', type=float,
+                        help='Multiplier for all simulated or recorded latencies (default 0.1 for stubs, 1 for replay)')
+    parser.add_argument('--json', help='Also write the report to this file')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    prompts = PROMPTS
+    if args.prompts:
+        with open(args.prompts) as f:
+            prompts = json.load(f)
+    if args.replay:
+        install_replay(args.replay, 1.0 if args.time_scale is None else args.time_scale)
+    else:
+        install_stubs(0.1 if args.time_scale is None else args.time_scale)
+    result = report(asyncio.run(run_benchmark(prompts, args.runs, args.concurrency, args.mode)))
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
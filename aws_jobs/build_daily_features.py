@@ -0,0 +1,147 @@
+"""Materialise the per-symbol daily feature table (returns, volatility, moving averages, RSI, drawdown, ADV).
+
+Usage:
+    python -m aws_jobs.build_daily_features full    # recompute the full history of every symbol
+    python -m aws_jobs.build_daily_features update  # add trading days newer than the store
+
+The table is written as year=XXXX partitions sorted by (symbol, Date) under
+MARKET_FEATURES_URI and read by the get_daily_features tool.
+"""
+import argparse
+import datetime
+import os
+import time
+
+import fsspec
+import polars as pl
+import pyarrow.parquet as pq
+
+from aws_jobs.compact_market_data import read_source
+from aws_tools.analytics import LOOKBACK_CALENDAR_DAYS, MARKET_FEATURES_URI, compute_features
+from aws_tools.market_lake import MARKET_LAKE_URI
+
+SYMBOL_BATCH_SIZE = int(os.getenv('MARKET_FEATURES_SYMBOL_BATCH', '500'))
+ROW_GROUP_SIZE = int(os.getenv('MARKET_FEATURES_ROW_GROUP_SIZE', '2048'))
+# Daily updates add one small file per year partition; merge them once there are this many
+MAX_FILES_PER_YEAR = int(os.getenv('MARKET_FEATURES_MAX_FILES_PER_YEAR', '20'))
+
+
+def _year_dirs(fs, root):
+    try:
+        entries = fs.ls(root, detail=True)
+    except FileNotFoundError:
+        return {}
+    return {int(os.path.basename(e['name'].rstrip('/')).split('=', 1)[1]): e['name'].rstrip('/')
+            for e in entries
+            if e['type'] == 'directory' and os.path.basename(e['name'].rstrip('/')).startswith('year=')}
+
+
+def _parquet_files(fs, directory):
+    return sorted(p for p in fs.ls(directory, detail=False) if p.endswith('.parquet'))
+
+
+def write_features(fs, root, frame, name, row_group_size=ROW_GROUP_SIZE):
+    """Write ``frame`` into its year partitions as ``name``.parquet; returns the paths written."""
+    written = []
+    for (year,), part in frame.partition_by('year', as_dict=True, maintain_order=True).items():
+        path = f'{root}/year={year}/{name}.parquet'
+        fs.makedirs(os.path.dirname(path), exist_ok=True)
+        with fs.open(path, 'wb') as f:
+            pq.write_table(part.sort(['symbol', 'Date']).to_arrow(), f,
+                           row_group_size=row_group_size, compression='zstd')
+        written.append(path)
+    return written
+
+
+def full_build(source_fs, source_root, target_fs, target_root, batch_size=SYMBOL_BATCH_SIZE):
+    """Recompute every symbol in batches, then drop the files of the previous build."""
+    previous = [p for d in _year_dirs(target_fs, target_root).values() for p in _parquet_files(target_fs, d)]
+    symbols = read_source(source_fs, source_root, columns=['symbol'])['symbol'].unique().sort().to_list()
+    generation = time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+    rows = 0
+    for number, offset in enumerate(range(0, len(symbols), batch_size)):
+        frame = read_source(source_fs, source_root, symbols=symbols[offset:offset + batch_size])
+        features = compute_features(frame)
+        write_features(target_fs, target_root, features, f'full-{generation}-{number:04d}')
+        rows += features.height
+    for path in previous:
+        target_fs.rm(path)
+    return rows
+
+
+def last_dates(fs, root, since_year=None):
+    """Last stored Date per symbol in the year partitions from ``since_year`` on (default: the newest)."""
+    years = _year_dirs(fs, root)
+    if not years:
+        return pl.DataFrame(schema={'symbol': pl.String, 'last_date': pl.Datetime('ns')})
+    since_year = since_year or max(years)
+    frames = []
+    for year, directory in years.items():
+        if year < since_year:
+            continue
+        for path in _parquet_files(fs, directory):
+            with fs.open(path, 'rb') as f:
+                frames.append(pl.from_arrow(pq.read_table(f, columns=['symbol', 'Date'])))
+    return pl.concat(frames).group_by('symbol').agg(pl.col('Date').max().alias('last_date'))
+
+
+def update(source_fs, source_root, target_fs, target_root):
+    """Compute features for days after each symbol's last stored day, with enough history for every window."""
+    newest = last_dates(target_fs, target_root)
+    if newest.is_empty():
+        return full_build(source_fs, source_root, target_fs, target_root)
+    store_max = newest['last_date'].max()
+    since = (store_max - datetime.timedelta(days=LOOKBACK_CALENDAR_DAYS)).date()
+    # Symbols whose last stored day is before the window get every computed row, as if new
+    last = last_dates(target_fs, target_root, since_year=since.year)
+    frame = read_source(source_fs, source_root, since=since)
+    if frame.is_empty() or frame['Date'].max() <= store_max:
+        return 0
+    features = (compute_features(frame)
+                .join(last, on='symbol', how='left')
+                .filter(pl.col('last_date').is_null() | (pl.col('Date') > pl.col('last_date')))
+                .drop('last_date'))
+    if features.is_empty():
+        return 0
+    written = write_features(target_fs, target_root, features, f'update-{time.strftime("%Y%m%dT%H%M%S", time.gmtime())}')
+    for path in written:
+        _merge_small_files(target_fs, os.path.dirname(path))
+    return features.height
+
+
+def _merge_small_files(fs, directory):
+    files = _parquet_files(fs, directory)
+    if len(files) <= MAX_FILES_PER_YEAR:
+        return
+    frames = []
+    for path in files:
+        with fs.open(path, 'rb') as f:
+            frames.append(pl.from_arrow(pq.read_table(f)))
+    merged = pl.concat(frames, how='diagonal_relaxed').unique(['symbol', 'Date'], keep='last')
+    name = f'merged-{time.strftime("%Y%m%dT%H%M%S", time.gmtime())}'
+    root = os.path.dirname(directory)
+    written = write_features(fs, root, merged, name)
+    for path in files:
+        if path not in written:
+            fs.rm(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mode', choices=['full', 'update'])
+    parser.add_argument('--source', default=MARKET_LAKE_URI, help='Year-partitioned OHLCV lake to read')
+    parser.add_argument('--target', default=MARKET_FEATURES_URI, help='Where to write the feature table')
+    args = parser.parse_args()
+
+    source_fs, source_root = fsspec.core.url_to_fs(args.source)
+    target_fs, target_root = fsspec.core.url_to_fs(args.target)
+    started = time.monotonic()
+    if args.mode == 'full':
+        rows = full_build(source_fs, source_root.rstrip('/'), target_fs, target_root.rstrip('/'))
+    else:
+        rows = update(source_fs, source_root.rstrip('/'), target_fs, target_root.rstrip('/'))
+    print(f'{args.mode}: wrote {rows} feature rows ({time.monotonic() - started:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Rewrite the year-partitioned market lake into a symbol-sorted layout with a symbol index.
+
+Usage:
+    python -m aws_jobs.compact_market_data full    # rewrite everything into a new generation
+    python -m aws_jobs.compact_market_data append  # add trading days newer than the index as a delta file
+
+Point the agents at the result with MARKET_LAKE_INDEX_URI=<target>/_index.json.
+"""
+import argparse
+import datetime
+import os
+import time
+
+import fsspec
+import polars as pl
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from aws_tools.market_lake import COLUMNS, MARKET_LAKE_URI, MarketLakeIndex
+
+MARKET_LAKE_SORTED_URI = os.getenv('MARKET_LAKE_SORTED_URI', f'{MARKET_LAKE_URI}/sorted')
+INDEX_FILE = '_index.json'
+# Roughly one symbol's decade of daily bars per row group, so a lookup reads one or two groups
+ROW_GROUP_SIZE = int(os.getenv('MARKET_LAKE_ROW_GROUP_SIZE', '4096'))
+ROWS_PER_FILE = int(os.getenv('MARKET_LAKE_ROWS_PER_FILE', str(ROW_GROUP_SIZE * 256)))
+# Fold the deltas back into a full rewrite once there are this many
+MAX_DELTA_FILES = int(os.getenv('MARKET_LAKE_MAX_DELTA_FILES', '30'))
+
+
+def _generation_name():
+    return time.strftime('gen=%Y%m%dT%H%M%S', time.gmtime())
+
+
+def _sorted(frame):
+    frame = frame.select([c for c in COLUMNS if c in frame.columns])
+    return frame.sort(['symbol', 'Date'])
+
+
+def _write_frame(fs, path, frame, row_group_size):
+    fs.makedirs(os.path.dirname(path), exist_ok=True)
+    with fs.open(path, 'wb') as f:
+        pq.write_table(frame.to_arrow(), f, row_group_size=row_group_size, compression='zstd')
+
+
+def read_source(source_fs, source_root, since=None, symbols=None, columns=None):
+    """Rows in the year-partitioned lake, optionally only after ``since`` (a date) and for ``symbols``."""
+    paths = []
+    for entry in source_fs.ls(source_root, detail=True):
+        name = entry['name'].rstrip('/')
+        if entry['type'] != 'directory' or not os.path.basename(name).startswith('year='):
+            continue
+        if since and int(os.path.basename(name).split('=', 1)[1]) < since.year:
+            continue
+        paths.extend(p for p in source_fs.find(name) if p.endswith('.parquet'))
+    if not paths:
+        return pl.DataFrame()
+    dataset = ds.dataset(paths, filesystem=source_fs, format='parquet')
+    filter_ = None
+    if since:
+        cutoff = pa.scalar(datetime.datetime.combine(since, datetime.time.max), dataset.schema.field('Date').type)
+        filter_ = ds.field('Date') > cutoff
+    if symbols is not None:
+        symbol_filter = ds.field('symbol').isin(list(symbols))
+        filter_ = symbol_filter if filter_ is None else filter_ & symbol_filter
+    return pl.from_arrow(dataset.to_table(columns=columns, filter=filter_))
+
+
+def full_rewrite(source_fs, source_root, target_fs, target_root, frame=None,
+                 row_group_size=ROW_GROUP_SIZE, rows_per_file=ROWS_PER_FILE):
+    """Write ``frame`` (default: the whole source lake) as a new sorted generation and swap the index to it."""
+    if frame is None:
+        frame = read_source(source_fs, source_root)
+    frame = _sorted(frame)
+    # Keep files aligned to whole row groups so row-group indices stay file-local
+    rows_per_file = max(row_group_size, rows_per_file - rows_per_file % row_group_size)
+
+    index = MarketLakeIndex()
+    index.generation = _generation_name()
+    index.row_group_size = row_group_size
+    for number, offset in enumerate(range(0, frame.height, rows_per_file)):
+        chunk = frame.slice(offset, rows_per_file)
+        path = f'{index.generation}/part-{number:05d}.parquet'
+        _write_frame(target_fs, f'{target_root}/{path}', chunk, row_group_size)
+        index.add_file(path, chunk, row_group_size)
+
+    previous = MarketLakeIndex.load(target_fs, f'{target_root}/{INDEX_FILE}')
+    index.save(target_fs, f'{target_root}/{INDEX_FILE}')
+    _remove_stale_generations(target_fs, target_root, keep={index.generation, previous and previous.generation})
+    return index
+
+
+def append(source_fs, source_root, target_fs, target_root, row_group_size=ROW_GROUP_SIZE):
+    """Add rows newer than the index's last date as one sorted delta file, without rewriting the base."""
+    index_path = f'{target_root}/{INDEX_FILE}'
+    index = MarketLakeIndex.load(target_fs, index_path)
+    if index is None or index.max_date is None:
+        return full_rewrite(source_fs, source_root, target_fs, target_root, row_group_size=row_group_size)
+
+    frame = read_source(source_fs, source_root, since=datetime.date.fromisoformat(index.max_date))
+    if frame.is_empty():
+        return index
+    deltas = [p for p in index.files if '/delta-' in p]
+    if len(deltas) + 1 >= MAX_DELTA_FILES:
+        current = pl.concat([read_sorted(target_fs, target_root, index), frame.select(
+            [c for c in COLUMNS if c in frame.columns])], how='diagonal_relaxed')
+        return full_rewrite(source_fs, source_root, target_fs, target_root, frame=current,
+                            row_group_size=row_group_size)
+
+    frame = _sorted(frame)
+    # Deltas hold a few days for every symbol, so small row groups keep per-symbol reads tight
+    delta_row_group_size = max(64, min(row_group_size, frame.height // max(frame['symbol'].n_unique(), 1) * 8))
+    path = f'{index.generation}/delta-{time.strftime("%Y%m%dT%H%M%S", time.gmtime())}.parquet'
+    _write_frame(target_fs, f'{target_root}/{path}', frame, delta_row_group_size)
+    index.add_file(path, frame, delta_row_group_size)
+    index.save(target_fs, index_path)
+    return index
+
+
+def read_sorted(target_fs, target_root, index):
+    tables = []
+    for path in index.files:
+        with target_fs.open(f'{target_root}/{path}', 'rb') as f:
+            tables.append(pq.read_table(f))
+    return pl.from_arrow(pa.concat_tables(tables, promote_options='default'))
+
+
+def _remove_stale_generations(fs, root, keep):
+    for entry in fs.ls(root, detail=True):
+        name = os.path.basename(entry['name'].rstrip('/'))
+        if entry['type'] == 'directory' and name.startswith('gen=') and name not in keep:
+            fs.rm(entry['name'], recursive=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mode', choices=['full', 'append'])
+    parser.add_argument('--source', default=MARKET_LAKE_URI, help='Year-partitioned lake to read')
+    parser.add_argument('--target', default=MARKET_LAKE_SORTED_URI, help='Where to write the sorted layout')
+    parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    source_fs, source_root = fsspec.core.url_to_fs(args.source)
+    target_fs, target_root = fsspec.core.url_to_fs(args.target)
+    target_root = target_root.rstrip('/')
+    target_fs.makedirs(target_root, exist_ok=True)
+    started = time.monotonic()
+    if args.mode == 'full':
+        index = full_rewrite(source_fs, source_root.rstrip('/'), target_fs, target_root,
+                             row_group_size=args.row_group_size)
+    else:
+        index = append(source_fs, source_root.rstrip('/'), target_fs, target_root,
+                       row_group_size=args.row_group_size)
+    print(f'{args.mode}: {len(index.files)} files, {len(index.symbols)} symbols, '
+          f'data up to {index.max_date} ({time.monotonic() - started:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
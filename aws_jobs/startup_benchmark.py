@@ -0,0 +1,125 @@
+"""Measure cold start: how long importing main takes and how slow the first requests of a fresh process are.
+
+Usage:
+    python -m aws_jobs.startup_benchmark                 # 5 fresh processes, without and with the pre-warm
+    python -m aws_jobs.startup_benchmark --runs 10 --mode cold --json startup.json
+    python -m aws_jobs.startup_benchmark --imports 20    # also list the 20 slowest modules to import
+
+Every run is a new Python process that imports main, swaps in the stubbed
+models and tools of aws_jobs.benchmark and sends a direct-answer prompt and
+a research prompt twice each. With the stubs answering instantly
+(--time-scale 0) the first request's extra time over the second is the work
+left to it by the lazy imports and registries. In "prewarmed" mode the
+process runs aws_runtime.prewarm (blocking) before the first request, as
+PREWARM=blocking would; its time is reported as prewarm_ms.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MARKER = 'STARTUP '
+MODES = ('cold', 'prewarmed')
+# One prompt per request path: answered from the analytics table, and the full research graph
+PROMPTS = {'direct': 'What is the price of AAPL?',
+           'graph': 'Compare the fundamentals and recent news of AMZN and GOOGL and chart their performance this year'}
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(mode, time_scale):
+    """Runs in the child process; returns the timings in milliseconds."""
+    os.environ.setdefault('RESULT_CACHE_BACKEND', 'none')
+    os.environ['PREWARM'] = 'off'
+    timings = {}
+    started = time.perf_counter()
+    import main
+    timings['import_ms'] = (time.perf_counter() - started) * 1000
+    import asyncio
+    from aws_jobs.benchmark import install_stubs
+
+    install_stubs(time_scale)
+    if mode == 'prewarmed':
+        from aws_runtime.prewarm import prewarm
+        started = time.perf_counter()
+        prewarm()
+        timings['prewarm_ms'] = (time.perf_counter() - started) * 1000
+
+    async def requests():
+        for attempt in ('first', 'second'):
+            for kind, prompt in PROMPTS.items():
+                started = time.perf_counter()
+                await main.strands_agent_bedrock({'prompt': prompt, 'no_cache': True})
+                timings[f'{attempt}_{kind}_ms'] = (time.perf_counter() - started) * 1000
+
+    asyncio.run(requests())
+    return timings
+
+
+def run_child(mode, time_scale):
+    command = [sys.executable, '-m', 'aws_jobs.startup_benchmark', '--child', mode, '--time-scale', str(time_scale)]
+    output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    lines = [line for line in output.splitlines() if line.startswith(MARKER)]
+    if not lines:
+        raise RuntimeError(f'No timings in the output of {" ".join(command)}:\n{output[-2000:]}')
+    return json.loads(lines[-1][len(MARKER):])
+
+
+def slowest_imports(count):
+    """The ``count`` modules that take longest to import on their own (self time), from ``-X importtime``."""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=ROOT,
+                            capture_output=True, text=True, env=dict(os.environ, PREWARM='off')).stderr
+    rows = []
+    for line in output.splitlines():
+        if line.startswith('import time:') and '|' in line and 'self [us]' not in line:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append((int(self_us) / 1000, int(cumulative_us) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def report(results):
+    summary = {}
+    for mode, runs in results.items():
+        summary[mode] = {key: {'p50_ms': round(statistics.median(run[key] for run in runs), 1),
+                               'max_ms': round(max(run[key] for run in runs), 1)}
+                         for key in runs[0]}
+    return summary
+
+
+def print_report(summary):
+    for mode, rows in summary.items():
+        print(f'\n{mode}')
+        for key, row in rows.items():
+            print(f"  {key:<20} p50 {row['p50_ms']:>9.1f} ms  max {row['max_ms']:>9.1f} ms")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode')
+    parser.add_argument('--mode', choices=MODES, help='Only this mode (default: both)')
+    parser.add_argument('--time-scale', type=float, default=0.0,
+                        help='Multiplier for the simulated model and tool latencies (default 0: overhead only)')
+    parser.add_argument('--imports', type=int, default=0, metavar='N', help='Also list the N slowest imports')
+    parser.add_argument('--json', help='Also write the report to this file')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.child:
+        print(MARKER + json.dumps(measure(args.child, args.time_scale)), flush=True)
+        sys.exit(0)
+    results = {mode: [run_child(mode, args.time_scale) for _ in range(args.runs)]
+               for mode in ([args.mode] if args.mode else MODES)}
+    summary = report(results)
+    print_report(summary)
+    if args.imports:
+        print(f"\n{'module':<60} {'self ms':>9} {'cumulative ms':>14}")
+        for self_ms, cumulative_ms, name in slowest_imports(args.imports):
+            print(f'{name:<60} {self_ms:>9.1f} {cumulative_ms:>14.1f}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,44 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Each in-flight Bedrock call holds a pooled connection; size the pool for BEDROCK_MAX_CONCURRENCY plus headroom
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv('BEDROCK_MAX_POOL_CONNECTIONS', '50'))
+# Adaptive retries back off client-side when Bedrock throttles instead of retrying at full rate
+BEDROCK_MAX_ATTEMPTS = int(os.getenv('BEDROCK_MAX_ATTEMPTS', '6'))
+BEDROCK_CONNECT_TIMEOUT = float(os.getenv('BEDROCK_CONNECT_TIMEOUT', '5'))
+# Long reports stream for minutes; the read timeout applies between chunks
+BEDROCK_READ_TIMEOUT = float(os.getenv('BEDROCK_READ_TIMEOUT', '300'))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def bedrock_client_config(max_attempts=None):
+    return Config(
+        max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+        retries={'max_attempts': max_attempts or BEDROCK_MAX_ATTEMPTS, 'mode': 'adaptive'},
+        connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+        read_timeout=BEDROCK_READ_TIMEOUT,
+        tcp_keepalive=True,
+        user_agent_extra='strands-agents',
+    )
+
+
+def get_bedrock_client(region_name=None, max_attempts=None):
+    """The process-wide bedrock-runtime client for ``region_name`` (boto3 clients are thread-safe).
+
+    ``max_attempts`` overrides BEDROCK_MAX_ATTEMPTS; each setting gets its own client.
+    """
+    region_name = region_name or boto3.Session().region_name or os.getenv('AWS_REGION') or 'us-east-1'
+    key = (region_name, max_attempts)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = boto3.client('bedrock-runtime', region_name=region_name,
+                                                      config=bedrock_client_config(max_attempts))
+    return client
@@ -0,0 +1,252 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from strands.session.session_repository import SessionRepository
+from strands.types.exceptions import SessionException
+from strands.types.session import Session, SessionAgent, SessionMessage
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+JOB_STORE_BACKEND = os.getenv('JOB_STORE_BACKEND', 'sqlite')  # sqlite | file | s3
+# Relative paths are under the project root, so every process finds the same store whatever its working directory
+JOB_STORE_PATH = os.path.join(_PROJECT_ROOT, os.getenv('JOB_STORE_PATH', '.jobs/jobs.db'))
+JOB_STORE_DIR = os.path.join(_PROJECT_ROOT, os.getenv('JOB_STORE_DIR', '.jobs'))
+JOB_STORE_S3_URI = os.getenv('JOB_STORE_S3_URI', '')
+
+
+class SQLiteDocumentStore:
+    """JSON documents by collection and id in one SQLite file; the default, for a single host."""
+
+    def __init__(self, path=JOB_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS documents (collection TEXT NOT NULL, id TEXT NOT NULL, '
+                               'body TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (collection, id))')
+
+    def get(self, collection, doc_id):
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM documents WHERE collection = ? AND id = ?',
+                                     (collection, doc_id)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, collection, doc_id, document):
+        body = json.dumps(document, default=str)
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO documents (collection, id, body, updated_at) VALUES (?, ?, ?, ?)',
+                               (collection, doc_id, body, time.time()))
+
+    def get_versioned(self, collection, doc_id):
+        """The document and a version to pass to put_if_unchanged, or (None, None)."""
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM documents WHERE collection = ? AND id = ?',
+                                     (collection, doc_id)).fetchone()
+        return (json.loads(row[0]), row[0]) if row is not None else (None, None)
+
+    def put_if_unchanged(self, collection, doc_id, document, version):
+        """Replace the document only if it is still at ``version``; returns whether it was written."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute('UPDATE documents SET body = ?, updated_at = ? WHERE collection = ? AND id = ? '
+                                        'AND body = ?', (json.dumps(document, default=str), time.time(), collection,
+                                                         doc_id, version))
+        return cursor.rowcount == 1
+
+    def list(self, collection, prefix=''):
+        """Ids in ``collection`` starting with ``prefix``, sorted."""
+        with self._lock:
+            rows = self._conn.execute('SELECT id FROM documents WHERE collection = ? AND substr(id, 1, ?) = ? '
+                                      'ORDER BY id', (collection, len(prefix), prefix)).fetchall()
+        return [row[0] for row in rows]
+
+
+class FileDocumentStore:
+    """One JSON file per document under ``directory/collection``; easy to inspect, or to put on a shared volume."""
+
+    def __init__(self, directory=JOB_STORE_DIR):
+        self.directory = directory
+
+    def _path(self, collection, doc_id):
+        return os.path.join(self.directory, collection, f'{doc_id}.json')
+
+    def get(self, collection, doc_id):
+        try:
+            with open(self._path(collection, doc_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, collection, doc_id, document):
+        path = self._path(collection, doc_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(document, f, default=str)
+        os.replace(temporary, path)
+
+    def get_versioned(self, collection, doc_id):
+        """The document and a version to pass to put_if_unchanged, or (None, None)."""
+        try:
+            with open(self._path(collection, doc_id)) as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None, None
+        return json.loads(body), body
+
+    def put_if_unchanged(self, collection, doc_id, document, version):
+        """Replace the document only if it is still at ``version``; returns whether it was written."""
+        path = self._path(collection, doc_id)
+        with open(f'{path}.lock', 'a') as lock:
+            # Conditional writers (other processes too) take turns on the lock file
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.get_versioned(collection, doc_id)[1] != version:
+                return False
+            self.put(collection, doc_id, document)
+        return True
+
+    def list(self, collection, prefix=''):
+        root = os.path.join(self.directory, collection)
+        ids = []
+        for directory, _, files in os.walk(root):
+            for name in files:
+                if name.endswith('.json'):
+                    doc_id = os.path.relpath(os.path.join(directory, name[:-5]), root).replace(os.sep, '/')
+                    if doc_id.startswith(prefix):
+                        ids.append(doc_id)
+        return sorted(ids)
+
+
+class S3DocumentStore:
+    """One JSON object per document under ``s3://bucket/prefix/collection``, so any container can resume a job."""
+
+    def __init__(self, uri=JOB_STORE_S3_URI, client=None):
+        import boto3
+
+        self.bucket, _, prefix = uri.removeprefix('s3://').partition('/')
+        self.prefix = prefix.strip('/')
+        self.client = client or boto3.client('s3')
+
+    def _key(self, collection, doc_id=''):
+        return '/'.join(part for part in (self.prefix, collection, doc_id) if part)
+
+    def get(self, collection, doc_id):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=f'{self._key(collection, doc_id)}.json')
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+    def put(self, collection, doc_id, document):
+        self.client.put_object(Bucket=self.bucket, Key=f'{self._key(collection, doc_id)}.json',
+                               Body=json.dumps(document, default=str).encode(), ContentType='application/json')
+
+    def get_versioned(self, collection, doc_id):
+        """The document and its ETag, to pass to put_if_unchanged, or (None, None)."""
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=f'{self._key(collection, doc_id)}.json')
+        except self.client.exceptions.NoSuchKey:
+            return None, None
+        return json.loads(response['Body'].read()), response['ETag']
+
+    def put_if_unchanged(self, collection, doc_id, document, version):
+        """Replace the document only if its ETag is still ``version`` (an S3 conditional write)."""
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=f'{self._key(collection, doc_id)}.json', IfMatch=version,
+                                   Body=json.dumps(document, default=str).encode(), ContentType='application/json')
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
+        return True
+
+    def list(self, collection, prefix=''):
+        root = f'{self._key(collection)}/'
+        ids = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=root + prefix):
+            ids.extend(item['Key'][len(root):-5] for item in page.get('Contents', []) if item['Key'].endswith('.json'))
+        return sorted(ids)
+
+
+def create_document_store(name=JOB_STORE_BACKEND):
+    if name == 'sqlite':
+        return SQLiteDocumentStore()
+    if name == 'file':
+        return FileDocumentStore()
+    if name == 's3':
+        return S3DocumentStore()
+    raise ValueError(f'Unknown JOB_STORE_BACKEND: {name}')
+
+
+class DocumentSessionRepository(SessionRepository):
+    """Strands session storage on a document store.
+
+    Handing a ``RepositorySessionManager`` over this repository to a graph
+    or swarm checkpoints its state (completed nodes, their results and the
+    nodes to run next) after every node or handoff, and restores it when a
+    graph or swarm with the same session id and node ids is built again.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def create_session(self, session, **kwargs):
+        if self.store.get('sessions', session.session_id) is not None:
+            raise SessionException(f'Session {session.session_id} already exists')
+        self.store.put('sessions', session.session_id, session.to_dict())
+        return session
+
+    def read_session(self, session_id, **kwargs):
+        document = self.store.get('sessions', session_id)
+        return Session.from_dict(document) if document is not None else None
+
+    def create_agent(self, session_id, session_agent, **kwargs):
+        self.store.put('agents', f'{session_id}/{session_agent.agent_id}', session_agent.to_dict())
+
+    def read_agent(self, session_id, agent_id, **kwargs):
+        document = self.store.get('agents', f'{session_id}/{agent_id}')
+        return SessionAgent.from_dict(document) if document is not None else None
+
+    def update_agent(self, session_id, session_agent, **kwargs):
+        previous = self.read_agent(session_id, session_agent.agent_id)
+        if previous is None:
+            raise SessionException(f'Agent {session_agent.agent_id} in session {session_id} does not exist')
+        session_agent.created_at = previous.created_at
+        self.create_agent(session_id, session_agent)
+
+    def create_message(self, session_id, agent_id, session_message, **kwargs):
+        self.store.put('messages', f'{session_id}/{agent_id}/{session_message.message_id:08d}',
+                       session_message.to_dict())
+
+    def read_message(self, session_id, agent_id, message_id, **kwargs):
+        document = self.store.get('messages', f'{session_id}/{agent_id}/{message_id:08d}')
+        return SessionMessage.from_dict(document) if document is not None else None
+
+    def update_message(self, session_id, agent_id, session_message, **kwargs):
+        previous = self.read_message(session_id, agent_id, session_message.message_id)
+        if previous is None:
+            raise SessionException(f'Message {session_message.message_id} of agent {agent_id} does not exist')
+        session_message.created_at = previous.created_at
+        self.create_message(session_id, agent_id, session_message)
+
+    def list_messages(self, session_id, agent_id, limit=None, offset=0, **kwargs):
+        ids = self.store.list('messages', f'{session_id}/{agent_id}/')
+        ids = ids[offset:offset + limit] if limit is not None else ids[offset:]
+        return [SessionMessage.from_dict(self.store.get('messages', doc_id)) for doc_id in ids]
+
+    def create_multi_agent(self, session_id, multi_agent, **kwargs):
+        self.store.put('multi_agents', f'{session_id}/{multi_agent.id}', multi_agent.serialize_state())
+
+    def read_multi_agent(self, session_id, multi_agent_id, **kwargs):
+        return self.store.get('multi_agents', f'{session_id}/{multi_agent_id}')
+
+    def update_multi_agent(self, session_id, multi_agent, **kwargs):
+        self.create_multi_agent(session_id, multi_agent)
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import time
+
+from pydantic import BaseModel, Field
+from strands.agent.agent_result import AgentResult
+from strands.multiagent import GraphBuilder
+from strands.telemetry.metrics import EventLoopMetrics
+
+from aws_agents.all_agents import (AGENT_FACTORIES, create_critic_agent, create_final_response_agent,
+                                   create_planner_agent)
+from aws_prompts.prompt import planner_dag_prompt
+
+FANOUT_MAX_TASKS = int(os.getenv('FANOUT_MAX_TASKS', '8'))
+# A branch that overruns is reported as missing instead of failing the whole report
+FANOUT_BRANCH_TIMEOUT = float(os.getenv('FANOUT_BRANCH_TIMEOUT', '900'))
+FANOUT_EXECUTION_TIMEOUT = float(os.getenv('FANOUT_EXECUTION_TIMEOUT', '3600'))
+
+# Agents a plan may assign tasks to; they are built from aws_agents.all_agents.AGENT_FACTORIES
+RESEARCH_AGENTS = ('financialAnalyst', 'marketDataResearch', 'coder', 'charts')
+
+
+class ResearchTask(BaseModel):
+    id: str = Field(description='Short snake_case identifier, unique in the plan')
+    agent: str = Field(description='One of: ' + ', '.join(RESEARCH_AGENTS))
+    instruction: str = Field(description='What this agent must produce')
+    depends_on: list[str] = Field(default_factory=list, description='Ids of tasks whose results this task needs')
+
+
+class ResearchPlan(BaseModel):
+    summary: str = Field(description='One paragraph describing the report to produce')
+    tasks: list[ResearchTask]
+
+
+class InvalidPlan(Exception):
+    pass
+
+
+def order_tasks(plan, max_tasks=FANOUT_MAX_TASKS):
+    """Tasks of a valid plan in dependency order; raises InvalidPlan for unknown agents, ids or cycles."""
+    tasks = {}
+    for task in plan.tasks:
+        if task.id in tasks:
+            raise InvalidPlan(f'Duplicate task id {task.id}')
+        if task.agent not in RESEARCH_AGENTS:
+            raise InvalidPlan(f'Unknown agent {task.agent} for task {task.id}')
+        tasks[task.id] = task
+    if not tasks or len(tasks) > max_tasks:
+        raise InvalidPlan(f'Plan has {len(tasks)} tasks, expected 1 to {max_tasks}')
+    for task in tasks.values():
+        unknown = set(task.depends_on) - set(tasks)
+        if unknown:
+            raise InvalidPlan(f'Task {task.id} depends on unknown tasks {sorted(unknown)}')
+
+    ordered, done = [], set()
+    while len(ordered) < len(tasks):
+        ready = [t for t in tasks.values() if t.id not in done and set(t.depends_on) <= done]
+        if not ready:
+            raise InvalidPlan('Task dependencies form a cycle')
+        ordered.extend(ready)
+        done.update(t.id for t in ready)
+    return ordered
+
+
+def final_tasks(tasks):
+    """Ids of the tasks no other task depends on, in plan order: the ones that feed the critic and output."""
+    dependencies = {dependency for task in tasks for dependency in task.depends_on}
+    return [task.id for task in tasks if task.id not in dependencies]
+
+
+class TimeboxedAgent:
+    """Graph node executor that gives up on its agent after ``timeout`` seconds.
+
+    Instead of failing the graph (which is what a node timeout does), the node
+    completes with a note that its findings are missing, so the join and the
+    final report still run. Tool calls already in a worker thread finish in the
+    background.
+    """
+
+    def __init__(self, agent, timeout=FANOUT_BRANCH_TIMEOUT):
+        self.agent = agent
+        self.timeout = timeout
+        self.name = agent.name
+
+    @property
+    def messages(self):
+        return self.agent.messages
+
+    @messages.setter
+    def messages(self, messages):
+        # The graph resets node executors when it restores a checkpoint
+        self.agent.messages = messages
+
+    def _timed_out(self, started):
+        text = (f'Research task {self.name} did not finish within {self.timeout:.0f}s '
+                f'(stopped after {time.monotonic() - started:.0f}s); its findings are missing from this report.')
+        return AgentResult(stop_reason='end_turn', message={'role': 'assistant', 'content': [{'text': text}]},
+                           metrics=EventLoopMetrics(), state={})
+
+    async def stream_async(self, prompt=None, **kwargs):
+        started = time.monotonic()
+        stream = self.agent.stream_async(prompt, **kwargs)
+        try:
+            async with asyncio.timeout(self.timeout):
+                async for event in stream:
+                    yield event
+        except TimeoutError:
+            print(f'Fan-out branch {self.name} timed out after {self.timeout:.0f}s')
+            yield {'result': self._timed_out(started)}
+        finally:
+            await stream.aclose()
+
+    async def invoke_async(self, prompt=None, **kwargs):
+        result = None
+        async for event in self.stream_async(prompt, **kwargs):
+            if 'result' in event:
+                result = event['result']
+        return result
+
+    def __call__(self, prompt=None, **kwargs):
+        return asyncio.run(self.invoke_async(prompt, **kwargs))
+
+
+async def plan_research(task, max_tasks=FANOUT_MAX_TASKS):
+    """Ask the planner for a task graph; None if it cannot produce a valid one."""
+    planner = create_planner_agent()
+    planner.system_prompt = planner.system_prompt + planner_dag_prompt.format(max_tasks=max_tasks)
+    try:
+        result = await planner.invoke_async(task, structured_output_model=ResearchPlan)
+        plan = result.structured_output
+        order_tasks(plan, max_tasks)
+        return plan
+    except Exception as e:
+        print(f'Planner did not produce a usable task graph, using the swarm: {e}')
+        return None
+
+
+def _all_completed(node_ids):
+    node_ids = set(node_ids)
+
+    def condition(state):
+        return node_ids <= {node.node_id for node in state.completed_nodes}
+
+    return condition
+
+
+def build_fanout_graph(plan, branch_timeout=FANOUT_BRANCH_TIMEOUT, execution_timeout=FANOUT_EXECUTION_TIMEOUT,
+                       session_manager=None, hooks=None):
+    """research tasks (parallel where independent) -> critic (joins all of them) -> output."""
+    builder = GraphBuilder()
+    tasks = order_tasks(plan)
+    for task in tasks:
+        agent = AGENT_FACTORIES[task.agent]()
+        agent.system_prompt = (agent.system_prompt + '\n\n## Your assignment in this research plan\n'
+                               f'Report: {plan.summary}\nYour task ({task.id}): {task.instruction}\n'
+                               'Do only this task and hand back your findings; other agents cover the rest.')
+        builder.add_node(TimeboxedAgent(agent, branch_timeout), task.id)
+    for task in tasks:
+        for dependency in task.depends_on:
+            builder.add_edge(dependency, task.id, condition=_all_completed(task.depends_on))
+        if not task.depends_on:
+            builder.set_entry_point(task.id)
+
+    task_ids = [task.id for task in tasks]
+    builder.add_node(create_critic_agent(), 'critic')
+    builder.add_node(create_final_response_agent(), 'output')
+    # A task another task depends on already reaches the critic and output through it
+    for task_id in final_tasks(tasks):
+        builder.add_edge(task_id, 'critic', condition=_all_completed(task_ids))
+        builder.add_edge(task_id, 'output', condition=_all_completed(task_ids + ['critic']))
+    builder.add_edge('critic', 'output', condition=_all_completed(task_ids + ['critic']))
+    builder.set_execution_timeout(execution_timeout)
+    if session_manager is not None:
+        builder.set_session_manager(session_manager)
+    if hooks:
+        builder.set_hook_providers(hooks)
+    return builder.build()
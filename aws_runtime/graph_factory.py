@@ -0,0 +1,63 @@
+import os
+
+from strands.multiagent import GraphBuilder, Swarm
+
+from aws_agents.all_agents import (create_chart_agent, create_coding_agent, create_critic_agent,
+                                   create_final_response_agent, create_financial_analyst_agent,
+                                   create_market_data_agent, create_planner_agent)
+from aws_runtime.fanout import build_fanout_graph, plan_research
+from aws_runtime.instrumentation import span
+
+# swarm: one agent at a time; fanout (opt-in): the planner returns a task graph whose independent tasks run in parallel
+RESEARCH_MODE = os.getenv('RESEARCH_MODE', 'swarm')
+
+
+def build_research_graph(session_manager=None, hooks=None):
+    """A fresh planner -> research swarm -> output graph for one request.
+
+    Agents keep their conversation in memory, so sharing them between
+    concurrent requests would mix message histories; building them is cheap
+    because models, boto3 clients and tools are shared. ``session_manager``
+    and ``hooks`` go to both the graph and the swarm (see aws_runtime.jobs).
+    """
+    swarm = Swarm(
+        [create_financial_analyst_agent(), create_coding_agent(), create_chart_agent(), create_market_data_agent(),
+         create_critic_agent()],
+        max_handoffs=30,
+        max_iterations=90,
+        execution_timeout=7200.0,  # 15 minutes
+        node_timeout=1800.0,       # 5 minutes per agent
+        repetitive_handoff_detection_window=10,  # There must be >= 3 unique agents in the last 8 handoffs
+        repetitive_handoff_min_unique_agents=5,
+        session_manager=session_manager,
+        hooks=hooks,
+    )
+
+    builder = GraphBuilder()
+    builder.add_node(create_planner_agent(), "planner")
+    builder.add_node(swarm, "research")
+    builder.add_node(create_final_response_agent(), "output")
+    builder.add_edge("planner", "research")
+    builder.add_edge("research", "output")
+    if session_manager is not None:
+        builder.set_session_manager(session_manager)
+    if hooks:
+        builder.set_hook_providers(hooks)
+    return builder.build()
+
+
+async def prepare_research_graph(task, mode=None, plan=None, session_manager=None, hooks=None):
+    """The graph to run for ``task`` and, in fan-out mode, the plan it was built from.
+
+    Fan-out plans up front, outside the graph; when the planner cannot produce
+    a valid task graph the request falls back to the swarm. A resumed job
+    passes the plan it was first built from instead of planning again.
+    """
+    if (mode or RESEARCH_MODE) == 'fanout':
+        if plan is None:
+            with span('node', 'planner') as values:
+                plan = await plan_research(task)
+                values['status'] = 'completed' if plan is not None else 'failed'
+        if plan is not None:
+            return build_fanout_graph(plan, session_manager=session_manager, hooks=hooks), plan
+    return build_research_graph(session_manager, hooks), None
@@ -0,0 +1,215 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+from opentelemetry import trace
+from strands.hooks import AfterToolCallEvent, BeforeToolCallEvent, HookProvider
+
+# Write each request's JSON summary here as <request_id>.json (besides printing it); empty disables
+REQUEST_TRACE_DIR = os.getenv('REQUEST_TRACE_DIR', '')
+# USD per million input/output tokens, for cost estimates; override or extend with MODEL_PRICES='{"model-id": [in, out]}'
+MODEL_PRICES = {
+    'us.anthropic.claude-3-7-sonnet-20250219-v1:0': (3.0, 15.0),
+    'global.anthropic.claude-sonnet-4-20250514-v1:0': (3.0, 15.0),
+    'us.anthropic.claude-opus-4-20250514-v1:0': (15.0, 75.0),
+    'us.anthropic.claude-3-5-haiku-20241022-v1:0': (0.8, 4.0),
+    'us.meta.llama4-maverick-17b-instruct-v1:0': (0.24, 0.97),
+    'us.amazon.nova-premier-v1:0': (2.5, 12.5),
+    'us.amazon.nova-micro-v1:0': (0.035, 0.14),
+    'openai.gpt-oss-120b-1:0': (0.15, 0.6),
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv('MODEL_PRICES', '{}')).items()})
+# Cache reads are billed at a tenth of the input price on Bedrock, cache writes at a quarter more
+CACHE_READ_PRICE_FACTOR = 0.1
+CACHE_WRITE_PRICE_FACTOR = 1.25
+
+tracer = trace.get_tracer('market_data_analysis')
+
+_current = contextvars.ContextVar('request_trace', default=None)
+_listeners = []
+
+
+def model_cost(model_id, input_tokens, output_tokens, cache_read_tokens=0, cache_write_tokens=0):
+    price_in, price_out = MODEL_PRICES.get(model_id, (0.0, 0.0))
+    return (input_tokens * price_in + cache_read_tokens * price_in * CACHE_READ_PRICE_FACTOR
+            + cache_write_tokens * price_in * CACHE_WRITE_PRICE_FACTOR + output_tokens * price_out) / 1e6
+
+
+class RequestTrace:
+    """Timings, token counts and costs of one request, grouped into stages.
+
+    A stage is ``kind:name``, e.g. ``node:planner``, ``model:<model id>``,
+    ``tool:get_daily_features``, ``interpreter:start_session`` or
+    ``http:news``. Spans from worker threads and parallel branches land in the
+    same trace because the context variable that holds it is copied into them.
+    """
+
+    def __init__(self, request_id=None, **attributes):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.attributes = attributes
+        self.started = time.time()
+        self.finished = None
+        self.handoffs = []
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, duration, **values):
+        """Add one occurrence of a stage; numeric ``values`` are summed."""
+        key = f'{kind}:{name}'
+        with self._lock:
+            stage = self._stages.get(key)
+            if stage is None:
+                stage = self._stages[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            stage['count'] += 1
+            stage['total_ms'] += duration * 1000
+            stage['max_ms'] = max(stage['max_ms'], duration * 1000)
+            for field, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage[field] = stage.get(field, 0) + value
+                elif value is not None:
+                    stage[field] = value
+
+    def observe(self, event):
+        """Record node timings and handoffs from a normalized stream event (see aws_runtime.streaming)."""
+        if event.get('type') == 'node_stop':
+            kind = 'node' if event.get('parent') is None else f'node:{event["parent"]}'
+            self.record(kind, event['node'], (event.get('execution_time_ms') or 0) / 1000,
+                        status=event.get('status'))
+        elif event.get('type') == 'handoff':
+            with self._lock:
+                self.handoffs.append({'at_ms': round((time.time() - self.started) * 1000), 'parent': event['parent'],
+                                      'from': event['from'], 'to': event['to']})
+
+    def summary(self):
+        with self._lock:
+            stages = {key: {field: round(value, 1) if isinstance(value, float) and field != 'cost_usd' else value
+                            for field, value in stage.items()}
+                      for key, stage in self._stages.items()}
+            handoffs = list(self.handoffs)
+        tokens = {'input': 0, 'output': 0, 'cache_read': 0, 'cache_write': 0}
+        cost = 0.0
+        for key, stage in stages.items():
+            if key.startswith('model:'):
+                tokens['input'] += stage.get('input_tokens', 0)
+                tokens['output'] += stage.get('output_tokens', 0)
+                tokens['cache_read'] += stage.get('cache_read_tokens', 0)
+                tokens['cache_write'] += stage.get('cache_write_tokens', 0)
+                cost += stage.get('cost_usd', 0.0)
+                if stage.get('first_token_ms'):
+                    stage['avg_ttft_ms'] = round(stage['first_token_ms'] / stage['count'], 1)
+        end = self.finished or time.time()
+        return {'request_id': self.request_id, **self.attributes, 'total_ms': round((end - self.started) * 1000, 1),
+                'tokens': tokens, 'cost_usd': round(cost, 6), 'stages': stages, 'handoffs': handoffs}
+
+
+def current_trace():
+    return _current.get()
+
+
+def bind_trace(request_trace):
+    """Make ``request_trace`` current for the running task (and tasks/threads started from it)."""
+    _current.set(request_trace)
+
+
+def add_trace_listener(listener):
+    """Call ``listener(summary)`` with every finished request's summary (used by the benchmark)."""
+    _listeners.append(listener)
+
+
+def start_request_trace(**attributes):
+    request_trace = RequestTrace(**attributes)
+    bind_trace(request_trace)
+    return request_trace
+
+
+def finish_request_trace(request_trace, **attributes):
+    """Close the trace, print its JSON summary, write it to REQUEST_TRACE_DIR and notify listeners."""
+    if request_trace is None or request_trace.finished is not None:
+        return None
+    request_trace.finished = time.time()
+    request_trace.attributes.update(attributes)
+    summary = request_trace.summary()
+    print('Request trace:', json.dumps(summary, default=str))
+    if REQUEST_TRACE_DIR:
+        os.makedirs(REQUEST_TRACE_DIR, exist_ok=True)
+        with open(os.path.join(REQUEST_TRACE_DIR, f'{request_trace.request_id}.json'), 'w') as f:
+            json.dump(summary, f, indent=2, default=str)
+    for listener in list(_listeners):
+        listener(summary)
+    return summary
+
+
+@contextlib.contextmanager
+def _detached_span(name, attributes):
+    otel_span = tracer.start_span(name, attributes=attributes)
+    try:
+        yield otel_span
+    finally:
+        otel_span.end()
+
+
+@contextlib.contextmanager
+def span(kind, name, current=True, **attributes):
+    """Time a block as an OpenTelemetry span and as a stage of the current request trace.
+
+    Yields a dict; values put into it are added to the span and the stage
+    (e.g. token counts known only at the end). Use ``current=False`` inside
+    async generators, where the block may not end in the context it started in.
+    """
+    values = {}
+    started = time.perf_counter()
+    otel_attributes = {f'market_data.{k}': v for k, v in attributes.items() if isinstance(v, (str, int, float, bool))}
+    if current:
+        manager = tracer.start_as_current_span(f'{kind} {name}', attributes=otel_attributes)
+    else:
+        manager = _detached_span(f'{kind} {name}', otel_attributes)
+    with manager as otel_span:
+        try:
+            yield values
+        except BaseException as e:
+            values.setdefault('error', type(e).__name__)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            for key, value in values.items():
+                if isinstance(value, (str, int, float, bool)):
+                    otel_span.set_attribute(f'market_data.{key}', value)
+            request_trace = _current.get()
+            if request_trace is not None:
+                request_trace.record(kind, name, duration, **values)
+
+
+class ToolTimingHooks(HookProvider):
+    """Records every tool call of an agent as a ``tool:<name>`` stage.
+
+    Strands already exports tool calls as OpenTelemetry spans, so this only
+    feeds the request trace.
+    """
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def register_hooks(self, registry, **kwargs):
+        registry.add_callback(BeforeToolCallEvent, self._before)
+        registry.add_callback(AfterToolCallEvent, self._after)
+
+    def _before(self, event):
+        with self._lock:
+            self._started[event.tool_use['toolUseId']] = time.perf_counter()
+
+    def _after(self, event):
+        with self._lock:
+            started = self._started.pop(event.tool_use['toolUseId'], None)
+        request_trace = _current.get()
+        if started is None or request_trace is None:
+            return
+        failed = event.exception is not None or (event.result or {}).get('status') == 'error'
+        request_trace.record('tool', event.tool_use['name'], time.perf_counter() - started, errors=int(failed))
+
+
+tool_timing_hooks = ToolTimingHooks()
@@ -0,0 +1,286 @@
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+from strands.hooks import AfterNodeCallEvent, HookProvider
+from strands.multiagent import Swarm
+from strands.session.repository_session_manager import RepositorySessionManager
+
+from aws_runtime.checkpoints import DocumentSessionRepository, create_document_store
+from aws_runtime.fanout import ResearchPlan
+from aws_runtime.graph_factory import RESEARCH_MODE, prepare_research_graph
+from aws_runtime.instrumentation import bind_trace, finish_request_trace, start_request_trace
+from aws_runtime.streaming import normalize_event
+from aws_tools.code_interpreter import close_interpreter_scope, enter_interpreter_scope
+
+# Research jobs running at once in this process; more wait in line (they do not count against MAX_CONCURRENT_REQUESTS)
+MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', '4'))
+# A running job refreshes its heartbeat this often; one not heard from for JOB_LEASE_SECONDS is considered interrupted
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '30'))
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '180'))
+# Runs of one job (the first one plus resumes) before it is left failed
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Conditional job writes that lost to another writer are retried this many times before giving up
+JOB_UPDATE_ATTEMPTS = int(os.getenv('JOB_UPDATE_ATTEMPTS', '10'))
+# Resume interrupted jobs found in the store when the first job request reaches this process
+JOB_RESUME_ON_START = os.getenv('JOB_RESUME_ON_START', 'true').lower() == 'true'
+
+QUEUED, RUNNING, COMPLETED, FAILED, INTERRUPTED = 'queued', 'running', 'completed', 'failed', 'interrupted'
+
+
+class JobNotFound(KeyError):
+    pass
+
+
+class JobConflict(Exception):
+    pass
+
+
+class JobProgressHooks(HookProvider):
+    """Records every finished graph node and swarm handoff on the job, next to the checkpoint strands writes."""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+
+    def register_hooks(self, registry, **kwargs):
+        registry.add_callback(AfterNodeCallEvent, self._node_done)
+
+    async def _node_done(self, event):
+        node = f'research/{event.node_id}' if isinstance(event.source, Swarm) else event.node_id
+
+        def update(job):
+            job['checkpoints'] = job.get('checkpoints', 0) + 1
+            job['completed_nodes'] = job.get('completed_nodes', []) + [node]
+
+        # The store may be remote (S3): keep its round trips off the event loop
+        await asyncio.to_thread(self.runner.update, self.job_id, update)
+
+
+class JobRunner:
+    """Runs research requests as background jobs whose progress survives the process.
+
+    A job is a document in the store (prompt, status, plan, progress,
+    result). While it runs, the graph and the research swarm are checkpointed
+    to the same store after every node and handoff through a strands session
+    whose id is the job id. Resuming a job rebuilds the graph from the saved
+    plan, and strands restores the finished nodes from the checkpoint, so
+    only the nodes that had not finished run again. A process takes a job
+    over with a conditional write (see ``claim``), so when several share a
+    store only one of them resumes it.
+
+    ``submit``, ``resume`` and ``recover`` are coroutines: they start jobs on
+    the running loop and do their store I/O in a worker thread.
+    """
+
+    def __init__(self, store=None, app=None, on_result=None, max_concurrent=MAX_CONCURRENT_JOBS):
+        self.store = store or create_document_store()
+        self.repository = DocumentSessionRepository(self.store)
+        self.app = app
+        self.on_result = on_result
+        self.max_concurrent = max_concurrent
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._tasks = {}
+        self._semaphore = None
+        self._loop = None
+        self._recovered = False
+        self._lock = threading.Lock()
+
+    def _semaphore_for_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    def get(self, job_id):
+        job = self.store.get('jobs', job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return job
+
+    def update(self, job_id, change, attempts=JOB_UPDATE_ATTEMPTS):
+        """Apply ``change(job)`` to the stored job and refresh its heartbeat; returns the job.
+
+        The write is conditional on the job being unchanged since it was read,
+        so a concurrent claim or update from another process is never
+        overwritten: on a conflict ``change`` is applied again to the newer
+        job. Raises JobConflict if every attempt loses.
+        """
+        with self._lock:
+            for attempt in range(attempts):
+                job, version = self.store.get_versioned('jobs', job_id)
+                if job is None:
+                    raise JobNotFound(job_id)
+                change(job)
+                job['updated_at'] = job['heartbeat_at'] = time.time()
+                if self.store.put_if_unchanged('jobs', job_id, job, version):
+                    return job
+                time.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+        raise JobConflict(f'Job {job_id} kept changing; gave up after {attempts} attempts')
+
+    def _status(self, job):
+        status = job['status']
+        if status in (QUEUED, RUNNING) and job['job_id'] not in self._tasks \
+                and time.time() - job['heartbeat_at'] > JOB_LEASE_SECONDS:
+            status = INTERRUPTED
+        return status
+
+    def status(self, job_id):
+        job = self.get(job_id)
+        status = self._status(job)
+        return {'job_id': job_id, 'status': status, 'created_at': job['created_at'], 'updated_at': job['updated_at'],
+                'attempts': job['attempts'], 'research_mode': job['research_mode'],
+                'completed_nodes': job.get('completed_nodes', []), 'error': job.get('error'),
+                'resumable': status in (FAILED, INTERRUPTED) and job['attempts'] < JOB_MAX_ATTEMPTS}
+
+    def result(self, job_id):
+        job = self.get(job_id)
+        if job['status'] != COMPLETED:
+            return self.status(job_id)
+        return {'job_id': job_id, 'status': COMPLETED, 'html': job['result_html']}
+
+    async def submit(self, prompt, user_input, research_mode=None, result_html=None):
+        """Store a new job and start it; with ``result_html`` (a cached answer) it is stored already completed."""
+        now = time.time()
+        job = {'job_id': uuid.uuid4().hex, 'prompt': prompt, 'user_input': user_input,
+               'research_mode': research_mode or RESEARCH_MODE, 'plan': None, 'status': QUEUED, 'attempts': 0,
+               'owner': self.owner, 'created_at': now, 'updated_at': now, 'heartbeat_at': now,
+               'checkpoints': 0, 'completed_nodes': [], 'result_html': result_html, 'error': None}
+        if result_html is not None:
+            job['status'] = COMPLETED
+        await asyncio.to_thread(self.store.put, 'jobs', job['job_id'], job)
+        if result_html is None:
+            self._start(job['job_id'])
+        return await asyncio.to_thread(self.status, job['job_id'])
+
+    def claim(self, job_id, force=False, states=(FAILED, INTERRUPTED)):
+        """Take a job in one of ``states`` over for this process, as a conditional write to the store.
+
+        Returns False when the job is not resumable, or when another process
+        changed it first (e.g. claimed it too).
+        """
+        job, version = self.store.get_versioned('jobs', job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        if job_id in self._tasks or self._status(job) not in states:
+            return False
+        if job['attempts'] >= JOB_MAX_ATTEMPTS and not force:
+            return False
+        now = time.time()
+        job.update(status=QUEUED, owner=self.owner, error=None, updated_at=now, heartbeat_at=now)
+        return self.store.put_if_unchanged('jobs', job_id, job, version)
+
+    async def resume(self, job_id, force=False):
+        """Run an interrupted or failed job again from its last checkpoint."""
+        if await asyncio.to_thread(self.claim, job_id, force):
+            self._start(job_id)
+        return await asyncio.to_thread(self.status, job_id)
+
+    async def recover(self):
+        """Resume this store's interrupted jobs once per process (JOB_RESUME_ON_START)."""
+        if self._recovered or not JOB_RESUME_ON_START:
+            return []
+        self._recovered = True
+        resumed = await asyncio.to_thread(self._claim_interrupted)
+        for job_id in resumed:
+            self._start(job_id)
+        return resumed
+
+    def _claim_interrupted(self):
+        claimed = []
+        for job_id in self.store.list('jobs'):
+            if self.claim(job_id, states=(INTERRUPTED,)):
+                print(f'Resuming interrupted job {job_id}')
+                claimed.append(job_id)
+        return claimed
+
+    def _start(self, job_id):
+        task = asyncio.get_running_loop().create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            await asyncio.to_thread(self.update, job_id, lambda stored: None)
+
+    async def _run(self, job_id):
+        # Waiting for a slot counts as alive too, so no other process takes the job over meanwhile
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            async with self._semaphore_for_loop():
+                await self._execute(job_id)
+        finally:
+            heartbeat.cancel()
+
+    async def _execute(self, job_id):
+        def start(stored):
+            # Another process claimed the job while this one waited for a slot: leave it to them
+            if stored['owner'] == self.owner:
+                stored.update(status=RUNNING, attempts=stored['attempts'] + 1)
+
+        job = await asyncio.to_thread(self.update, job_id, start)
+        if job['owner'] != self.owner:
+            print(f'Job {job_id} was taken over by {job["owner"]}')
+            return
+        task_id = self.app.add_async_task('research_job', {'job_id': job_id}) if self.app is not None else None
+        request_trace = start_request_trace(job_id=job_id, attempt=job['attempts'], stream=False)
+        bind_trace(request_trace)
+        scope = enter_interpreter_scope()
+        status = FAILED
+        try:
+            result = await self._run_graph(job, request_trace)
+            html = str(result.results['output'].result) if 'output' in result.results else None
+            status = COMPLETED if getattr(result.status, 'value', None) == COMPLETED and html else FAILED
+            await asyncio.to_thread(self.update, job_id, lambda stored: stored.update(
+                status=status, result_html=html, error=None if status == COMPLETED else 'The graph did not complete'))
+            if status == COMPLETED and self.on_result is not None:
+                await asyncio.to_thread(self.on_result, job['prompt'], result)
+        except Exception as e:
+            print(f'Job {job_id} failed: {e}')
+            error = str(e)
+            await asyncio.to_thread(self.update, job_id, lambda stored: stored.update(status=FAILED, error=error))
+        finally:
+            await asyncio.to_thread(close_interpreter_scope, scope)
+            finish_request_trace(request_trace, status=status)
+            if task_id is not None:
+                self.app.complete_async_task(task_id)
+
+    async def _run_graph(self, job, request_trace):
+        job_id = job['job_id']
+        plan = ResearchPlan.model_validate(job['plan']) if job.get('plan') else None
+        session_manager = RepositorySessionManager(job_id, self.repository)
+        graph, plan = await prepare_research_graph(job['user_input'], job['research_mode'], plan=plan,
+                                                   session_manager=session_manager,
+                                                   hooks=[JobProgressHooks(self, job_id)])
+        if job.get('plan') is None:
+            # A resumed job must rebuild the same graph, so the planner's answer is part of the job
+            await asyncio.to_thread(self.update, job_id, lambda stored: stored.update(
+                plan=plan.model_dump() if plan is not None else None,
+                research_mode='fanout' if plan is not None else 'swarm'))
+        result = None
+        async for event in graph.stream_async(job['user_input']):
+            for normalized in normalize_event(event, token_nodes=()):
+                request_trace.observe(normalized)
+            if event.get('type') == 'multiagent_result':
+                result = event['result']
+        return result
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner(app=None, on_result=None):
+    """Process-wide JobRunner; ``app`` and ``on_result`` are taken from the first call."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner(app=app, on_result=on_result)
+    return _runner
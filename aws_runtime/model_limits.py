@@ -0,0 +1,128 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
+import time
+import weakref
+
+from strands.models import Model
+
+from aws_runtime.instrumentation import model_cost, span
+
+# Model calls in flight across every agent and request of the process (Bedrock throttles per account and model)
+BEDROCK_MAX_CONCURRENCY = int(os.getenv('BEDROCK_MAX_CONCURRENCY', '16'))
+
+
+class ConcurrencyLimiter:
+    """Counting semaphore for async model calls.
+
+    asyncio primitives are bound to one event loop, so there is one semaphore
+    per loop; the app runs every request on its worker loop, which makes the
+    limit process-wide in practice.
+    """
+
+    def __init__(self, limit=BEDROCK_MAX_CONCURRENCY):
+        self.limit = limit
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {'in_flight': 0, 'waiting': 0, 'calls': 0, 'peak': 0}
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        return semaphore
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        semaphore = self._semaphore()
+        with self._lock:
+            self._stats['waiting'] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            with self._lock:
+                self._stats['waiting'] -= 1
+        with self._lock:
+            self._stats['in_flight'] += 1
+            self._stats['calls'] += 1
+            self._stats['peak'] = max(self._stats['peak'], self._stats['in_flight'])
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stats['in_flight'] -= 1
+            semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, limit=self.limit)
+
+
+bedrock_limiter = ConcurrencyLimiter()
+
+# Set by a caller that needs to know when its call queues for a limiter slot and when it gets one (see
+# TieredModel); called with 'waiting' and then 'acquired'
+slot_listener = contextvars.ContextVar('model_slot_listener', default=None)
+
+
+class LimitedModel(Model):
+    """Wraps a model so each streamed call holds a limiter slot for as long as the response streams.
+
+    Every call is also recorded as a ``model:<model id>`` stage with the time
+    spent waiting for a slot, time to first token, token counts and cost.
+    """
+
+    def __init__(self, model, limiter=bedrock_limiter):
+        self.model = model
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        # Everything else (config, model-specific helpers) is the wrapped model's
+        return getattr(self.__dict__['model'], name)
+
+    def update_config(self, **model_config):
+        self.model.update_config(**model_config)
+
+    def get_config(self):
+        return self.model.get_config()
+
+    def _model_id(self):
+        config = self.model.get_config() or {}
+        return config.get('model_id') or type(self.model).__name__
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        async with self.limiter.slot():
+            async for event in self.model.structured_output(output_model, prompt, system_prompt=system_prompt,
+                                                            **kwargs):
+                yield event
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        model_id = self._model_id()
+        listener = slot_listener.get()
+        with span('model', model_id, current=False) as values:
+            waiting = time.perf_counter()
+            if listener is not None:
+                listener('waiting')
+            async with self.limiter.slot():
+                if listener is not None:
+                    listener('acquired')
+                started = time.perf_counter()
+                values['wait_ms'] = (started - waiting) * 1000
+                first_token = True
+                async for event in self.model.stream(messages, tool_specs, system_prompt, **kwargs):
+                    if first_token and 'contentBlockDelta' in event:
+                        first_token = False
+                        values['first_token_ms'] = (time.perf_counter() - started) * 1000
+                    if 'metadata' in event:
+                        usage = event['metadata'].get('usage', {})
+                        values['input_tokens'] = usage.get('inputTokens', 0)
+                        values['output_tokens'] = usage.get('outputTokens', 0)
+                        values['cache_read_tokens'] = usage.get('cacheReadInputTokens', 0)
+                        values['cache_write_tokens'] = usage.get('cacheWriteInputTokens', 0)
+                        values['cost_usd'] = model_cost(model_id, values['input_tokens'], values['output_tokens'],
+                                                        values['cache_read_tokens'], values['cache_write_tokens'])
+                    yield event
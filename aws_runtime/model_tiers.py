@@ -0,0 +1,218 @@
+import asyncio
+import json
+import os
+
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError
+from strands.models import Model
+from strands.types.exceptions import ModelThrottledException
+
+from aws_runtime.instrumentation import current_trace
+from aws_runtime.model_limits import slot_listener
+
+# Seconds a model may take to start streaming before the call is abandoned for the next model of the role
+MODEL_FIRST_TOKEN_TIMEOUT = float(os.getenv('MODEL_FIRST_TOKEN_TIMEOUT', '45'))
+# Seconds a hedged role waits for its first model before asking the next one as well
+MODEL_HEDGE_DELAY = float(os.getenv('MODEL_HEDGE_DELAY', '5'))
+# Per-role overrides of models, hedge, hedge_delay, first_token_timeout and max_tokens, e.g.
+# MODEL_TIERS='{"planner": {"models": ["Claude4", "OpenAI"], "hedge": false}}'
+MODEL_TIERS = json.loads(os.getenv('MODEL_TIERS', '{}'))
+# botocore attempts per call for every model of a tier but the last, so a throttled call fails over to the next
+# model right away instead of backing off on the same one; the last model keeps BEDROCK_MAX_ATTEMPTS
+MODEL_TIER_MAX_ATTEMPTS = int(os.getenv('MODEL_TIER_MAX_ATTEMPTS', '1'))
+
+# Bedrock errors worth trying another model for; anything else (bad request, context overflow) is raised as is
+FAILOVER_ERROR_CODES = {'ThrottlingException', 'throttlingException', 'ServiceUnavailableException',
+                        'InternalServerException', 'ModelNotReadyException', 'ModelTimeoutException',
+                        'ModelErrorException', 'ServiceQuotaExceededException'}
+
+
+class FirstTokenTimeout(Exception):
+    pass
+
+
+def is_failover_error(error):
+    if isinstance(error, (ModelThrottledException, FirstTokenTimeout, BotocoreConnectionError)):
+        return True
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in FAILOVER_ERROR_CODES
+
+
+def _model_id(model):
+    config = model.get_config() or {}
+    return config.get('model_id') or type(model).__name__
+
+
+class TieredModel(Model):
+    """Serves one agent role from an ordered list of models.
+
+    A call goes to the first model; if it is throttled, fails with a
+    transient error or has not started streaming within
+    ``first_token_timeout`` seconds, the next model takes over. With
+    ``hedge_delay`` set, the next model is also asked once the current one
+    has been silent that long, and whichever starts streaming first answers;
+    the other call is cancelled. Once a response has started it is never
+    switched, so the agent sees a single model's output. Failovers, hedges
+    and the model that answered are recorded as a ``tier:<role>`` stage.
+
+    Both clocks run from when a call holds its slot of the local model
+    limiter (see aws_runtime.model_limits), not while it is queued for one:
+    hedging or abandoning calls that are only waiting on local load would
+    queue more calls behind them.
+    """
+
+    def __init__(self, role, models, first_token_timeout=MODEL_FIRST_TOKEN_TIMEOUT, hedge_delay=None):
+        self.role = role
+        self.models = list(models)
+        self.first_token_timeout = first_token_timeout
+        self.hedge_delay = hedge_delay
+
+    def update_config(self, **model_config):
+        for model in self.models:
+            model.update_config(**model_config)
+
+    def get_config(self):
+        return self.models[0].get_config()
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        for index, model in enumerate(self.models):
+            started = False
+            try:
+                async for event in model.structured_output(output_model, prompt, system_prompt=system_prompt,
+                                                           **kwargs):
+                    started = True
+                    yield event
+                return
+            except Exception as e:
+                if started or index == len(self.models) - 1 or not is_failover_error(e):
+                    raise
+                self._record(0, failovers=1)
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        candidates = iter(self.models)
+        # Calls waiting for their first event: task -> {'model', 'generator', 'clock'}, where the clock is when the
+        # call started and None while it is queued for a limiter slot
+        pending = {}
+        errors = []
+        counts = {'failovers': 0, 'hedges': 0, 'timeouts': 0}
+        changed = asyncio.Event()
+
+        def launch():
+            model = next(candidates, None)
+            if model is None:
+                return False
+            call = {'model': model, 'clock': loop.time()}
+
+            def on_slot(state):
+                call['clock'] = loop.time() if state == 'acquired' else None
+                changed.set()
+
+            # The task created here runs the call's first step, in a copy of this context
+            token = slot_listener.set(on_slot)
+            try:
+                call['generator'] = model.stream(messages, tool_specs, system_prompt, **kwargs)
+                pending[asyncio.ensure_future(call['generator'].__anext__())] = call
+            finally:
+                slot_listener.reset(token)
+            return True
+
+        def fail_over(model, error):
+            errors.append(error)
+            if is_failover_error(error) and not pending and launch():
+                counts['failovers'] += 1
+                print(f'Model tier {self.role}: {_model_id(model)} failed ({type(error).__name__}: {error}), '
+                      f'failing over')
+
+        launch()
+        winner = None
+        waker = None
+        try:
+            while winner is None and pending:
+                clocks = [call['clock'] for call in pending.values() if call['clock'] is not None]
+                deadlines = [clock + self.first_token_timeout for clock in clocks]
+                if self.hedge_delay is not None and len(pending) == 1 and clocks:
+                    deadlines.append(clocks[0] + self.hedge_delay)
+                # Also wake up when a call gets its slot, to start its clocks
+                changed.clear()
+                waker = asyncio.ensure_future(changed.wait())
+                done, _ = await asyncio.wait([*pending, waker],
+                                             timeout=max(0.0, min(deadlines) - loop.time()) if deadlines else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                waker.cancel()
+                for task in done:
+                    if task is waker:
+                        continue
+                    call = pending.pop(task)
+                    model, generator = call['model'], call['generator']
+                    error = task.exception()
+                    if error is not None and not isinstance(error, StopAsyncIteration):
+                        fail_over(model, error)
+                    elif winner is None:
+                        winner = (model, generator, None if error else task.result())
+                    else:
+                        await generator.aclose()
+                if winner is not None:
+                    break
+                now = loop.time()
+                for task, call in list(pending.items()):
+                    if call['clock'] is not None and now - call['clock'] >= self.first_token_timeout:
+                        del pending[task]
+                        task.cancel()
+                        counts['timeouts'] += 1
+                        fail_over(call['model'], FirstTokenTimeout(
+                            f'no response within {self.first_token_timeout:g}s'))
+                if self.hedge_delay is not None and len(pending) == 1:
+                    clock = next(iter(pending.values()))['clock']
+                    if clock is not None and now - clock >= self.hedge_delay and launch():
+                        counts['hedges'] += 1
+        finally:
+            for task in pending:
+                task.cancel()
+            if waker is not None:
+                waker.cancel()
+        if winner is None:
+            self._record(loop.time() - started, errors=1, **counts)
+            raise next((error for error in errors if not is_failover_error(error)), errors[-1])
+        model, generator, first = winner
+        self._record(loop.time() - started, served_by=_model_id(model), **counts)
+        if first is None:
+            return
+        yield first
+        async for event in generator:
+            yield event
+
+    def _record(self, duration, **values):
+        request_trace = current_trace()
+        if request_trace is not None:
+            request_trace.record('tier', self.role, duration, **values)
+
+
+def tier_configs(roles, known):
+    """Every role's tier (``roles`` with MODEL_TIERS applied on top), checked against the ``known`` model names.
+
+    Only names are checked, so a typo in MODEL_TIERS fails at startup while
+    the models themselves are built on first use (see tiered_model).
+    """
+    configs = {}
+    for role in {**roles, **MODEL_TIERS}:
+        config = {**roles.get(role, {}), **MODEL_TIERS.get(role, {})}
+        unknown = [name for name in config.get('models', []) if name not in known]
+        if unknown or not config.get('models'):
+            raise ValueError(f'Model tier {role}: unknown or missing models {unknown}; known: {sorted(known)}')
+        configs[role] = config
+    return configs
+
+
+def tiered_model(role, config, get_model):
+    """The TieredModel for ``role`` from its tier ``config``.
+
+    ``get_model(name, max_tokens, max_attempts)`` returns the named model, as
+    a copy with that output budget and botocore attempts when they are set.
+    Every model but the last is asked with MODEL_TIER_MAX_ATTEMPTS.
+    """
+    names = config['models']
+    candidates = [get_model(name, config.get('max_tokens'), None if name is names[-1] else MODEL_TIER_MAX_ATTEMPTS)
+                  for name in names]
+    hedge_delay = float(config.get('hedge_delay', MODEL_HEDGE_DELAY)) if config.get('hedge') else None
+    return TieredModel(role, candidates, float(config.get('first_token_timeout', MODEL_FIRST_TOKEN_TIMEOUT)),
+                       hedge_delay)
@@ -0,0 +1,92 @@
+import importlib
+import os
+import threading
+import time
+
+from aws_runtime.instrumentation import span
+
+# background: warm up in a thread while the runtime already answers; blocking: before it starts serving; off
+PREWARM = os.getenv('PREWARM', 'background')
+# Steps to run, in order (see PREWARM_STEPS)
+PREWARM_STEP_NAMES = [name.strip() for name in os.getenv(
+    'PREWARM_STEPS', 'imports,models,tools,agents,clients,charts').split(',') if name.strip()]
+
+# Modules main leaves to the first request that needs them: the research graph and job runner
+# (strands.multiagent), the polars data stack and sympy (strands_tools.calculator)
+DEFERRED_MODULES = ['aws_runtime.graph_factory', 'aws_runtime.jobs', 'aws_tools.market_lake', 'aws_tools.analytics',
+                    'aws_tools.backtest', 'strands_tools.calculator']
+
+
+def _imports():
+    for name in DEFERRED_MODULES:
+        importlib.import_module(name)
+
+
+def _models():
+    from aws_agents.all_agents import warm_models
+    warm_models()
+
+
+def _tools():
+    from aws_agents.all_agents import AGENT_TOOLS
+    AGENT_TOOLS.warm()
+
+
+def _agents():
+    # Building each agent once runs the tool registration and validation code paths ahead of the first request
+    from aws_agents.all_agents import AGENT_FACTORIES
+    for factory in AGENT_FACTORIES.values():
+        factory()
+
+
+def _clients():
+    from aws_runtime.result_cache import get_result_cache
+    from aws_runtime.router import ROUTER_ENABLED, get_classifier
+    from aws_tools.market_data_client import get_market_client
+
+    get_result_cache()
+    get_market_client()
+    if ROUTER_ENABLED:
+        get_classifier()
+
+
+def _interpreter():
+    from aws_tools.code_interpreter import get_interpreter_pool
+    get_interpreter_pool()
+
+
+def _charts():
+    from aws_tools.charts import get_chart_service
+    get_chart_service()
+
+
+PREWARM_STEPS = {'imports': _imports, 'models': _models, 'tools': _tools, 'agents': _agents, 'clients': _clients,
+                 'interpreter': _interpreter, 'charts': _charts}
+
+
+def prewarm(steps=None):
+    """Run the warm-up steps; a failing step is reported and skipped. Returns each step's seconds."""
+    timings = {}
+    for name in PREWARM_STEP_NAMES if steps is None else steps:
+        started = time.perf_counter()
+        try:
+            with span('prewarm', name):
+                PREWARM_STEPS[name]()
+        except Exception as e:
+            print(f'Pre-warm step {name} failed: {e}')
+        timings[name] = round(time.perf_counter() - started, 3)
+    print('Pre-warm done:', timings)
+    return timings
+
+
+def start_prewarm(mode=None):
+    """Start the warm-up as configured by PREWARM; returns the thread in background mode."""
+    mode = mode or PREWARM
+    if mode == 'blocking':
+        prewarm()
+    elif mode == 'background':
+        thread = threading.Thread(target=prewarm, name='prewarm', daemon=True)
+        thread.start()
+        return thread
+    elif mode != 'off':
+        raise ValueError(f'Unknown PREWARM: {mode}')
@@ -0,0 +1,243 @@
+import asyncio
+import gzip
+import hashlib
+import inspect
+import json
+import os
+import re
+import threading
+import time
+
+from strands.models import Model
+from strands.types._events import ToolResultEvent
+from strands.types.tools import AgentTool
+
+# off: call models and tools; record: call them and save every request/response; replay: serve the saved ones offline
+RECORD_MODE = os.getenv('RECORD_MODE', 'off')
+RECORDING_DIR = os.getenv('RECORDING_DIR', '.recordings')
+# Replayed responses take the recorded time multiplied by this; 0 replays instantly
+REPLAY_LATENCY_SCALE = float(os.getenv('REPLAY_LATENCY_SCALE', '1.0'))
+
+# The entrypoint appends the current time to every prompt; it must not change the recording key
+_VOLATILE = re.compile(r'###For clarification today date is: [^"\\]*')
+
+
+class RecordingMissing(Exception):
+    pass
+
+
+def request_key(*parts):
+    """Stable hash of a request.
+
+    Line order is ignored: a graph node gets the outputs of its parallel
+    dependencies in whatever order the graph iterates its edges, which
+    changes from run to run.
+    """
+    text = _VOLATILE.sub('', json.dumps(parts, sort_keys=True, default=str))
+    return hashlib.sha256('\n'.join(sorted(text.split('\\n'))).encode()).hexdigest()[:32]
+
+
+def _safe_name(name):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+
+
+class Recorder:
+    """Saves and loads recorded calls as gzipped JSON, one file per distinct request.
+
+    Files live under ``<directory>/<kind>/<name>/<key>.json.gz`` where kind is
+    ``models`` or ``tools``, so a recording can be inspected, pruned or
+    checked in per model or tool.
+    """
+
+    def __init__(self, directory=RECORDING_DIR, mode=RECORD_MODE, latency_scale=REPLAY_LATENCY_SCALE):
+        self.directory = directory
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._stats = {'recorded': 0, 'replayed': 0, 'missing': 0}
+
+    def _path(self, kind, name, key):
+        return os.path.join(self.directory, kind, _safe_name(name), f'{key}.json.gz')
+
+    def save(self, kind, name, key, record):
+        path = self._path(kind, name, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with gzip.open(temporary, 'wt') as f:
+            json.dump(record, f, default=str)
+        os.replace(temporary, path)
+        with self._lock:
+            self._stats['recorded'] += 1
+
+    def load(self, kind, name, key):
+        path = self._path(kind, name, key)
+        try:
+            with gzip.open(path, 'rt') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self._stats['missing'] += 1
+            raise RecordingMissing(f'No recording for {kind}/{name} request {key} in {self.directory}; '
+                                   f'run with RECORD_MODE=record first') from None
+        with self._lock:
+            self._stats['replayed'] += 1
+        return record
+
+    async def delay(self, seconds):
+        if self.latency_scale > 0 and seconds > 0:
+            await asyncio.sleep(seconds * self.latency_scale)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, mode=self.mode, directory=self.directory)
+
+
+class RecordingModel(Model):
+    """Wraps a model to record its streamed responses with their timing, or replay them without calling it."""
+
+    def __init__(self, model, recorder):
+        self.model = model
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['model'], name)
+
+    def update_config(self, **model_config):
+        self.model.update_config(**model_config)
+
+    def get_config(self):
+        return self.model.get_config()
+
+    def _model_id(self):
+        config = self.model.get_config() or {}
+        return config.get('model_id') or type(self.model).__name__
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        async for event in self.model.structured_output(output_model, prompt, system_prompt=system_prompt, **kwargs):
+            yield event
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        model_id = self._model_id()
+        key = request_key(model_id, system_prompt, messages, tool_specs, kwargs.get('tool_choice'))
+        if self.recorder.mode == 'replay':
+            record = self.recorder.load('models', model_id, key)
+            previous = 0.0
+            for offset, event in record['events']:
+                await self.recorder.delay(offset - previous)
+                previous = offset
+                yield event
+            return
+        started = time.perf_counter()
+        events = []
+        async for event in self.model.stream(messages, tool_specs, system_prompt, **kwargs):
+            events.append((round(time.perf_counter() - started, 4), event))
+            yield event
+        if self.recorder.mode == 'record':
+            await asyncio.to_thread(self.recorder.save, 'models', model_id, key,
+                                    {'model_id': model_id, 'events': events})
+
+
+def as_agent_tool(tool):
+    """The AgentTool behind ``tool``, which may be a strands_tools module."""
+    if inspect.ismodule(tool):
+        # strands_tools modules carry the decorated tool under their own name
+        return getattr(tool, tool.__name__.rsplit('.', 1)[-1])
+    return tool
+
+
+class RecordingTool(AgentTool):
+    """Wraps a tool to record its results, or replay them, keyed by tool name and input.
+
+    Direct calls (``tool(**kwargs)``, as the router makes) are recorded the
+    same way as calls from an agent.
+    """
+
+    def __init__(self, tool, recorder):
+        super().__init__()
+        self.tool = as_agent_tool(tool)
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['tool'], name)
+
+    @property
+    def tool_name(self):
+        return self.tool.tool_name
+
+    @property
+    def tool_spec(self):
+        return self.tool.tool_spec
+
+    @property
+    def tool_type(self):
+        return self.tool.tool_type
+
+    async def stream(self, tool_use, invocation_state, **kwargs):
+        key = request_key(self.tool_name, tool_use.get('input'))
+        if self.recorder.mode == 'replay':
+            record = self.recorder.load('tools', self.tool_name, key)
+            await self.recorder.delay(record['duration'])
+            yield ToolResultEvent(dict(record['result'], toolUseId=tool_use['toolUseId']))
+            return
+        started = time.perf_counter()
+        async for event in self.tool.stream(tool_use, invocation_state, **kwargs):
+            # Save before passing the result on: the executor stops iterating once it has it
+            if isinstance(event, ToolResultEvent) and self.recorder.mode == 'record':
+                await asyncio.to_thread(self.recorder.save, 'tools', self.tool_name, key,
+                                        {'tool': self.tool_name, 'input': tool_use.get('input'),
+                                         'result': event.tool_result,
+                                         'duration': round(time.perf_counter() - started, 4)})
+            yield event
+
+    def __call__(self, *args, **kwargs):
+        return _recorded_call(self.recorder, self.tool_name, self.tool, args, kwargs)
+
+
+def _recorded_call(recorder, name, func, args, kwargs):
+    key = request_key(name, args, kwargs)
+    if recorder.mode == 'replay':
+        record = recorder.load('tools', name, key)
+        time.sleep(record['duration'] * recorder.latency_scale)
+        return record['value']
+    started = time.perf_counter()
+    value = func(*args, **kwargs)
+    if recorder.mode == 'record':
+        recorder.save('tools', name, key, {'tool': name, 'args': args, 'kwargs': kwargs, 'value': value,
+                                           'duration': round(time.perf_counter() - started, 4)})
+    return value
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = Recorder()
+    return _recorder
+
+
+def recorded_model(model, recorder=None):
+    """``model`` wrapped for RECORD_MODE, or unchanged when recording is off."""
+    recorder = recorder or get_recorder()
+    return model if recorder.mode == 'off' else RecordingModel(model, recorder)
+
+
+def recorded_tool(tool, recorder=None):
+    recorder = recorder or get_recorder()
+    return tool if recorder.mode == 'off' else RecordingTool(tool, recorder)
+
+
+def recorded_tools(tools, recorder=None):
+    return [recorded_tool(tool, recorder) for tool in tools]
+
+
+def recorded_function(name, func, recorder=None):
+    """``func`` recorded under ``name`` like a direct tool call (its result must be JSON-serialisable)."""
+    recorder = recorder or get_recorder()
+    if recorder.mode == 'off':
+        return func
+    return lambda *args, **kwargs: _recorded_call(recorder, name, func, args, kwargs)
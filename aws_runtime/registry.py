@@ -0,0 +1,51 @@
+import threading
+
+
+class LazyRegistry:
+    """Shared objects built by ``factory(name)`` the first time they are asked for.
+
+    ``names`` are the entries a warm-up builds (other names can still be
+    asked for). Functions given to ``wrap`` are applied to every entry,
+    built already or later, e.g. to swap in stubs without building
+    everything first.
+    """
+
+    def __init__(self, factory, names=()):
+        self.factory = factory
+        self.names = list(names)
+        self._items = {}
+        self._wrappers = []
+        self._lock = threading.RLock()
+
+    def get(self, name):
+        item = self._items.get(name)
+        if item is None:
+            with self._lock:
+                item = self._items.get(name)
+                if item is None:
+                    item = self.factory(name)
+                    for wrapper in self._wrappers:
+                        item = wrapper(name, item)
+                    self._items[name] = item
+        return item
+
+    __getitem__ = get
+
+    def __contains__(self, name):
+        return name in self._items or name in self.names
+
+    def built(self):
+        with self._lock:
+            return dict(self._items)
+
+    def warm(self, names=None):
+        """Build ``names`` (default: all known names) now; returns every built entry."""
+        for name in self.names if names is None else names:
+            self.get(name)
+        return self.built()
+
+    def wrap(self, wrapper):
+        with self._lock:
+            self._wrappers.append(wrapper)
+            for name, item in self._items.items():
+                self._items[name] = wrapper(name, item)
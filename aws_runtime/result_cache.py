@@ -0,0 +1,361 @@
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+from zoneinfo import ZoneInfo
+
+from aws_runtime.bedrock_clients import get_bedrock_client
+
+RESULT_CACHE_BACKEND = os.getenv('RESULT_CACHE_BACKEND', 'memory')  # memory | sqlite | redis | none
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', '/tmp/graph_result_cache.db')
+RESULT_CACHE_REDIS_URL = os.getenv('RESULT_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '512'))
+# While the market is open prices move, so answers go stale quickly; once it closes they hold until the next open
+RESULT_CACHE_MARKET_HOURS_TTL = int(os.getenv('RESULT_CACHE_MARKET_HOURS_TTL', '900'))
+RESULT_CACHE_CLOSED_TTL = int(os.getenv('RESULT_CACHE_CLOSED_TTL', str(24 * 3600)))
+# Cosine similarity needed to reuse the answer to a differently worded prompt; 0 keeps matching exact
+RESULT_CACHE_SIMILARITY = float(os.getenv('RESULT_CACHE_SIMILARITY', '0'))
+RESULT_CACHE_EMBEDDING_MODEL = os.getenv('RESULT_CACHE_EMBEDDING_MODEL', 'amazon.titan-embed-text-v2:0')
+RESULT_CACHE_EMBEDDING_REGION = os.getenv('RESULT_CACHE_EMBEDDING_REGION', 'us-east-1')
+
+MARKET_TIMEZONE = ZoneInfo(os.getenv('MARKET_TIMEZONE', 'America/New_York'))
+MARKET_OPEN = datetime.time.fromisoformat(os.getenv('MARKET_OPEN', '09:30'))
+MARKET_CLOSE = datetime.time.fromisoformat(os.getenv('MARKET_CLOSE', '16:00'))
+MARKET_HOLIDAYS = frozenset(d.strip() for d in os.getenv('MARKET_HOLIDAYS', '').split(',') if d.strip())
+
+# The entrypoint appends the current time to every prompt; it must not be part of the key
+_DATE_SUFFIX = re.compile(r'\s*###\s*for clarification today date is:.*$', re.IGNORECASE | re.DOTALL)
+_PUNCTUATION = re.compile(r'[^\w\s$%.\-]')
+_TICKER = re.compile(r'\$?\b[A-Z]{1,5}\b')
+# Capitalised words that do not start a sentence, i.e. most company names
+_NAME = re.compile(r'(?<!^)(?<![.?!]\s)\b[A-Z][a-z]{2,}\b')
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_NOT_TICKERS = frozenset({'A', 'I', 'AND', 'OR', 'THE', 'VS', 'FOR', 'OF', 'IN', 'ON', 'TO', 'ME', 'MY', 'US'})
+
+_UTC = datetime.timezone.utc
+
+MarketSession = namedtuple('MarketSession', ['trading_date', 'is_open', 'changes_at'])
+
+
+def normalize_prompt(prompt):
+    """Case, whitespace and punctuation-insensitive form of a prompt, used as the exact-match key."""
+    text = unicodedata.normalize('NFKC', _DATE_SUFFIX.sub('', prompt)).lower()
+    text = _PUNCTUATION.sub(' ', text)
+    return ' '.join(text.split()).rstrip('.')
+
+
+def prompt_entities(prompt):
+    """Tickers, names and numbers in a prompt; a similar prompt only matches if these are identical.
+
+    Embeddings place "how did NVDA do this week" right next to "how did AMD do
+    this week", so similarity alone must never decide between them.
+    """
+    prompt = _DATE_SUFFIX.sub('', prompt)
+    tickers = {t.lstrip('$') for t in _TICKER.findall(prompt)} - _NOT_TICKERS
+    names = {n.lower() for n in _NAME.findall(prompt)}
+    return sorted(tickers | names | set(_NUMBER.findall(prompt)))
+
+
+def _is_trading_day(day):
+    return day.weekday() < 5 and day.isoformat() not in MARKET_HOLIDAYS
+
+
+def _previous_trading_day(day):
+    day -= datetime.timedelta(days=1)
+    while not _is_trading_day(day):
+        day -= datetime.timedelta(days=1)
+    return day
+
+
+def _next_open(day):
+    while not _is_trading_day(day):
+        day += datetime.timedelta(days=1)
+    return datetime.datetime.combine(day, MARKET_OPEN, MARKET_TIMEZONE)
+
+
+def market_session(now=None):
+    """The trading date whose data answers a question asked at ``now`` and when that changes."""
+    local = (now or datetime.datetime.now(_UTC)).astimezone(MARKET_TIMEZONE)
+    today = local.date()
+    if _is_trading_day(today):
+        open_at = datetime.datetime.combine(today, MARKET_OPEN, MARKET_TIMEZONE)
+        close_at = datetime.datetime.combine(today, MARKET_CLOSE, MARKET_TIMEZONE)
+        if local < open_at:
+            return MarketSession(_previous_trading_day(today), False, open_at)
+        if local < close_at:
+            return MarketSession(today, True, close_at)
+        return MarketSession(today, False, _next_open(today + datetime.timedelta(days=1)))
+    return MarketSession(_previous_trading_day(today), False, _next_open(today))
+
+
+def last_completed_session(now=None):
+    """The last trading date whose close has passed at ``now``: the newest daily bar that can exist."""
+    session = market_session(now)
+    return _previous_trading_day(session.trading_date) if session.is_open else session.trading_date
+
+
+def result_ttl(session, now=None):
+    """Seconds a result computed now stays valid: short while trading, otherwise until the next open."""
+    now = now or datetime.datetime.now(_UTC)
+    remaining = (session.changes_at - now).total_seconds()
+    cap = RESULT_CACHE_MARKET_HOURS_TTL if session.is_open else RESULT_CACHE_CLOSED_TTL
+    return max(0, min(cap, remaining))
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class BedrockEmbedder:
+    def __init__(self, model_id=RESULT_CACHE_EMBEDDING_MODEL, region_name=RESULT_CACHE_EMBEDDING_REGION):
+        self.model_id = model_id
+        self._client = get_bedrock_client(region_name)
+
+    def __call__(self, text):
+        response = self._client.invoke_model(modelId=self.model_id,
+                                             body=json.dumps({'inputText': text, 'normalize': True}))
+        return json.loads(response['body'].read())['embedding']
+
+
+class MemoryResultStore:
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, text, ttl, bucket, vector=None, entities=()):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, text, bucket, vector, list(entities))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def candidates(self, bucket):
+        now = time.time()
+        with self._lock:
+            return [(key, entry[3], entry[4]) for key, entry in self._entries.items()
+                    if entry[2] == bucket and entry[3] is not None and entry[0] > now]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteResultStore:
+    """Survives restarts and is shared by every worker process on the host."""
+
+    def __init__(self, path=RESULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, bucket TEXT NOT NULL, '
+                               'value TEXT NOT NULL, vector TEXT, entities TEXT, expires_at REAL NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS results_bucket ON results (bucket)')
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires_at FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def set(self, key, text, ttl, bucket, vector=None, entities=()):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+            self._conn.execute('INSERT OR REPLACE INTO results (key, bucket, value, vector, entities, expires_at) '
+                               'VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, bucket, text, json.dumps(vector) if vector is not None else None,
+                                json.dumps(list(entities)), time.time() + ttl))
+
+    def candidates(self, bucket):
+        with self._lock:
+            rows = self._conn.execute('SELECT key, vector, entities FROM results WHERE bucket = ? '
+                                      'AND vector IS NOT NULL AND expires_at > ?', (bucket, time.time())).fetchall()
+        return [(key, json.loads(vector), json.loads(entities)) for key, vector, entities in rows]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM results')
+
+
+class RedisResultStore:
+    """Any Redis-protocol server (Redis, Valkey, ElastiCache) so the cache is shared across hosts.
+
+    ``client`` is a redis-py compatible client; by default one is created from
+    ``url``. Entries expire server side; each trading-date bucket keeps a hash
+    of embeddings for similarity lookups.
+    """
+
+    def __init__(self, url=RESULT_CACHE_REDIS_URL, client=None, prefix='graph-result:'):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key, text, ttl, bucket, vector=None, entities=()):
+        ttl = max(1, int(ttl))
+        self._client.set(self.prefix + key, text, ex=ttl)
+        if vector is not None:
+            index = f'{self.prefix}vectors:{bucket}'
+            self._client.hset(index, key, json.dumps({'vector': vector, 'entities': list(entities)}))
+            # The bucket index lives as long as its newest entry; stale fields are skipped on lookup
+            self._client.expire(index, ttl)
+
+    def candidates(self, bucket):
+        found = []
+        for key, value in self._client.hgetall(f'{self.prefix}vectors:{bucket}').items():
+            key = key.decode() if isinstance(key, bytes) else key
+            entry = json.loads(value)
+            found.append((key, entry['vector'], entry['entities']))
+        return found
+
+    def clear(self):
+        for key in self._client.scan_iter(f'{self.prefix}*'):
+            self._client.delete(key)
+
+
+class GraphResultCache:
+    """Caches whole graph responses by normalized prompt within a trading-date bucket.
+
+    An exact match on the normalized prompt is tried first. With an
+    ``embedder`` and a ``similarity`` threshold, a miss falls back to the most
+    similar cached prompt of the same bucket that mentions the same tickers
+    and numbers. Entries expire according to :func:`result_ttl`.
+    """
+
+    def __init__(self, store, embedder=None, similarity=RESULT_CACHE_SIMILARITY):
+        self.store = store
+        self.embedder = embedder if similarity > 0 else None
+        self.similarity = similarity
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'similar_hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+
+    def _key(self, bucket, normalized):
+        return hashlib.sha256(f'{bucket}|{normalized}'.encode()).hexdigest()
+
+    def _embedding(self, normalized):
+        with self._lock:
+            vector = self._vectors.get(normalized)
+        if vector is None:
+            vector = self.embedder(normalized)
+            with self._lock:
+                self._vectors[normalized] = vector
+                while len(self._vectors) > 256:
+                    self._vectors.popitem(last=False)
+        return vector
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def lookup(self, prompt, now=None):
+        """Cached value for ``prompt`` or None. Backend failures count as misses."""
+        session = market_session(now)
+        bucket = session.trading_date.isoformat()
+        normalized = normalize_prompt(prompt)
+        try:
+            text = self.store.get(self._key(bucket, normalized))
+            if text is not None:
+                self._count('hits')
+                return json.loads(text)
+            if self.embedder is not None:
+                text = self._similar(bucket, normalized, prompt_entities(prompt))
+                if text is not None:
+                    self._count('similar_hits')
+                    return json.loads(text)
+        except Exception as e:
+            print(f'Result cache lookup failed: {e}')
+            self._count('errors')
+        self._count('misses')
+        return None
+
+    def _similar(self, bucket, normalized, entities):
+        vector = self._embedding(normalized)
+        best_key, best_score = None, self.similarity
+        for key, candidate, candidate_entities in self.store.candidates(bucket):
+            if list(candidate_entities) != entities:
+                continue
+            score = _cosine(vector, candidate)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return self.store.get(best_key) if best_key is not None else None
+
+    def store_result(self, prompt, value, now=None):
+        """Remember ``value`` (JSON-serialisable) as the answer to ``prompt``."""
+        now = now or datetime.datetime.now(_UTC)
+        session = market_session(now)
+        ttl = result_ttl(session, now)
+        if ttl <= 0:
+            return
+        bucket = session.trading_date.isoformat()
+        normalized = normalize_prompt(prompt)
+        try:
+            vector = self._embedding(normalized) if self.embedder is not None else None
+            self.store.set(self._key(bucket, normalized), json.dumps(value), ttl, bucket,
+                           vector=vector, entities=prompt_entities(prompt))
+            self._count('stores')
+        except Exception as e:
+            print(f'Result cache store failed: {e}')
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['similar_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['similar_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def create_result_store(name=RESULT_CACHE_BACKEND):
+    if name == 'memory':
+        return MemoryResultStore()
+    if name == 'sqlite':
+        return SQLiteResultStore()
+    if name == 'redis':
+        return RedisResultStore()
+    raise ValueError(f'Unknown RESULT_CACHE_BACKEND: {name}')
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide graph result cache, or None when RESULT_CACHE_BACKEND=none."""
+    global _cache
+    if RESULT_CACHE_BACKEND == 'none':
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                embedder = BedrockEmbedder() if RESULT_CACHE_SIMILARITY > 0 else None
+                _cache = GraphResultCache(create_result_store(), embedder=embedder)
+    return _cache
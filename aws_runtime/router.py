@@ -0,0 +1,285 @@
+import asyncio
+import html
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+
+from strands.agent.agent_result import AgentResult
+from strands.telemetry.metrics import EventLoopMetrics
+
+from aws_agents.all_agents import create_quick_answer_agent
+from aws_tools.all_tools import get_daily_features
+from aws_runtime.bedrock_clients import get_bedrock_client
+from aws_runtime.result_cache import last_completed_session
+from aws_runtime.recording import recorded_function, recorded_tool
+
+# Direct answers read the analytics table without an agent; record/replay them like the agents' tool calls
+get_daily_features = recorded_tool(get_daily_features)
+
+ROUTER_ENABLED = os.getenv('ROUTER_ENABLED', 'true').lower() == 'true'
+ROUTER_MODEL_ID = os.getenv('ROUTER_MODEL_ID', 'us.amazon.nova-micro-v1:0')
+ROUTER_MODEL_REGION = os.getenv('ROUTER_MODEL_REGION', 'us-east-1')
+# More symbols than this is a screen or comparison study, not a lookup
+ROUTER_MAX_SYMBOLS = int(os.getenv('ROUTER_MAX_SYMBOLS', '5'))
+
+GRAPH, AGENT, DIRECT = 'graph', 'agent', 'direct'
+
+Route = namedtuple('Route', ['kind', 'intent', 'symbols', 'horizon', 'tier'])
+
+COMPANY_SYMBOLS = {
+    'amazon': 'AMZN', 'apple': 'AAPL', 'google': 'GOOGL', 'alphabet': 'GOOGL', 'microsoft': 'MSFT',
+    'netflix': 'NFLX', 'nvidia': 'NVDA', 'tesla': 'TSLA', 'meta': 'META', 'facebook': 'META', 'costco': 'COST',
+}
+_NOT_TICKERS = frozenset({'A', 'I', 'AND', 'OR', 'THE', 'VS', 'FOR', 'OF', 'IN', 'ON', 'TO', 'ME', 'MY', 'US', 'IS',
+                          'IT', 'AT', 'BY', 'DO', 'UP', 'WHAT', 'HOW', 'LAST', 'RSI', 'SMA', 'EMA', 'YTD', 'ATH',
+                          'PE', 'EPS', 'ETF', 'USD', 'API', 'ROE', 'ROI', 'CEO', 'IPO',
+                          # Words people type in capitals; a $ prefix still makes any of them a ticker ($NOW)
+                          'TODAY', 'NOW', 'PLEASE', 'SHOW', 'GIVE', 'TELL', 'WHY', 'WHEN', 'WHO', 'BUY', 'SELL',
+                          'HOLD', 'NEWS', 'PRICE', 'STOCK', 'STOCKS', 'SHARE', 'WEEK', 'MONTH', 'YEAR', 'DAY', 'NYSE',
+                          'AMEX', 'DOW', 'SEC', 'FED', 'FOMC', 'GDP', 'CPI', 'AI', 'EOD', 'ET', 'EST', 'AM', 'PM',
+                          'YOY', 'QOQ', 'OK'})
+_TICKER = re.compile(r'\$?\b[A-Z]{1,5}\b')
+# Ratios and index names whose letters would otherwise read as tickers: P/E, EV/EBITDA, S&P
+_NOT_TICKER_TOKENS = re.compile(r'\b[A-Z]{1,2}/[A-Z]{1,6}\b|\bS&P\b')
+_COMPANY = re.compile(r'\b(' + '|'.join(COMPANY_SYMBOLS) + r')\b', re.IGNORECASE)
+
+# Anything asking for reasoning, code, charts or multi-step work goes to the full graph
+_RESEARCH = re.compile(
+    r'\b(why|explain|analy[sz]\w*|correlat\w*|backtest\w*|chart|plot|graph|visuali[sz]\w*|forecast\w*|predict\w*|'
+    r'portfolio|recommend\w*|should i|strateg\w*|optimi[sz]\w*|regress\w*|simulat\w*|report|outlook|risk|'
+    r'sector|screen\w*|compare|comparison|versus|vs\.?|best|worst|rank\w*|deep dive|in depth|detailed)\b',
+    re.IGNORECASE)
+_PRICE = re.compile(r'\b(price|quote|close[ds]?|closing|trading at|worth)\b', re.IGNORECASE)
+_RETURNS = re.compile(r'\b(returns?|perform\w*|gain\w*|los[st]|up or down|change[ds]?|move[ds]?|how did .+ do)\b',
+                      re.IGNORECASE)
+_INDICATORS = {
+    'rsi_14': re.compile(r'\brsi\b', re.IGNORECASE),
+    'sma_20': re.compile(r'\b(sma|moving average)', re.IGNORECASE),
+    'sma_50': re.compile(r'\b(sma|moving average)', re.IGNORECASE),
+    'sma_200': re.compile(r'\b(sma|moving average)', re.IGNORECASE),
+    'ema_12': re.compile(r'\bema\b|exponential', re.IGNORECASE),
+    'ema_26': re.compile(r'\bema\b|exponential', re.IGNORECASE),
+    'volatility_21d': re.compile(r'\bvolatil', re.IGNORECASE),
+    'volatility_63d': re.compile(r'\bvolatil', re.IGNORECASE),
+    'drawdown_252d': re.compile(r'\bdrawdown', re.IGNORECASE),
+    'max_drawdown_252d': re.compile(r'\bdrawdown', re.IGNORECASE),
+    'adv_20d': re.compile(r'\bvolume\b', re.IGNORECASE),
+}
+_AGENT_INTENTS = re.compile(r'\b(news|headlines?|earnings|revenue|dividends?|market cap\w*|p/?e|eps|'
+                            r'financials?|valuation|ytd|year to date|this year)\b', re.IGNORECASE)
+# Longest first, so "52 week" is a year and "3 months" a quarter rather than a week and a month
+_HORIZONS = [
+    (re.compile(r'\b(12 months|52 weeks?|annual|yearly)\b|(?<!half )(?<!half-)\byear\b', re.IGNORECASE), 252),
+    (re.compile(r'\b(6|six) months?\b|\bhalf', re.IGNORECASE), 126),
+    (re.compile(r'\b(3|three) months?\b|\bquarter', re.IGNORECASE), 63),
+    (re.compile(r'\b(month|monthly|30 days)\b', re.IGNORECASE), 21),
+    (re.compile(r'\b(week|weekly|5 days|five days)\b', re.IGNORECASE), 5),
+    (re.compile(r'\b(today|yesterday|day|daily|session)\b', re.IGNORECASE), 1),
+]
+_MONTH = (r'(jan(uary)?|feb(ruary)?|mar(ch)?|apr(il)?|may|june?|july?|aug(ust)?|sep(t(ember)?)?|oct(ober)?|'
+          r'nov(ember)?|dec(ember)?)\.?')
+# A past date, year or range: the analytics table templates only show the latest values, so these need an agent
+_DATED = re.compile(
+    r'\b(19|20)\d{2}\b|\b\d{1,2}/\d{1,2}(/\d{2,4})?\b'
+    rf'|\b{_MONTH}\s+\d{{1,2}}(st|nd|rd|th)?\b|\b\d{{1,2}}(st|nd|rd|th)?\s+(of\s+)?{_MONTH}(?!\w)'
+    r'|\b(since|between|until|during|as of|ago|historical\w*)\b',
+    re.IGNORECASE)
+RETURN_HORIZONS = (1, 5, 21, 63, 126, 252)
+
+ROUTER_SYSTEM_PROMPT = """Classify a stock market question for routing. Reply with JSON only:
+{"route": "direct" | "agent" | "graph", "intent": "price" | "returns" | "indicators" | "news" | "fundamentals" | "other",
+ "symbols": ["TICKER", ...], "horizon_days": 1 | 5 | 21 | 63 | 126 | 252 | null}
+- direct: latest price, trailing return up to today or a current technical indicator (RSI, moving averages,
+  volatility, drawdown, volume) for at most five tickers
+- agent: other single-fact lookups for a few tickers, e.g. recent news, earnings, valuation, or a price or return
+  on a past date, in a given year or between two dates
+- graph: anything needing analysis, explanation, comparison, charts, code, forecasts or multi-step research
+Use ticker symbols, not company names."""
+
+
+def extract_symbols(prompt):
+    symbols = []
+    for match in _TICKER.findall(_NOT_TICKER_TOKENS.sub(' ', prompt)):
+        symbol = match.lstrip('$')
+        if (match.startswith('$') or symbol not in _NOT_TICKERS) and symbol not in symbols:
+            symbols.append(symbol)
+    for name in _COMPANY.findall(prompt):
+        symbol = COMPANY_SYMBOLS[name.lower()]
+        if symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+def _horizon(prompt):
+    for pattern, days in _HORIZONS:
+        if pattern.search(prompt):
+            return days
+    return None
+
+
+def classify_rules(prompt):
+    """Cheap first tier: a Route when the wording is unambiguous, otherwise None."""
+    if _RESEARCH.search(prompt) or len(prompt) > 300:
+        return Route(GRAPH, 'research', [], None, 'rules')
+    symbols = extract_symbols(prompt)
+    if not symbols:
+        return None
+    if len(symbols) > ROUTER_MAX_SYMBOLS:
+        return Route(GRAPH, 'research', symbols, None, 'rules')
+    if _DATED.search(prompt):
+        return Route(AGENT, 'historical', symbols, None, 'rules')
+    if _AGENT_INTENTS.search(prompt):
+        return Route(AGENT, 'lookup', symbols, None, 'rules')
+    if any(pattern.search(prompt) for pattern in _INDICATORS.values()):
+        return Route(DIRECT, 'indicators', symbols, None, 'rules')
+    if _RETURNS.search(prompt):
+        return Route(DIRECT, 'returns', symbols, _horizon(prompt), 'rules')
+    if _PRICE.search(prompt):
+        return Route(DIRECT, 'price', symbols, None, 'rules')
+    return None
+
+
+class ModelClassifier:
+    """Second tier: a small model classifies what the rules could not."""
+
+    def __init__(self, model_id=ROUTER_MODEL_ID, region_name=ROUTER_MODEL_REGION):
+        self.model_id = model_id
+        self._client = get_bedrock_client(region_name)
+        self._converse = recorded_function(f'router:{model_id}', self._client.converse)
+
+    def __call__(self, prompt):
+        response = self._converse(
+            modelId=self.model_id,
+            system=[{'text': ROUTER_SYSTEM_PROMPT}],
+            messages=[{'role': 'user', 'content': [{'text': prompt}]}],
+            inferenceConfig={'maxTokens': 200, 'temperature': 0},
+        )
+        text = ''.join(block.get('text', '') for block in response['output']['message']['content'])
+        decision = json.loads(text[text.index('{'):text.rindex('}') + 1])
+        kind = decision.get('route')
+        symbols = [str(s).strip().upper() for s in decision.get('symbols') or [] if str(s).strip()]
+        if kind not in (DIRECT, AGENT) or not symbols or len(symbols) > ROUTER_MAX_SYMBOLS:
+            return Route(GRAPH, decision.get('intent') or 'research', symbols, None, 'model')
+        intent = decision.get('intent')
+        if kind == DIRECT and (intent not in ('price', 'returns', 'indicators') or _DATED.search(prompt)):
+            kind = AGENT
+        horizon = decision.get('horizon_days')
+        return Route(kind, intent, symbols, horizon if horizon in RETURN_HORIZONS else None, 'model')
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = ModelClassifier()
+    return _classifier
+
+
+def route_request(prompt):
+    """Decide how to answer ``prompt``: rules first, then the small model; the full graph when unsure."""
+    if not ROUTER_ENABLED:
+        return Route(GRAPH, 'research', [], None, 'disabled')
+    route = classify_rules(prompt)
+    if route is not None:
+        return route
+    try:
+        return get_classifier()(prompt)
+    except Exception as e:
+        print(f'Router model failed, using the full graph: {e}')
+        return Route(GRAPH, 'research', [], None, 'fallback')
+
+
+def _fields(route, prompt):
+    if route.intent == 'price':
+        return ['Close', 'return_1d']
+    if route.intent == 'returns':
+        horizons = [route.horizon] if route.horizon else [1, 5, 21, 63, 252]
+        return ['Close'] + [f'return_{h}d' for h in horizons]
+    fields = [field for field, pattern in _INDICATORS.items() if pattern.search(prompt)]
+    return ['Close'] + (fields or ['rsi_14', 'sma_50', 'sma_200', 'volatility_21d'])
+
+
+_LABELS = {
+    'symbol': 'Symbol', 'Date': 'As of', 'Close': 'Close', 'rsi_14': 'RSI (14)', 'sma_20': 'SMA 20', 'sma_50': 'SMA 50', 'sma_200': 'SMA 200',
+    'ema_12': 'EMA 12', 'ema_26': 'EMA 26', 'volatility_21d': 'Volatility 1M (ann.)',
+    'volatility_63d': 'Volatility 3M (ann.)', 'drawdown_252d': 'Drawdown from 1Y high',
+    'max_drawdown_252d': 'Max drawdown 1Y', 'adv_20d': 'Avg volume 20D',
+    'return_1d': 'Return 1D', 'return_5d': 'Return 1W', 'return_21d': 'Return 1M', 'return_63d': 'Return 3M',
+    'return_126d': 'Return 6M', 'return_252d': 'Return 1Y',
+}
+_TITLES = {'price': 'Latest close', 'returns': 'Returns', 'indicators': 'Technical indicators'}
+
+
+def _format_value(field, value):
+    if value is None:
+        return '<span class="text-gray-400">n/a</span>'
+    if field.startswith('volatility'):
+        return f'{value * 100:.1f}%'
+    if field.startswith(('return_', 'drawdown', 'max_drawdown')):
+        colour = 'text-green-700' if value > 0 else 'text-red-700' if value < 0 else 'text-gray-800'
+        return f'<span class="{colour}">{value * 100:+.2f}%</span>'
+    if field == 'adv_20d':
+        return f'{value:,.0f}'
+    if field == 'rsi_14':
+        return f'{value:.1f}'
+    return f'${value:,.2f}'
+
+
+def render_table(intent, rows, fields):
+    """HTML in the same Tailwind style the final response agent produces."""
+    header = ''.join(f'<th class="border border-gray-300 px-3 py-2 text-left">{html.escape(_LABELS.get(f, f))}</th>'
+                     for f in ['symbol', 'Date'] + fields)
+    body = []
+    for number, row in enumerate(rows):
+        shade = ' class="bg-gray-50"' if number % 2 else ''
+        cells = [f'<td class="border border-gray-300 px-3 py-2 font-semibold">{html.escape(row["symbol"])}</td>',
+                 f'<td class="border border-gray-300 px-3 py-2">{html.escape(str(row["Date"]))}</td>']
+        cells += [f'<td class="border border-gray-300 px-3 py-2">{_format_value(f, row.get(f))}</td>' for f in fields]
+        body.append(f'<tr{shade}>{"".join(cells)}</tr>')
+    return (f'<div class="p-4"><h2 class="text-xl font-bold text-blue-800 mb-3">{_TITLES.get(intent, "Market data")}'
+            f'</h2><table class="table-auto border-collapse border border-gray-300 w-full">'
+            f'<thead class="bg-blue-100"><tr>{header}</tr></thead><tbody>{"".join(body)}</tbody></table>'
+            f'<p class="text-sm text-gray-600 mt-2">Source: daily market dataset; returns are simple returns over '
+            f'trading days.</p></div>')
+
+
+def _as_agent_result(text):
+    """Wrap a templated answer so callers get the same shape as an agent's answer."""
+    return AgentResult(stop_reason='end_turn', message={'role': 'assistant', 'content': [{'text': text}]},
+                       metrics=EventLoopMetrics(), state={})
+
+
+def answer_direct(route, prompt):
+    """Answer from the daily analytics table with a template, or None if it lacks the data."""
+    fields = _fields(route, prompt)
+    try:
+        data = json.loads(get_daily_features(stock_symbols=route.symbols, fields=fields))
+    except Exception as e:
+        print(f'Direct answer failed, using the quick answer agent: {e}')
+        return None
+    if data['missing_symbols'] or not data['rows']:
+        return None
+    # The template says "latest": a row from before the last completed session (a late or failed feature
+    # build) is left to the agent, which can fetch current data, rather than shown and cached as current
+    newest = last_completed_session().isoformat()
+    stale = sorted(row['symbol'] for row in data['rows'] if row['Date'] < newest)
+    if stale:
+        print(f'Direct answer skipped, daily features older than {newest} for {stale}')
+        return None
+    return _as_agent_result(render_table(route.intent, data['rows'], fields))
+
+
+async def answer_fast(route, prompt, task):
+    """Answer a DIRECT or AGENT route: the template when the data is there, else the quick answer agent."""
+    if route.kind == DIRECT:
+        result = await asyncio.to_thread(answer_direct, route, prompt)
+        if result is not None:
+            return result
+    return await create_quick_answer_agent().invoke_async(task)
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import threading
+
+MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', '8'))
+# Requests beyond the concurrency cap wait in line; past this many waiting, new ones are turned away
+MAX_QUEUED_REQUESTS = int(os.getenv('MAX_QUEUED_REQUESTS', '32'))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv('QUEUE_TIMEOUT_SECONDS', '120'))
+
+
+class SchedulerBusy(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Slot:
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._scheduler._release()
+
+
+class RequestScheduler:
+    """Admission control for graph invocations on one event loop.
+
+    At most ``max_concurrent`` requests run at once; up to ``max_queued`` more
+    wait (first come, first served) for at most ``queue_timeout`` seconds.
+    Anything beyond that is rejected with :class:`SchedulerBusy` straight away,
+    so overload turns into fast 429s instead of a growing backlog of requests
+    that will time out anyway.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_REQUESTS, max_queued=MAX_QUEUED_REQUESTS,
+                 queue_timeout=QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._semaphore = None
+        self._loop = None
+        self._lock = threading.Lock()
+        self._stats = {'active': 0, 'queued': 0, 'admitted': 0, 'rejected': 0, 'timed_out': 0, 'completed': 0}
+
+    def _semaphore_for_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio primitives belong to one loop; the entrypoint always runs on the app's worker loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    async def acquire(self):
+        """Wait for a slot and return it; the caller must ``release()`` it."""
+        semaphore = self._semaphore_for_loop()
+        with self._lock:
+            if self._stats['active'] + self._stats['queued'] >= self.max_concurrent + self.max_queued:
+                self._stats['rejected'] += 1
+                raise SchedulerBusy(f'Server busy: {self._stats["active"]} requests running and '
+                                    f'{self._stats["queued"]} waiting', retry_after=int(self.queue_timeout / 4) or 1)
+            self._stats['queued'] += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await semaphore.acquire()
+        except TimeoutError:
+            with self._lock:
+                self._stats['queued'] -= 1
+                self._stats['timed_out'] += 1
+            raise SchedulerBusy(f'Server busy: no capacity within {self.queue_timeout:.0f}s',
+                                retry_after=int(self.queue_timeout / 4) or 1)
+        except BaseException:
+            with self._lock:
+                self._stats['queued'] -= 1
+            raise
+        with self._lock:
+            self._stats['queued'] -= 1
+            self._stats['active'] += 1
+            self._stats['admitted'] += 1
+        return _Slot(self)
+
+    def _release(self):
+        with self._lock:
+            self._stats['active'] -= 1
+            self._stats['completed'] += 1
+        self._semaphore.release()
+
+    async def run(self, coroutine_factory):
+        """Await ``coroutine_factory()`` inside a slot."""
+        slot = await self.acquire()
+        try:
+            return await coroutine_factory()
+        finally:
+            slot.release()
+
+    async def hold(self, slot, stream):
+        """Yield from the async generator ``stream`` and release ``slot`` once it is exhausted or closed."""
+        try:
+            async for item in stream:
+                yield item
+        finally:
+            slot.release()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, max_concurrent=self.max_concurrent, max_queued=self.max_queued)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler()
+    return _scheduler
@@ -0,0 +1,120 @@
+import asyncio
+
+from aws_tools.code_interpreter import close_interpreter_scope, enter_interpreter_scope
+
+# Nodes whose text deltas are forwarded as "token" events; other agents only report progress
+TOKEN_NODES = ('output',)
+
+_DONE = object()
+
+
+def normalize_event(event, path=(), token_nodes=TOKEN_NODES):
+    """Turn a raw strands graph/swarm/agent event into zero or more JSON-friendly progress events.
+
+    Swarm and agent events arrive wrapped in ``multiagent_node_stream`` envelopes,
+    one per level of nesting; ``path`` is the chain of node ids walked so far.
+    """
+    event_type = event.get('type')
+    parent = path[-1] if path else None
+    if event_type == 'multiagent_node_stream':
+        yield from normalize_event(event['event'], path + (event['node_id'],), token_nodes)
+    elif event_type == 'multiagent_node_start':
+        yield {'type': 'node_start', 'node': event['node_id'], 'node_type': event.get('node_type'), 'parent': parent}
+    elif event_type == 'multiagent_node_stop':
+        result = event['node_result']
+        yield {'type': 'node_stop', 'node': event['node_id'], 'parent': parent,
+               'status': getattr(result.status, 'value', str(result.status)),
+               'execution_time_ms': result.execution_time}
+    elif event_type == 'multiagent_handoff':
+        yield {'type': 'handoff', 'parent': parent, 'from': event['from_node_ids'], 'to': event['to_node_ids'],
+               'message': event.get('message')}
+    elif event_type == 'tool_result':
+        tool_result = event['tool_result']
+        yield {'type': 'tool_result', 'node': parent, 'tool_use_id': tool_result.get('toolUseId'),
+               'status': tool_result.get('status')}
+    elif 'data' in event and parent in token_nodes and isinstance(event['data'], str):
+        yield {'type': 'token', 'node': parent, 'data': event['data']}
+    elif 'message' in event and isinstance(event['message'], dict):
+        for block in event['message'].get('content', []):
+            if 'toolUse' in block:
+                yield {'type': 'tool_call', 'node': parent, 'tool': block['toolUse'].get('name'),
+                       'tool_use_id': block['toolUse'].get('toolUseId'), 'input': block['toolUse'].get('input')}
+
+
+async def _scoped_events(stream_factory):
+    """Raw events of ``stream_factory()``, run in its own task with a code interpreter scope."""
+    queue = asyncio.Queue(maxsize=1000)
+
+    async def produce():
+        scope = enter_interpreter_scope()
+        try:
+            async for event in stream_factory():
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await asyncio.to_thread(close_interpreter_scope, scope)
+            await queue.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            event = await queue.get()
+            if event is _DONE:
+                break
+            if isinstance(event, Exception):
+                raise event
+            yield event
+    finally:
+        if not producer.done():
+            producer.cancel()
+
+
+async def stream_graph(graph, task, output_node='output', token_nodes=TOKEN_NODES, on_result=None):
+    """Run ``graph`` on ``task`` and yield progress events, ending with a ``result`` event.
+
+    The graph runs in its own task so code interpreter sessions are scoped to
+    this invocation exactly as in the blocking path. ``on_result`` is called
+    (in a worker thread) with the final graph result before it is emitted.
+    A run that ends without an answer still ends with a ``result`` event,
+    with ``html`` None and an ``error``.
+    """
+    finished = False
+    async for event in _scoped_events(lambda: graph.stream_async(task)):
+        if event.get('type') == 'multiagent_result':
+            finished = True
+            result = event['result']
+            if on_result is not None:
+                await asyncio.to_thread(on_result, result)
+            node = result.results.get(output_node)
+            status = getattr(result.status, 'value', str(result.status))
+            final = {'type': 'result', 'status': status, 'html': str(node.result) if node is not None else None,
+                     'execution_time_ms': result.execution_time}
+            if node is None:
+                final['error'] = f'The research graph ended without an answer (status: {status})'
+            yield final
+            continue
+        for normalized in normalize_event(event, token_nodes=token_nodes):
+            yield normalized
+    if not finished:
+        yield {'type': 'result', 'status': 'failed', 'html': None, 'error': 'The research graph ended without a result'}
+
+
+async def stream_agent(agent, task, on_result=None):
+    """Like :func:`stream_graph` for a single agent whose whole answer is the final HTML."""
+    yield {'type': 'node_start', 'node': agent.name, 'node_type': 'agent', 'parent': None}
+    async for event in _scoped_events(lambda: agent.stream_async(task)):
+        if 'result' in event and not event.get('type'):
+            result = event['result']
+            if on_result is not None:
+                await asyncio.to_thread(on_result, result)
+            yield {'type': 'node_stop', 'node': agent.name, 'parent': None, 'status': 'completed'}
+            yield {'type': 'result', 'status': 'completed', 'html': str(result)}
+            continue
+        for normalized in normalize_event(event, path=(agent.name,), token_nodes=(agent.name,)):
+            yield normalized
+
+
+async def stream_cached(html, **details):
+    """The stream of a request answered without running agents: just the final result."""
+    yield {'type': 'result', 'status': 'completed', 'html': html, 'execution_time_ms': 0, **details}
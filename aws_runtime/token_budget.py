@@ -0,0 +1,184 @@
+import json
+import os
+import time
+
+from strands.hooks import AfterToolCallEvent, BeforeModelCallEvent, BeforeToolCallEvent, HookProvider
+
+from aws_runtime.instrumentation import current_trace
+
+# Prompt tokens an agent may send in one model call before its older turns are compacted; 0 disables
+AGENT_CONTEXT_BUDGET = int(os.getenv('AGENT_CONTEXT_BUDGET', '40000'))
+# Per-agent overrides, e.g. AGENT_CONTEXT_BUDGETS='{"financialAnalyst": 60000}'
+AGENT_CONTEXT_BUDGETS = {name: int(budget) for name, budget in json.loads(os.getenv('AGENT_CONTEXT_BUDGETS', '{}')).items()}
+# The latest messages are never compacted, so the agent keeps its current step intact
+CONTEXT_KEEP_RECENT = int(os.getenv('CONTEXT_KEEP_RECENT', '6'))
+# Older tool results are cut to this many characters before anything is summarized
+COMPACTED_TOOL_RESULT_CHARS = int(os.getenv('COMPACTED_TOOL_RESULT_CHARS', '2000'))
+# Any tool result is cut to this many characters as soon as it is returned
+TOOL_RESULT_MAX_CHARS = int(os.getenv('TOOL_RESULT_MAX_CHARS', '30000'))
+HANDOFF_CONTEXT_MAX_CHARS = int(os.getenv('HANDOFF_CONTEXT_MAX_CHARS', '4000'))
+# Market API payloads handed to the agents: list items and string lengths kept, fields dropped
+TOOL_JSON_MAX_ITEMS = int(os.getenv('TOOL_JSON_MAX_ITEMS', '20'))
+TOOL_JSON_MAX_TEXT = int(os.getenv('TOOL_JSON_MAX_TEXT', '1000'))
+TOOL_JSON_DROP_FIELDS = frozenset(field for field in os.getenv(
+    'TOOL_JSON_DROP_FIELDS', 'image,images,image_url,thumbnail,banner_image,logo,raw,html').split(',') if field)
+CHARS_PER_TOKEN = 4
+# Longest transcript handed to the summarizer in one go
+SUMMARY_INPUT_MAX_CHARS = 200000
+
+
+def estimate_tokens(value):
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return len(text) // CHARS_PER_TOKEN
+
+
+def compact_json(value, max_items=TOOL_JSON_MAX_ITEMS, max_text=TOOL_JSON_MAX_TEXT, drop=TOOL_JSON_DROP_FIELDS):
+    """A trimmed copy of a decoded JSON payload; ``value`` itself (often a cached response) is left alone."""
+    if isinstance(value, dict):
+        return {key: compact_json(item, max_items, max_text, drop) for key, item in value.items() if key not in drop}
+    if isinstance(value, list):
+        items = [compact_json(item, max_items, max_text, drop) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f'... {len(value) - max_items} more items')
+        return items
+    if isinstance(value, str) and len(value) > max_text:
+        return value[:max_text] + '...'
+    return value
+
+
+def truncate_text(text, max_chars):
+    """``text`` cut to at most ``max_chars`` characters, including a note saying how much was cut."""
+    if len(text) <= max_chars:
+        return text
+    note = f'\n[... {len(text) - max_chars} characters trimmed to fit the context budget]'
+    return text[:max(0, max_chars - len(note))] + note
+
+
+def compact_tool_results(messages, keep_recent=CONTEXT_KEEP_RECENT, max_chars=COMPACTED_TOOL_RESULT_CHARS):
+    """Cut the text of tool results outside the first and the last ``keep_recent`` messages; returns how many."""
+    trimmed = 0
+    for message in messages[1:max(1, len(messages) - keep_recent)]:
+        for index, block in enumerate(message['content']):
+            result = block.get('toolResult')
+            if result is None:
+                continue
+            content = [{'text': truncate_text(item['text'], max_chars)} if len(item.get('text', '')) > max_chars
+                       else item for item in result.get('content', [])]
+            if content != result.get('content'):
+                message['content'][index] = {'toolResult': dict(result, content=content)}
+                trimmed += 1
+    return trimmed
+
+
+def _transcript(messages):
+    lines = []
+    for message in messages:
+        for block in message['content']:
+            if 'text' in block:
+                lines.append(f"{message['role']}: {block['text']}")
+            elif 'toolUse' in block:
+                lines.append(f"tool call {block['toolUse']['name']}: {json.dumps(block['toolUse'].get('input'))}")
+            elif 'toolResult' in block:
+                texts = [item['text'] for item in block['toolResult'].get('content', []) if 'text' in item]
+                lines.append(f"tool result: {' '.join(texts)}")
+    return '\n'.join(lines)
+
+
+class ContextBudget(HookProvider):
+    """Keeps every agent's prompt within a token budget.
+
+    Tool results are capped when they arrive and handoff context is compacted
+    before it reaches the next agent. Before a model call that would exceed
+    the agent's budget, tool results in older turns are cut down; if that is
+    not enough, the older turns are replaced by a summary written by the
+    agent from ``summarizer_factory``. Every model call's projected prompt
+    size is recorded in the request trace as a ``context:<agent>`` stage.
+    """
+
+    def __init__(self, summarizer_factory=None, budget=AGENT_CONTEXT_BUDGET, budgets=None,
+                 keep_recent=CONTEXT_KEEP_RECENT):
+        self.summarizer_factory = summarizer_factory
+        self.budget = budget
+        self.budgets = AGENT_CONTEXT_BUDGETS if budgets is None else budgets
+        self.keep_recent = keep_recent
+
+    def register_hooks(self, registry, **kwargs):
+        registry.add_callback(AfterToolCallEvent, self._cap_tool_result)
+        registry.add_callback(BeforeToolCallEvent, self._cap_handoff)
+        registry.add_callback(BeforeModelCallEvent, self._enforce)
+
+    def budget_for(self, agent_name):
+        return self.budgets.get(agent_name, self.budget)
+
+    def _cap_tool_result(self, event):
+        result = event.result
+        if not result:
+            return
+        content = [{'text': truncate_text(block['text'], TOOL_RESULT_MAX_CHARS)}
+                   if len(block.get('text', '')) > TOOL_RESULT_MAX_CHARS else block
+                   for block in result.get('content', [])]
+        if content != result.get('content'):
+            event.result = dict(result, content=content)
+
+    def _cap_handoff(self, event):
+        tool_use = event.tool_use
+        arguments = tool_use.get('input') or {}
+        if tool_use.get('name') != 'handoff_to_agent' or not isinstance(arguments, dict):
+            return
+        context = arguments.get('context')
+        if not context or len(json.dumps(context, default=str)) <= HANDOFF_CONTEXT_MAX_CHARS:
+            return
+        compacted = compact_json(context)
+        text = json.dumps(compacted, default=str)
+        if len(text) > HANDOFF_CONTEXT_MAX_CHARS:
+            compacted = {'summary': truncate_text(text, HANDOFF_CONTEXT_MAX_CHARS)}
+        event.tool_use = dict(tool_use, input=dict(arguments, context=compacted))
+
+    async def _enforce(self, event):
+        agent = event.agent
+        # Strands' own projection starts from the last call's reported usage, which stays high after
+        # compaction; a plain estimate of what will be sent reflects it straight away
+        fixed = estimate_tokens(agent.system_prompt or '')
+        tokens = fixed + estimate_tokens(agent.messages)
+        budget = self.budget_for(agent.name)
+        request_trace = current_trace()
+        if not budget or tokens <= budget:
+            if request_trace is not None:
+                request_trace.record('context', agent.name, 0, prompt_tokens=tokens)
+            return
+        started = time.perf_counter()
+        trimmed = compact_tool_results(agent.messages, self.keep_recent)
+        summarized = 0
+        if fixed + estimate_tokens(agent.messages) > budget and self.summarizer_factory is not None:
+            summarized = await self._summarize(agent)
+        after = fixed + estimate_tokens(agent.messages)
+        print(f'Context budget: {agent.name} prompt {tokens} -> {after} tokens (budget {budget}, '
+              f'{trimmed} tool results trimmed, {summarized} messages summarized)')
+        if request_trace is not None:
+            request_trace.record('context', agent.name, time.perf_counter() - started, prompt_tokens=after,
+                                 compactions=1, tokens_saved=tokens - after, trimmed_results=trimmed,
+                                 summarized_messages=summarized)
+
+    async def _summarize(self, agent):
+        """Replace the turns between the task and the recent messages with a summary; returns how many."""
+        messages = agent.messages
+        if any('toolResult' in block for block in messages[0]['content']):
+            return 0
+        # Keep a whole tool call/result pair together: the kept part must start with an assistant message
+        split = next((index for index in range(len(messages) - self.keep_recent, 1, -1)
+                      if messages[index]['role'] == 'assistant'), None)
+        if split is None:
+            return 0
+        older = messages[1:split]
+        # Not worth a model call when the recent messages alone are what exceeds the budget
+        if estimate_tokens(older) < self.budget_for(agent.name) // 4:
+            return 0
+        try:
+            result = await self.summarizer_factory().invoke_async(truncate_text(_transcript(older), SUMMARY_INPUT_MAX_CHARS))
+        except Exception as e:
+            print(f'Context summary for {agent.name} failed, keeping the trimmed history: {e}')
+            return 0
+        first = {'role': 'user', 'content': list(messages[0]['content']) + [
+            {'text': f'Summary of your work on this task so far:\n{str(result).strip()}'}]}
+        agent.messages[:] = [first] + messages[split:]
+        return len(older)
@@ -1,112 +1,317 @@
-from strands import Agent, tool
-import requests
+from strands import tool
 import os
-from strands.models import BedrockModel
-import boto3
+import contextvars
+import html
 import json
+from concurrent.futures import ThreadPoolExecutor
+from aws_tools.code_interpreter import CODE_INTERPRETER_BACKEND, backend_for_agent, get_interpreter_pool
+from aws_tools.charts import get_chart_service, normalize_spec
+from aws_tools.market_data_client import MarketDataError, get_market_client
+from aws_tools.ttl_cache import SQLiteCacheTier, TTLCache
+from aws_runtime.token_budget import compact_json
 
 S3_CHART_BUCKET = os.getenv('S3_CHART_BUCKET', 'news-output-processed')
 
 
+# Seconds each endpoint's response stays fresh: news moves fast, fundamentals rarely
+MARKET_CACHE_TTLS = {
+    'news': int(os.getenv('MARKET_CACHE_TTL_NEWS', '300')),
+    'technical': int(os.getenv('MARKET_CACHE_TTL_TECHNICAL', '900')),
+    'returns': int(os.getenv('MARKET_CACHE_TTL_RETURNS', '900')),
+    'stock': int(os.getenv('MARKET_CACHE_TTL_STOCK', '21600')),
+    'features': int(os.getenv('MARKET_CACHE_TTL_FEATURES', '900')),
+    'backtest': int(os.getenv('MARKET_CACHE_TTL_BACKTEST', '3600')),
+}
+# Responses are cached as the API returned them; for these endpoints the agents get compact_json
+# copies without images, long lists and long texts (see aws_runtime.token_budget)
+COMPACTED_ENDPOINTS = {'news', 'stock'}
+MARKET_CACHE_DB = os.getenv('MARKET_CACHE_DB')
+MARKET_BATCH_WORKERS = int(os.getenv('MARKET_BATCH_WORKERS', '8'))
+MARKET_LAKE_MAX_ROWS = int(os.getenv('MARKET_LAKE_MAX_ROWS', '1000'))
+
+market_cache = TTLCache(
+    max_bytes=int(os.getenv('MARKET_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    disk_tier=SQLiteCacheTier(MARKET_CACHE_DB) if MARKET_CACHE_DB else None,
+)
+
+
+def _fetch_json(endpoint, stock_symbol, failure_message):
+    symbol = stock_symbol.strip().upper()
+    path = f'/{endpoint}/{symbol}'
+
+    def load():
+        try:
+            return get_market_client().get_json(path)
+        except MarketDataError as e:
+            raise Exception(f'{failure_message}: {e}') from e
+
+    return market_cache.get_or_load(path, load, MARKET_CACHE_TTLS[endpoint])
+
+
 @tool
 def get_news_for_stock(stock_symbol):
-    API_BASE_URL = 'https://api.rrllgo.com'
-    API_KEY = os.getenv('MARKET_API_KEY', 'default-api-key')
-    response = requests.get(f'{API_BASE_URL}/news/{stock_symbol}',
-                            headers={'X-API-KEY': API_KEY})
+    data = _fetch_json('news', stock_symbol, f'Failed to fetch news for {stock_symbol}')
+    return json.dumps(compact_json(data))
 
-    if not response.ok:
-        raise Exception(f'Failed to fetch news for {stock_symbol}')
 
-    return json.dumps(response.json())
+@tool
+def get_technical_analysis_for_stock(stock_symbol):
+    data = _fetch_json('technical', stock_symbol,
+                       f'Failed to fetch technical analysis for {stock_symbol}')
+    return json.dumps(data)
 
 
 @tool
-def get_technical_analysis_for_stock(stock_symbol):
-    API_BASE_URL = 'https://api.rrllgo.com'
-    API_KEY = os.getenv('MARKET_API_KEY', 'default-api-key')
-    response = requests.get(f'{API_BASE_URL}/technical/{stock_symbol}',
-                            headers={'X-API-KEY': API_KEY})
+def get_financial_info_for_stock(stock_symbol):
+    data = _fetch_json('stock', stock_symbol, f'Failed to fetch financial info for {stock_symbol}')
+    return json.dumps(compact_json(data))
+
+
+@tool
+def stock_performance_returns(stock_symbol):
+    data = _fetch_json('returns', stock_symbol, f'Failed to fetch return for {stock_symbol}')
+    return json.dumps(data)
 
-    if not response.ok:
-        raise Exception(
-            f'Failed to fetch technical analysis for {stock_symbol}')
-    
-    return json.dumps(response.json())
+
+_batch_executor = ThreadPoolExecutor(max_workers=MARKET_BATCH_WORKERS, thread_name_prefix='market-batch')
+
+
+def _normalize_symbols(stock_symbols):
+    if isinstance(stock_symbols, str):
+        stock_symbols = stock_symbols.replace(';', ',').split(',')
+    symbols = []
+    for symbol in stock_symbols:
+        symbol = str(symbol).strip().upper()
+        if symbol and symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+def _fetch_batch(endpoint, stock_symbols, failure_message):
+    """Fetch one endpoint for many symbols concurrently; one symbol failing does not fail the rest."""
+    symbols = _normalize_symbols(stock_symbols)
+    # Each call runs in a copy of this context so its http spans land in the request's trace
+    futures = {symbol: _batch_executor.submit(contextvars.copy_context().run, _fetch_json, endpoint, symbol,
+                                              f'{failure_message} {symbol}')
+               for symbol in symbols}
+    results, errors = {}, {}
+    for symbol, future in futures.items():
+        try:
+            result = future.result()
+            results[symbol] = compact_json(result) if endpoint in COMPACTED_ENDPOINTS else result
+        except Exception as e:
+            errors[symbol] = str(e)
+    return json.dumps({'symbols': symbols, 'results': results, 'errors': errors})
 
 
 @tool
-def get_financial_info_for_stock(stock_symbol):
-    API_BASE_URL = 'https://api.rrllgo.com'
-    API_KEY = os.getenv('MARKET_API_KEY', 'default-api-key')
-    response = requests.get(f'{API_BASE_URL}/stock/{stock_symbol}',
-                            headers={'X-API-KEY': API_KEY})
+def get_news_for_stocks(stock_symbols: list[str]) -> str:
+    """Get the latest news for several stock symbols in one call.
+
+    Args:
+        stock_symbols: Ticker symbols, e.g. ["AAPL", "MSFT"]
+    """
+    return _fetch_batch('news', stock_symbols, 'Failed to fetch news for')
 
-    if not response.ok:
-        raise Exception(f'Failed to fetch financial info for {stock_symbol}')
 
-    return json.dumps(response.json())
+@tool
+def get_technical_analysis_for_stocks(stock_symbols: list[str]) -> str:
+    """Get technical analysis for several stock symbols in one call.
+
+    Args:
+        stock_symbols: Ticker symbols, e.g. ["AAPL", "MSFT"]
+    """
+    return _fetch_batch('technical', stock_symbols, 'Failed to fetch technical analysis for')
 
 
 @tool
-def stock_performance_returns(stock_symbol):
-    API_BASE_URL = 'https://api.rrllgo.com'
-    API_KEY = os.getenv('MARKET_API_KEY', 'default-api-key')
-    response = requests.get(f'{API_BASE_URL}/returns/{stock_symbol}',
-                            headers={'X-API-KEY': API_KEY})
+def get_financial_info_for_stocks(stock_symbols: list[str]) -> str:
+    """Get financial information for several stock symbols in one call.
 
-    if not response.ok:
-        raise Exception(f'Failed to fetch return for {stock_symbol}')
+    Args:
+        stock_symbols: Ticker symbols, e.g. ["AAPL", "MSFT"]
+    """
+    return _fetch_batch('stock', stock_symbols, 'Failed to fetch financial info for')
 
-    return json.dumps(response.json())
 
+@tool
+def stock_performance_returns_for_stocks(stock_symbols: list[str]) -> str:
+    """Get performance returns for several stock symbols in one call, e.g. to compare peers.
+
+    Args:
+        stock_symbols: Ticker symbols, e.g. ["AAPL", "MSFT"]
+    """
+    return _fetch_batch('returns', stock_symbols, 'Failed to fetch return for')
 
 
 @tool
-def code_execution_tool(code):
-    dp_client = boto3.client('bedrock-agentcore')
-    
-    str_libraries_list = "boto3 s3fs polars pyarrow"
-    command = f"pip install {str_libraries_list}"
-
-    session_response = dp_client.start_code_interpreter_session(
-        codeInterpreterIdentifier="code_interpreter_tool_f2isx-hTdVDSla3o",
-        name="s3InteractionSession",
-        sessionTimeoutSeconds=900
-    )
-    session_id = session_response["sessionId"]
-
-
-    try:
-        response = dp_client.invoke_code_interpreter(
-        codeInterpreterIdentifier="code_interpreter_tool_f2isx-hTdVDSla3o",
-        name="executeCommand",
-        sessionId = session_id,
-        arguments={"command": command}
-        )
-    except Exception as e:
-        print(e)
-
-
-    # Execute code in the Code Interpreter session
-    response = dp_client.invoke_code_interpreter(
-        codeInterpreterIdentifier="code_interpreter_tool_f2isx-hTdVDSla3o",
-        name="executeCode",
-        sessionId=session_id,
-        arguments={
-            "language": "python",
-            "code": code
+def query_market_data(stock_symbols: list[str], start_date: str, end_date: str, columns: list[str] | None = None) -> str:
+    """Get daily OHLCV rows from the s3://alpaca-market-data parquet dataset.
+
+    Only the year partitions and row groups holding the requested symbols and dates are read,
+    so use this instead of writing code that scans the dataset.
+
+    Args:
+        stock_symbols: Ticker symbols, e.g. ["AAPL", "MSFT"]
+        start_date: First trading date, YYYY-MM-DD
+        end_date: Last trading date, YYYY-MM-DD
+        columns: Subset of Open, High, Low, Close, Volume; symbol and Date are always returned
+    """
+    import polars as pl
+    from aws_tools.market_lake import MARKET_LAKE_URI, get_market_lake
+
+    frame = get_market_lake().read(_normalize_symbols(stock_symbols), start_date, end_date, columns)
+    summary = {}
+    if 'Close' in frame.columns and frame.height:
+        for row in frame.group_by('symbol').agg(
+                pl.col('Date').min().alias('first_date'), pl.col('Date').max().alias('last_date'),
+                pl.col('Close').first().alias('first_close'), pl.col('Close').last().alias('last_close'),
+                pl.col('Close').min().alias('min_close'), pl.col('Close').max().alias('max_close'),
+                pl.len().alias('rows')).iter_rows(named=True):
+            row['first_date'], row['last_date'] = str(row['first_date'])[:10], str(row['last_date'])[:10]
+            summary[row.pop('symbol')] = row
+    rows = frame.head(MARKET_LAKE_MAX_ROWS).with_columns(pl.col('Date').dt.strftime('%Y-%m-%d'))
+    return json.dumps({
+        'source': MARKET_LAKE_URI,
+        'row_count': frame.height,
+        'truncated': frame.height > MARKET_LAKE_MAX_ROWS,
+        'summary': summary,
+        'rows': rows.to_dicts(),
+    })
+
+
+@tool
+def get_daily_features(stock_symbols: list[str], start_date: str | None = None, end_date: str | None = None,
+                       fields: list[str] | None = None) -> str:
+    """Get precomputed daily analytics per symbol from the market dataset.
+
+    Fields: Close, return_1d/5d/21d/63d/126d/252d (simple returns over trading days),
+    volatility_21d/63d (annualised), sma_20/50/200, ema_12/26, rsi_14, drawdown_252d,
+    max_drawdown_252d, adv_20d (average daily volume) and dollar_volume_20d.
+    Without start_date only the latest row up to end_date (default today) is returned for each
+    symbol. Prefer this over computing
+    these indicators in code.
+
+    Args:
+        stock_symbols: Ticker symbols, e.g. ["AAPL", "MSFT"]
+        start_date: First trading date, YYYY-MM-DD
+        end_date: Last trading date, YYYY-MM-DD
+        fields: Subset of the fields above; all fields when omitted
+    """
+    import datetime
+    import polars as pl
+    from aws_tools.analytics import MARKET_FEATURES_URI, get_feature_store
+
+    symbols = _normalize_symbols(stock_symbols)
+    latest_only = not start_date
+    key = f"features:{','.join(symbols)}:{start_date}:{end_date}:{','.join(fields or [])}"
+
+    def load():
+        end = end_date or datetime.date.today().isoformat()
+        # Look back far enough to find the last trading day over weekends, holidays and a late update
+        start = start_date or (datetime.date.fromisoformat(end) - datetime.timedelta(days=31)).isoformat()
+        frame = get_feature_store().read(symbols, start, end, fields)
+        if latest_only:
+            frame = frame.group_by('symbol', maintain_order=True).last()
+        rows = frame.head(MARKET_LAKE_MAX_ROWS).with_columns(pl.col('Date').dt.strftime('%Y-%m-%d'))
+        return {
+            'source': MARKET_FEATURES_URI,
+            'row_count': frame.height,
+            'truncated': frame.height > MARKET_LAKE_MAX_ROWS,
+            'missing_symbols': sorted(set(symbols) - set(frame['symbol'].to_list())),
+            'rows': rows.to_dicts(),
         }
-    )
 
-    chart_data = ""
-    for event in response["stream"]:
-        if "result" in event:
-            result = event["result"]
-            if "content" in result:
-                for content_item in result["content"]:
-                    if content_item["type"] == "text":
-                        chart_data = chart_data + content_item["text"]
-    return chart_data
+    return json.dumps(market_cache.get_or_load(key, load, MARKET_CACHE_TTLS['features']))
+
+
+@tool
+def render_chart(chart_type: str, series: list[dict], title: str = '', x_label: str = '', y_label: str = '',
+                 data: dict | None = None, rebase: bool = False) -> str:
+    """Render a chart to PNG in S3 and get a presigned URL for an <img> tag, without writing code.
+
+    Each series is either inline values, {"label": "...", "x": [...], "y": [...]} (x optional),
+    or a reference to daily data, {"symbol": "AAPL", "field": "Close", "label": "..."}, read from
+    the source given in data. Identical charts are rendered and uploaded only once.
+
+    Args:
+        chart_type: line, bar, scatter, area or histogram
+        series: The series to plot, see above
+        title: Chart title
+        x_label: X axis label
+        y_label: Y axis label
+        data: For symbol series: {"source": "features" (Close and the get_daily_features fields) or
+            "market_data" (Open, High, Low, Close, Volume), "start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD"};
+            the last year when the dates are omitted
+        rebase: Rebase every series to 100 at its first value, to compare performance
+    """
+    spec = normalize_spec(chart_type, series, title, x_label, y_label, data, rebase)
+    result = get_chart_service().chart(spec)
+    result['img'] = f'<img src="{result["url"]}" alt="{html.escape(spec["title"])}"></img>'
+    return json.dumps(result)
+
+
+@tool
+def backtest_strategy(strategy: str, stock_symbols: list[str], start_date: str, end_date: str | None = None,
+                      params: dict | None = None, sweep: dict | None = None, long_short: bool = False,
+                      cost_bps: float | None = None, rebalance_days: int = 1, weighting: str | None = None) -> str:
+    """Backtest a trading strategy on daily prices from the market dataset, without writing code.
+
+    Strategies and their parameters (defaults in brackets):
+    buy_and_hold; sma_crossover fast [50], slow [200]; momentum lookback [126] (long after a positive
+    trailing return); rsi_reversion period [14], lower [30], upper [70] (enter below lower, exit above upper);
+    breakout window [20] (enter above the prior N-day high, exit below the prior N-day low);
+    cross_sectional_momentum lookback [126], quantile [0.1] (hold the best quantile of the symbols by
+    trailing return). Positions are set at the close and earn from the next day; trades pay cost_bps.
+    The portfolio combines all symbols; the result has CAGR, volatility, Sharpe, Sortino, max drawdown,
+    Calmar, hit rate, exposure and turnover, a buy-and-hold benchmark (equal capital in every symbol at the
+    start, never rebalanced), an equity curve (rebased to 100, ready for render_chart) and per-symbol
+    returns. Works for thousands of symbols.
+
+    Args:
+        strategy: One of the strategies above
+        stock_symbols: Ticker symbols, e.g. ["SPY"] or a whole universe
+        start_date: First trading date, YYYY-MM-DD; earlier history is loaded to form the signal
+        end_date: Last trading date, YYYY-MM-DD; today when omitted
+        params: Strategy parameters, e.g. {"fast": 50, "slow": 200}
+        sweep: Parameter values to try, e.g. {"fast": [20, 50], "slow": [100, 200]}; every combination
+            is backtested in parallel, ranked by Sharpe, and the best one is returned in full
+        long_short: Go short instead of flat when the signal is negative
+        cost_bps: Trading cost in basis points of the traded value; BACKTEST_COST_BPS (5) when omitted
+        rebalance_days: Only change positions every N trading days
+        weighting: equal (same capital per symbol) or signal (capital split across the held symbols);
+            signal by default for cross_sectional_momentum, equal otherwise
+    """
+    import datetime
+    from aws_tools.backtest import DEFAULT_COST_BPS, backtest_symbols
+    from aws_tools.market_lake import MARKET_LAKE_URI
+
+    symbols = _normalize_symbols(stock_symbols)
+    end = end_date or datetime.date.today().isoformat()
+    options = {'long_short': long_short, 'cost_bps': DEFAULT_COST_BPS if cost_bps is None else float(cost_bps),
+               'rebalance_days': int(rebalance_days), 'weighting': weighting}
+    key = 'backtest:' + json.dumps([strategy, symbols, start_date, end, params, sweep, options], sort_keys=True)
+
+    def load():
+        result = backtest_symbols(symbols, start_date, end, strategy, params, sweep, **options)
+        return dict(result, source=MARKET_LAKE_URI)
+
+    return json.dumps(market_cache.get_or_load(key, load, MARKET_CACHE_TTLS['backtest']), default=str)
+
+
+@tool
+def code_execution_tool(code):
+    return get_interpreter_pool().run(code)
+
+
+def code_execution_tool_for(agent_name):
+    """code_execution_tool running on the backend configured for ``agent_name`` (remote or local)."""
+    backend_name = backend_for_agent(agent_name)
+    if backend_name == CODE_INTERPRETER_BACKEND:
+        return code_execution_tool
 
+    @tool(name='code_execution_tool')
+    def agent_code_execution_tool(code):
+        return get_interpreter_pool(backend_name).run(code)
 
+    return agent_code_execution_tool
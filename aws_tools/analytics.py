@@ -0,0 +1,80 @@
+import math
+import os
+import threading
+
+import polars as pl
+
+from aws_tools.market_lake import MARKET_LAKE_CACHE_DIR, MARKET_LAKE_URI, MarketLakeReader, RowGroupCache
+
+MARKET_FEATURES_URI = os.getenv('MARKET_FEATURES_URI', f'{MARKET_LAKE_URI}/features')
+
+RETURN_HORIZONS = (1, 5, 21, 63, 126, 252)
+VOLATILITY_WINDOWS = (21, 63)
+SMA_WINDOWS = (20, 50, 200)
+EMA_SPANS = (12, 26)
+TRADING_DAYS = 252
+
+FEATURE_COLUMNS = (
+    ['symbol', 'Date', 'Close']
+    + [f'return_{h}d' for h in RETURN_HORIZONS]
+    + [f'volatility_{w}d' for w in VOLATILITY_WINDOWS]
+    + [f'sma_{w}' for w in SMA_WINDOWS]
+    + [f'ema_{s}' for s in EMA_SPANS]
+    + ['rsi_14', 'drawdown_252d', 'max_drawdown_252d', 'adv_20d', 'dollar_volume_20d', 'year']
+)
+FEATURE_SCHEMA = {c: pl.Float64 for c in FEATURE_COLUMNS}
+FEATURE_SCHEMA.update({'symbol': pl.String, 'Date': pl.Datetime('ns'), 'year': pl.Int32})
+
+# Trading days of history the newest row depends on: the longest chain of windows is max_drawdown_252d,
+# a 252-day minimum over drawdown_252d, which is itself measured from a 252-day maximum
+LOOKBACK_TRADING_DAYS = max(2 * TRADING_DAYS, max(RETURN_HORIZONS) + 1, max(SMA_WINDOWS), max(VOLATILITY_WINDOWS) + 1)
+# Calendar days to read back when updating incrementally: five trading days a week plus 10% for holidays
+LOOKBACK_CALENDAR_DAYS = math.ceil(LOOKBACK_TRADING_DAYS * 7 / 5 * 1.1)
+
+
+def compute_features(frame):
+    """Per-symbol daily features from OHLCV rows (needs symbol, Date, Close, Volume).
+
+    Everything is a window expression over ``symbol``, so the whole universe is
+    computed in one vectorised pass.
+    """
+    close = pl.col('Close')
+    frame = frame.sort(['symbol', 'Date']).with_columns(
+        (close / close.shift(1)).log().over('symbol').alias('_log_return'),
+        close.diff().over('symbol').alias('_change'),
+        (close / close.rolling_max(TRADING_DAYS, min_samples=1) - 1).over('symbol').alias('drawdown_252d'),
+    )
+    annualise = math.sqrt(TRADING_DAYS)
+    gain = pl.col('_change').clip(lower_bound=0)
+    loss = (-pl.col('_change')).clip(lower_bound=0)
+    frame = frame.with_columns(
+        *[(close / close.shift(h) - 1).over('symbol').alias(f'return_{h}d') for h in RETURN_HORIZONS],
+        *[(pl.col('_log_return').rolling_std(w) * annualise).over('symbol').alias(f'volatility_{w}d')
+          for w in VOLATILITY_WINDOWS],
+        *[close.rolling_mean(w).over('symbol').alias(f'sma_{w}') for w in SMA_WINDOWS],
+        *[close.ewm_mean(span=s, adjust=False).over('symbol').alias(f'ema_{s}') for s in EMA_SPANS],
+        gain.ewm_mean(alpha=1 / 14, adjust=False, min_samples=14).over('symbol').alias('_avg_gain'),
+        loss.ewm_mean(alpha=1 / 14, adjust=False, min_samples=14).over('symbol').alias('_avg_loss'),
+        pl.col('drawdown_252d').rolling_min(TRADING_DAYS, min_samples=1).over('symbol').alias('max_drawdown_252d'),
+        pl.col('Volume').cast(pl.Float64).rolling_mean(20).over('symbol').alias('adv_20d'),
+        (close * pl.col('Volume')).rolling_mean(20).over('symbol').alias('dollar_volume_20d'),
+        pl.col('Date').dt.year().cast(pl.Int32).alias('year'),
+    )
+    rsi = (pl.when(pl.col('_avg_loss') == 0).then(100.0)
+           .otherwise(100 - 100 / (1 + pl.col('_avg_gain') / pl.col('_avg_loss'))))
+    return frame.with_columns(rsi.alias('rsi_14')).select(FEATURE_COLUMNS)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_feature_store():
+    """Reader over the feature table written by aws_jobs.build_daily_features."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                cache = RowGroupCache(os.path.join(MARKET_LAKE_CACHE_DIR, 'features'))
+                _store = MarketLakeReader(MARKET_FEATURES_URI, cache=cache, index_uri=None, schema=FEATURE_SCHEMA)
+    return _store
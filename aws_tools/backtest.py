@@ -0,0 +1,365 @@
+import datetime
+import itertools
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import polars as pl
+
+from aws_runtime.instrumentation import span
+
+TRADING_DAYS = 252
+# Threads running the combinations of a parameter sweep side by side (polars releases the GIL while it computes)
+BACKTEST_SWEEP_WORKERS = int(os.getenv('BACKTEST_SWEEP_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Sweeps with less work than this (price rows times combinations) run one combination after another
+BACKTEST_PARALLEL_MIN_ROWS = int(os.getenv('BACKTEST_PARALLEL_MIN_ROWS', '2000000'))
+BACKTEST_MAX_SWEEP = int(os.getenv('BACKTEST_MAX_SWEEP', '200'))
+# Best sweep results returned to the agent
+BACKTEST_SWEEP_ROWS = int(os.getenv('BACKTEST_SWEEP_ROWS', '20'))
+BACKTEST_MAX_SYMBOLS = int(os.getenv('BACKTEST_MAX_SYMBOLS', '5000'))
+# Points of the equity curve returned to the agent, enough for a render_chart line chart
+BACKTEST_CURVE_POINTS = int(os.getenv('BACKTEST_CURVE_POINTS', '60'))
+# Per-symbol rows returned: every symbol up to this many, otherwise the best and worst half of it
+BACKTEST_SYMBOL_ROWS = int(os.getenv('BACKTEST_SYMBOL_ROWS', '20'))
+DEFAULT_COST_BPS = float(os.getenv('BACKTEST_COST_BPS', '5'))
+
+
+class BacktestError(ValueError):
+    pass
+
+
+def _sma_crossover(frame, params, short):
+    close = pl.col('Close')
+    frame = frame.with_columns(close.rolling_mean(params['fast']).over('symbol').alias('_fast'),
+                               close.rolling_mean(params['slow']).over('symbol').alias('_slow'))
+    return frame.with_columns(pl.when(pl.col('_slow').is_null()).then(None)
+                              .when(pl.col('_fast') > pl.col('_slow')).then(1.0).otherwise(short).alias('signal'))
+
+
+def _momentum(frame, params, short):
+    change = (pl.col('Close') / pl.col('Close').shift(params['lookback']) - 1).over('symbol')
+    return frame.with_columns(pl.when(change.is_null()).then(None).when(change > 0).then(1.0).otherwise(short)
+                              .alias('signal'))
+
+
+def _rsi_reversion(frame, params, short):
+    change = pl.col('Close').diff()
+    alpha = 1 / params['period']
+    frame = frame.with_columns(
+        change.clip(lower_bound=0).ewm_mean(alpha=alpha, adjust=False, min_samples=params['period'])
+        .over('symbol').alias('_gain'),
+        (-change).clip(lower_bound=0).ewm_mean(alpha=alpha, adjust=False, min_samples=params['period'])
+        .over('symbol').alias('_loss'))
+    rsi = pl.when(pl.col('_loss') == 0).then(100.0).otherwise(100 - 100 / (1 + pl.col('_gain') / pl.col('_loss')))
+    # Enter below the lower band, leave (or go short) above the upper band, hold in between
+    return frame.with_columns(pl.when(rsi < params['lower']).then(1.0).when(rsi > params['upper']).then(short)
+                              .otherwise(None).alias('signal'))
+
+
+def _breakout(frame, params, short):
+    high = pl.col('High').rolling_max(params['window']).shift(1).over('symbol')
+    low = pl.col('Low').rolling_min(params['window']).shift(1).over('symbol')
+    return frame.with_columns(pl.when(pl.col('Close') > high).then(1.0).when(pl.col('Close') < low).then(short)
+                              .otherwise(None).alias('signal'))
+
+
+def _cross_sectional_momentum(frame, params, short):
+    frame = frame.with_columns(
+        (pl.col('Close') / pl.col('Close').shift(params['lookback']) - 1).over('symbol').alias('_change'))
+    # Long the top ``quantile`` of the universe by trailing return each day, short the bottom one if allowed
+    rank = pl.col('_change').rank('ordinal').over('Date')
+    count = pl.col('_change').count().over('Date')
+    selected = pl.max_horizontal(pl.lit(1), (count * params['quantile']).floor())
+    return frame.with_columns(pl.when(pl.col('_change').is_null()).then(None).when(rank > count - selected).then(1.0)
+                              .when(rank <= selected).then(short).otherwise(0.0).alias('signal'))
+
+
+def _buy_and_hold(frame, params, short):
+    return frame.with_columns(pl.lit(1.0).alias('signal'))
+
+
+# name -> (signal builder, default parameters, default weighting, columns read, history needed)
+STRATEGIES = {
+    'buy_and_hold': (_buy_and_hold, {}, 'equal', ['Close'], lambda p: 0),
+    'sma_crossover': (_sma_crossover, {'fast': 50, 'slow': 200}, 'equal', ['Close'], lambda p: p['slow']),
+    'momentum': (_momentum, {'lookback': 126}, 'equal', ['Close'], lambda p: p['lookback']),
+    'rsi_reversion': (_rsi_reversion, {'period': 14, 'lower': 30, 'upper': 70}, 'equal', ['Close'],
+                      lambda p: 5 * p['period']),
+    'breakout': (_breakout, {'window': 20}, 'equal', ['Close', 'High', 'Low'], lambda p: p['window']),
+    'cross_sectional_momentum': (_cross_sectional_momentum, {'lookback': 126, 'quantile': 0.1}, 'signal',
+                                 ['Close'], lambda p: p['lookback']),
+}
+WEIGHTINGS = ('equal', 'signal')
+
+
+def strategy_params(strategy, params=None):
+    """Defaults of ``strategy`` updated with ``params``; raises BacktestError for unknown names."""
+    if strategy not in STRATEGIES:
+        raise BacktestError(f'strategy must be one of {", ".join(STRATEGIES)}, got {strategy!r}')
+    defaults = STRATEGIES[strategy][1]
+    unknown = sorted(set(params or {}) - set(defaults))
+    if unknown:
+        raise BacktestError(f'{strategy} has no parameters {unknown}; it takes {sorted(defaults) or "none"}')
+    merged = dict(defaults, **(params or {}))
+    for name, value in merged.items():
+        merged[name] = float(value) if isinstance(defaults[name], float) else int(value)
+    if strategy == 'sma_crossover' and merged['fast'] >= merged['slow']:
+        raise BacktestError('sma_crossover needs fast < slow')
+    return merged
+
+
+def warmup_days(strategy, params):
+    """Calendar days of history to load before the start date so the first signal is already formed."""
+    return int(STRATEGIES[strategy][4](params) * 1.5) + 10
+
+
+def load_prices(symbols, start_date, end_date, strategy, params, reader=None):
+    """Daily rows for ``symbols`` from the market lake, sorted by symbol and Date, with enough history before
+    ``start_date`` for the signal."""
+    if reader is None:
+        from aws_tools.market_lake import get_market_lake
+        reader = get_market_lake()
+    start = datetime.date.fromisoformat(start_date) - datetime.timedelta(days=warmup_days(strategy, params))
+    return reader.read(symbols, start.isoformat(), end_date, STRATEGIES[strategy][3]).sort(['symbol', 'Date'])
+
+
+def positions(frame, strategy, params, long_short=False, weighting=None, rebalance_days=1):
+    """Target weight of every symbol on every date, decided at that day's close.
+
+    ``frame`` must be sorted by symbol and Date, as
+    load_prices returns it. Signals are vectorised polars expressions over
+    ``symbol`` (and ``Date`` for cross-sectional ranks), so the whole
+    universe is one pass. A signal of None holds the previous position. With
+    ``rebalance_days`` above one positions only change every that many
+    trading days. ``equal`` weighting gives every symbol trading that day the
+    same capital; ``signal`` splits the capital across the symbols with a
+    position.
+    """
+    build, _, default_weighting, _, _ = STRATEGIES[strategy]
+    weighting = weighting or default_weighting
+    if weighting not in WEIGHTINGS:
+        raise BacktestError(f'weighting must be one of {", ".join(WEIGHTINGS)}')
+    frame = build(frame, params, -1.0 if long_short else 0.0).with_columns(pl.col('signal').cast(pl.Float64))
+    if rebalance_days > 1:
+        rebalance = (pl.col('Date').rank('dense') - 1) % rebalance_days == 0
+        frame = frame.with_columns(pl.when(rebalance).then(pl.col('signal')).otherwise(None).alias('signal'))
+    frame = frame.with_columns(pl.col('signal').forward_fill().over('symbol').fill_null(0.0))
+    if weighting == 'equal':
+        scale = pl.col('signal').count().over('Date')
+    else:
+        scale = pl.col('signal').abs().sum().over('Date')
+    return frame.with_columns(pl.when(scale > 0).then(pl.col('signal') / scale).otherwise(0.0).alias('weight'))
+
+
+def portfolio_returns(frame, start_date=None, cost_bps=DEFAULT_COST_BPS):
+    """Per-symbol rows and daily portfolio returns from ``positions`` output.
+
+    A weight set at one close earns the next day's return, so there is no
+    look-ahead; every change of weight pays ``cost_bps`` of the traded value.
+    ``symbol_return`` is the strategy on that symbol alone, with all capital.
+    """
+    close = pl.col('Close')
+    cost = cost_bps / 10000
+    if start_date:
+        # The warm-up rows only form the signal: the portfolio starts in cash and pays for its first trades
+        start = datetime.datetime.fromisoformat(start_date)
+        frame = frame.with_columns(pl.when(pl.col('Date') < start).then(0.0).otherwise(pl.col(name)).alias(name)
+                                   for name in ('weight', 'signal'))
+    frame = frame.with_columns(
+        (close / close.shift(1) - 1).over('symbol').fill_null(0.0).alias('asset_return'),
+        pl.col('weight').shift(1).over('symbol').fill_null(0.0).alias('held'),
+        pl.col('signal').shift(1).over('symbol').fill_null(0.0).alias('held_signal'),
+    )
+    if start_date:
+        frame = frame.filter(pl.col('Date') >= start)
+    frame = frame.with_columns(
+        (pl.col('weight') - pl.col('held')).abs().alias('traded'),
+        (pl.col('signal') != pl.col('held_signal')).alias('trade'),
+        (pl.col('held') * pl.col('asset_return') - (pl.col('weight') - pl.col('held')).abs() * cost).alias('net'),
+        (pl.col('held_signal') * pl.col('asset_return') - (pl.col('signal') - pl.col('held_signal')).abs() * cost)
+        .alias('symbol_return'),
+    )
+    daily = (frame.group_by('Date').agg(pl.col('net').sum().alias('return'),
+                                        pl.col('held').abs().sum().alias('exposure'),
+                                        pl.col('traded').sum().alias('turnover'))
+             .sort('Date'))
+    return frame, daily
+
+
+def buy_and_hold_returns(frame):
+    """Daily returns of equal capital put in every symbol at its first close in ``frame`` and never rebalanced.
+
+    A symbol that starts trading later waits in cash until then.
+    """
+    growth = frame.select('Date', 'symbol', (pl.col('Close') / pl.col('Close').first()).over('symbol').alias('value'))
+    grid = growth.select(pl.col('Date').unique()).join(growth.select(pl.col('symbol').unique()), how='cross')
+    # Before its first close a symbol's share is still cash; after its last one it keeps its last value
+    value = (grid.join(growth, on=['Date', 'symbol'], how='left').sort(['symbol', 'Date'])
+             .with_columns(pl.col('value').forward_fill().over('symbol').fill_null(1.0))
+             .group_by('Date').agg(pl.col('value').mean()).sort('Date')['value'])
+    return (value / value.shift(1) - 1).fill_null(0.0)
+
+
+def metrics(returns, exposure=None, turnover=None):
+    """Standard performance figures of a daily return series."""
+    returns = returns.fill_null(0.0)
+    days = returns.len()
+    if not days:
+        return {'days': 0}
+    equity = (returns + 1).cum_prod()
+    total = equity[-1] - 1
+    years = days / TRADING_DAYS
+    mean, std = returns.mean(), returns.std() or 0.0
+    downside = returns.filter(returns < 0)
+    downside_std = math.sqrt((downside ** 2).sum() / days) if downside.len() else 0.0
+    drawdown = (equity / equity.cum_max() - 1).min()
+    cagr = (1 + total) ** (1 / years) - 1 if total > -1 and years > 0 else -1.0
+    active = returns.filter(returns != 0)
+    values = {
+        'days': days,
+        'total_return': total,
+        'cagr': cagr,
+        'volatility': std * math.sqrt(TRADING_DAYS),
+        'sharpe': mean / std * math.sqrt(TRADING_DAYS) if std else None,
+        'sortino': mean / downside_std * math.sqrt(TRADING_DAYS) if downside_std else None,
+        'max_drawdown': drawdown,
+        'calmar': cagr / -drawdown if drawdown < 0 else None,
+        'hit_rate': (active > 0).mean() if active.len() else None,
+    }
+    if exposure is not None:
+        values['exposure'] = exposure.mean()
+    if turnover is not None:
+        values['annual_turnover'] = turnover.mean() * TRADING_DAYS
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in values.items()}
+
+
+def _curve(daily, points=BACKTEST_CURVE_POINTS):
+    equity = daily.select(pl.col('Date').dt.strftime('%Y-%m-%d'), ((pl.col('return') + 1).cum_prod() * 100).round(2))
+    step = max(1, -(-equity.height // points))
+    # Keep the last day so the curve ends on the final value
+    indexes = sorted(set(range(0, equity.height, step)) | {equity.height - 1})
+    return {'x': equity['Date'].gather(indexes).to_list(), 'y': equity['return'].gather(indexes).to_list()}
+
+
+def run_backtest(frame, strategy, params=None, start_date=None, cost_bps=DEFAULT_COST_BPS, long_short=False,
+                 weighting=None, rebalance_days=1, detail=True):
+    """Backtest ``strategy`` over ``frame`` (daily rows of many symbols); returns a JSON-ready dict.
+
+    With ``detail`` the result has the equity curve, the buy-and-hold
+    benchmark of the same symbols (equal capital at the start, never
+    rebalanced) and per-symbol figures; sweeps run without it.
+    """
+    params = strategy_params(strategy, params)
+    frame, daily = portfolio_returns(positions(frame, strategy, params, long_short, weighting, rebalance_days),
+                                     start_date, cost_bps)
+    if not daily.height:
+        raise BacktestError('no market data rows for these symbols and dates')
+    result = {'strategy': strategy, 'params': params, 'long_short': long_short,
+              'weighting': weighting or STRATEGIES[strategy][2], 'rebalance_days': rebalance_days,
+              'cost_bps': cost_bps, 'metrics': metrics(daily['return'], daily['exposure'], daily['turnover'])}
+    if not detail:
+        return result
+    by_symbol = (frame.group_by('symbol')
+                 .agg(((pl.col('symbol_return') + 1).product() - 1).alias('total_return'),
+                      ((pl.col('asset_return').slice(1) + 1).product() - 1).alias('buy_and_hold_return'),
+                      (pl.col('held_signal') != 0).mean().alias('time_in_market'),
+                      pl.col('trade').sum().alias('trades'))
+                 .sort('total_return', descending=True)
+                 .with_columns(pl.col(pl.Float64).round(4)))
+    if by_symbol.height > BACKTEST_SYMBOL_ROWS:
+        half = BACKTEST_SYMBOL_ROWS // 2
+        by_symbol = pl.concat([by_symbol.head(half), by_symbol.tail(half)])
+    dates = daily['Date']
+    result.update(start=dates[0].strftime('%Y-%m-%d'), end=dates[-1].strftime('%Y-%m-%d'),
+                  symbols=frame['symbol'].n_unique(), benchmark=metrics(buy_and_hold_returns(frame)),
+                  equity_curve=_curve(daily), by_symbol=by_symbol.to_dicts())
+    return result
+
+
+def sweep_grid(strategy, sweep):
+    """Every parameter combination of ``sweep`` ({name: [values]}), validated, at most BACKTEST_MAX_SWEEP."""
+    defaults = strategy_params(strategy)
+    names = sorted(sweep)
+    unknown = [name for name in names if name not in defaults]
+    if unknown:
+        raise BacktestError(f'{strategy} has no parameters {unknown}; it takes {sorted(defaults) or "none"}')
+    grid = [dict(zip(names, values)) for values in itertools.product(*(list(sweep[name]) for name in names))]
+    if len(grid) > BACKTEST_MAX_SWEEP:
+        raise BacktestError(f'the sweep has {len(grid)} combinations; at most {BACKTEST_MAX_SWEEP} are allowed')
+    combinations = []
+    for values in grid:
+        try:
+            combinations.append(strategy_params(strategy, values))
+        except BacktestError:
+            # Combinations that make no sense (e.g. fast >= slow) are skipped, not fatal
+            continue
+    return combinations
+
+
+_sweep_executor = None
+_sweep_executor_lock = threading.Lock()
+
+
+def get_sweep_executor():
+    """Process-wide thread pool for sweeps, created on first use and kept for the life of the process."""
+    global _sweep_executor
+    if _sweep_executor is None:
+        with _sweep_executor_lock:
+            if _sweep_executor is None:
+                _sweep_executor = ThreadPoolExecutor(max_workers=BACKTEST_SWEEP_WORKERS,
+                                                     thread_name_prefix='backtest-sweep')
+    return _sweep_executor
+
+
+def run_sweep(frame, strategy, sweep, base_params=None, workers=BACKTEST_SWEEP_WORKERS, **options):
+    """Backtest every combination of ``sweep`` on top of ``base_params``; results sorted by Sharpe ratio.
+
+    Each combination is a vectorised pass over all symbols. Sweeps with
+    enough work run on a shared thread pool, which needs no copy of the
+    price frame and no process start-up; smaller ones run in turn, already
+    spread over polars' own threads.
+    """
+    combinations = sweep_grid(strategy, {**{k: [v] for k, v in (base_params or {}).items()}, **sweep})
+    if not combinations:
+        raise BacktestError('no valid parameter combination in the sweep')
+    with span('backtest', 'sweep', strategy=strategy, combinations=len(combinations)) as values:
+        if workers > 1 and len(combinations) > 1 and frame.height * len(combinations) >= BACKTEST_PARALLEL_MIN_ROWS:
+            values['workers'] = min(workers, BACKTEST_SWEEP_WORKERS, len(combinations))
+            results = list(get_sweep_executor().map(
+                lambda params: run_backtest(frame, strategy, params, detail=False, **options), combinations))
+        else:
+            results = [run_backtest(frame, strategy, params, detail=False, **options) for params in combinations]
+    return sorted(results, key=lambda result: -math.inf if result['metrics'].get('sharpe') is None
+                  else result['metrics']['sharpe'], reverse=True)
+
+
+def backtest_symbols(symbols, start_date, end_date, strategy, params=None, sweep=None, reader=None,
+                     workers=BACKTEST_SWEEP_WORKERS, **options):
+    """Load the symbols' prices once and run one backtest, or a sweep plus the full backtest of its best parameters."""
+    if not symbols:
+        raise BacktestError('give at least one symbol')
+    if len(symbols) > BACKTEST_MAX_SYMBOLS:
+        raise BacktestError(f'at most {BACKTEST_MAX_SYMBOLS} symbols can be backtested at once')
+    base = strategy_params(strategy, params)
+    combinations = sweep_grid(strategy, {**{k: [v] for k, v in base.items()}, **sweep}) if sweep else [base]
+    if not combinations:
+        raise BacktestError('no valid parameter combination in the sweep')
+    # Enough history for the slowest combination of the sweep
+    slowest = max(combinations, key=lambda values: warmup_days(strategy, values))
+    with span('backtest', 'load', symbols=len(symbols)):
+        frame = load_prices(symbols, start_date, end_date, strategy, slowest, reader)
+    if not frame.height:
+        raise BacktestError('no market data rows for these symbols and dates')
+    missing = sorted(set(symbols) - set(frame['symbol'].unique().to_list()))
+    if sweep:
+        ranked = run_sweep(frame, strategy, sweep, base, workers, start_date=start_date, **options)
+        result = run_backtest(frame, strategy, ranked[0]['params'], start_date, **options)
+        result['sweep'] = [{'params': item['params'], 'metrics': item['metrics']}
+                           for item in ranked[:BACKTEST_SWEEP_ROWS]]
+        result['sweep_size'] = len(ranked)
+    else:
+        with span('backtest', 'run', strategy=strategy, symbols=len(symbols)):
+            result = run_backtest(frame, strategy, base, start_date, **options)
+    result['missing_symbols'] = missing
+    return result
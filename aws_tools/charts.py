@@ -0,0 +1,305 @@
+import datetime
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from aws_runtime.instrumentation import span
+
+# Bucket and optional key prefix the charts are uploaded to, e.g. s3://my-bucket/reports
+S3_CHART_BUCKET = os.getenv('S3_CHART_BUCKET', 'news-output-processed')
+CHART_KEY_PREFIX = os.getenv('CHART_KEY_PREFIX', 'charts')
+CHART_URL_EXPIRY = int(os.getenv('CHART_URL_EXPIRY', '3600'))
+# A presigned URL is handed out again until it has less than this many seconds left
+CHART_URL_MIN_REMAINING = int(os.getenv('CHART_URL_MIN_REMAINING', '900'))
+CHART_DPI = int(os.getenv('CHART_DPI', '110'))
+CHART_SIZE = (10, 5.5)
+# Longer series are thinned to this many points before rendering
+CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', '2000'))
+# Part of every chart key: bump it when the rendering changes so old images are not reused
+CHART_STYLE_VERSION = 2
+
+CHART_TYPES = ('line', 'bar', 'scatter', 'area', 'histogram')
+DATA_SOURCES = ('market_data', 'features')
+
+
+class ChartError(ValueError):
+    pass
+
+
+def _bucket_and_prefix(uri):
+    bucket, _, prefix = uri.removeprefix('s3://').partition('/')
+    return bucket, '/'.join(part for part in (prefix.strip('/'), CHART_KEY_PREFIX.strip('/')) if part)
+
+
+def _thin(xs, ys, max_points=CHART_MAX_POINTS):
+    if len(ys) <= max_points:
+        return xs, ys
+    step = -(-len(ys) // max_points)
+    # Keep the last point so the chart ends on the latest value
+    indexes = list(range(0, len(ys) - 1, step)) + [len(ys) - 1]
+    return [xs[i] for i in indexes], [ys[i] for i in indexes]
+
+
+def _as_dates(series):
+    """The series' x values as datetimes if every one is an ISO date string, else None.
+
+    Dates plot on a time axis, so series over different dates line up; as
+    strings they would be categories placed in the order they are first seen.
+    """
+    try:
+        return [[datetime.datetime.fromisoformat(value) for value in item['x']] for item in series]
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_spec(chart_type, series, title='', x_label='', y_label='', data=None, rebase=False):
+    """Validated, canonical form of a chart spec; raises ChartError with a message the model can act on."""
+    if chart_type not in CHART_TYPES:
+        raise ChartError(f'chart_type must be one of {", ".join(CHART_TYPES)}, got {chart_type!r}')
+    if not series:
+        raise ChartError('series must hold at least one series')
+    data = dict(data or {})
+    if data and data.get('source', 'features') not in DATA_SOURCES:
+        raise ChartError(f'data.source must be one of {", ".join(DATA_SOURCES)}')
+    normalized = []
+    for index, item in enumerate(series):
+        if 'symbol' in item:
+            if not data:
+                raise ChartError(f'series {index} references {item["symbol"]} but no data reference was given')
+            symbol = item['symbol'].strip().upper()
+            normalized.append({'label': item.get('label') or f'{symbol} {item.get("field", "Close")}',
+                               'symbol': symbol, 'field': item.get('field', 'Close')})
+        elif 'y' in item:
+            try:
+                # None is a gap, as in the series read from the data
+                y = [None if value is None else float(value) for value in item['y']]
+            except (TypeError, ValueError):
+                raise ChartError(f'series {index}: y values must be numbers or null') from None
+            x = list(item.get('x') or range(len(y)))
+            if len(x) != len(y):
+                raise ChartError(f'series {index}: x has {len(x)} values and y has {len(y)}')
+            normalized.append({'label': item.get('label') or f'series {index + 1}', 'x': x, 'y': y})
+        else:
+            raise ChartError(f'series {index} needs either y values or a symbol (with an optional field)')
+    return {'type': chart_type, 'title': title or '', 'x_label': x_label or '', 'y_label': y_label or '',
+            'data': {'source': data.get('source', 'features'), 'start_date': data.get('start_date'),
+                     'end_date': data.get('end_date')} if data else None,
+            'rebase': bool(rebase), 'series': normalized}
+
+
+def resolve_series(spec):
+    """The spec's series as label, x and y lists, reading symbol references from the market data or features table."""
+    references = [item for item in spec['series'] if 'symbol' in item]
+    frame = None
+    if references:
+        data = spec['data']
+        symbols = sorted({item['symbol'] for item in references})
+        fields = sorted({item['field'] for item in references})
+        end = data['end_date'] or datetime.date.today().isoformat()
+        start = data['start_date'] or (datetime.date.fromisoformat(end) - datetime.timedelta(days=365)).isoformat()
+        if data['source'] == 'market_data':
+            from aws_tools.market_lake import get_market_lake
+            frame = get_market_lake().read(symbols, start, end, fields)
+        else:
+            from aws_tools.analytics import get_feature_store
+            frame = get_feature_store().read(symbols, start, end, fields)
+    resolved = []
+    for item in spec['series']:
+        if 'symbol' in item:
+            rows = frame.filter(frame['symbol'] == item['symbol']).sort('Date')
+            if not rows.height:
+                raise ChartError(f'no {spec["data"]["source"]} rows for {item["symbol"]} in the requested dates')
+            x = [value.strftime('%Y-%m-%d') for value in rows['Date'].to_list()]
+            y = [None if value is None else float(value) for value in rows[item['field']].to_list()]
+        else:
+            x, y = item['x'], item['y']
+        if spec['rebase']:
+            base = next((value for value in y if value), None)
+            y = [None if value is None or base is None else value / base * 100 for value in y]
+        x, y = _thin(x, y)
+        resolved.append({'label': item['label'], 'x': x, 'y': y})
+    return resolved
+
+
+def chart_key(spec, series, prefix=''):
+    """Content address of a rendered chart: the same spec over the same data always maps to the same object."""
+    content = json.dumps({'spec': {key: value for key, value in spec.items() if key != 'series'},
+                          'series': series, 'style': CHART_STYLE_VERSION, 'dpi': CHART_DPI},
+                         sort_keys=True, default=str)
+    digest = hashlib.sha256(content.encode()).hexdigest()[:40]
+    return f'{prefix}/{digest}.png' if prefix else f'{digest}.png'
+
+
+class ChartRenderer:
+    """Renders chart specs to PNG in-process on matplotlib's Agg backend.
+
+    matplotlib is imported and a first figure drawn (which builds the font
+    cache) once per process, so later charts render in tens of milliseconds.
+    Figures are created without pyplot, and drawing is serialised because
+    matplotlib is not thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._figure = None
+
+    def warm_up(self):
+        with self._lock:
+            if self._ready.is_set():
+                return
+            with span('chart', 'warm_up'):
+                import matplotlib
+                matplotlib.use('Agg')
+                from matplotlib.backends.backend_agg import FigureCanvasAgg
+                from matplotlib.figure import Figure
+
+                def figure():
+                    fig = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+                    FigureCanvasAgg(fig)
+                    return fig
+
+                self._figure = figure
+                fig = figure()
+                fig.add_subplot().plot([0, 1], [0, 1], label='warm-up')
+                fig.canvas.print_png(io.BytesIO())
+                self._ready.set()
+
+    def render(self, spec, series):
+        self.warm_up()
+        from matplotlib.ticker import MaxNLocator
+
+        with self._lock, span('chart', 'render', type=spec['type']):
+            fig = self._figure()
+            ax = fig.add_subplot()
+            dates = _as_dates(series) if spec['type'] in ('line', 'scatter', 'area') else None
+            for index, item in enumerate(series):
+                x, y = dates[index] if dates else item['x'], item['y']
+                if spec['type'] == 'line':
+                    ax.plot(x, y, label=item['label'], linewidth=1.5)
+                elif spec['type'] == 'area':
+                    ax.fill_between(x if dates else range(len(y)), [value or 0 for value in y], alpha=0.35,
+                                    label=item['label'])
+                elif spec['type'] == 'scatter':
+                    ax.scatter(x, y, label=item['label'], s=12)
+                elif spec['type'] == 'histogram':
+                    ax.hist([value for value in y if value is not None], bins=40, alpha=0.6, label=item['label'])
+                else:
+                    width = 0.8 / len(series)
+                    ax.bar([i + index * width for i in range(len(y))], [value or 0 for value in y], width,
+                           label=item['label'])
+            if spec['type'] == 'bar':
+                x = series[0]['x']
+                ax.set_xticks([i + 0.4 - 0.4 / len(series) for i in range(len(x))], [str(value) for value in x])
+            elif spec['type'] == 'area' and not dates:
+                x = series[0]['x']
+                ticks = list(range(0, len(x), max(1, len(x) // 8)))
+                ax.set_xticks(ticks, [str(x[i]) for i in ticks])
+            elif spec['type'] in ('line', 'scatter') and not dates and len(series[0]['x']) > 12:
+                ax.xaxis.set_major_locator(MaxNLocator(8))
+            ax.set_title(spec['title'])
+            ax.set_xlabel(spec['x_label'])
+            ax.set_ylabel(spec['y_label'] or ('Rebased to 100' if spec['rebase'] else ''))
+            ax.grid(True, alpha=0.3)
+            if len(series) > 1 or spec['type'] == 'histogram':
+                ax.legend()
+            fig.autofmt_xdate()
+            fig.tight_layout()
+            output = io.BytesIO()
+            fig.canvas.print_png(output)
+            return output.getvalue()
+
+
+class ChartStore:
+    """Content-addressed chart objects in S3 with presigned URLs reused until close to expiry."""
+
+    def __init__(self, uri=S3_CHART_BUCKET, expiry=CHART_URL_EXPIRY, min_remaining=CHART_URL_MIN_REMAINING,
+                 client=None):
+        self.bucket, self.prefix = _bucket_and_prefix(uri)
+        self.expiry = expiry
+        self.min_remaining = min_remaining
+        self.client = client or boto3.client('s3', config=Config(signature_version='s3v4'))
+        self._known = set()
+        self._urls = {}
+        self._lock = threading.Lock()
+        self._stats = {'uploads': 0, 'existing': 0, 'urls_signed': 0, 'urls_reused': 0}
+
+    def exists(self, key):
+        with self._lock:
+            if key in self._known:
+                return True
+        try:
+            with span('chart', 'head_object'):
+                self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        with self._lock:
+            self._known.add(key)
+            self._stats['existing'] += 1
+        return True
+
+    def put(self, key, body):
+        with span('chart', 'upload', bytes=len(body)):
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType='image/png',
+                                   CacheControl='public, max-age=31536000, immutable')
+        with self._lock:
+            self._known.add(key)
+            self._stats['uploads'] += 1
+
+    def url(self, key):
+        now = time.time()
+        with self._lock:
+            cached = self._urls.get(key)
+            if cached is not None and cached[1] - now > self.min_remaining:
+                self._stats['urls_reused'] += 1
+                return cached[0]
+        url = self.client.generate_presigned_url('get_object', Params={'Bucket': self.bucket, 'Key': key},
+                                                 ExpiresIn=self.expiry)
+        with self._lock:
+            self._urls[key] = (url, now + self.expiry)
+            self._stats['urls_signed'] += 1
+        return url
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, known=len(self._known), urls=len(self._urls))
+
+
+class ChartService:
+    def __init__(self, renderer=None, store=None):
+        self.renderer = renderer or ChartRenderer()
+        self.store = store or ChartStore()
+
+    def chart(self, spec):
+        """Render ``spec`` (see normalize_spec) unless the same chart is already in S3; returns its URL and key."""
+        series = resolve_series(spec)
+        key = chart_key(spec, series, self.store.prefix)
+        existed = self.store.exists(key)
+        if not existed:
+            self.store.put(key, self.renderer.render(spec, series))
+        return {'url': self.store.url(key), 'key': f's3://{self.store.bucket}/{key}', 'reused': existed,
+                'points': sum(len(item['y']) for item in series)}
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_chart_service():
+    """Process-wide ChartService; matplotlib is warmed up in the background when it is created."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ChartService()
+                threading.Thread(target=_service.renderer.warm_up, daemon=True).start()
+    return _service
@@ -0,0 +1,485 @@
+import atexit
+import contextlib
+import contextvars
+import io
+import os
+import threading
+import time
+import traceback
+import uuid
+
+import boto3
+from botocore.exceptions import ClientError, ConnectTimeoutError, EndpointConnectionError
+
+from aws_runtime.instrumentation import span
+
+CODE_INTERPRETER_ID = os.getenv('CODE_INTERPRETER_ID', 'code_interpreter_tool_f2isx-hTdVDSla3o')
+CODE_INTERPRETER_BACKEND = os.getenv('CODE_INTERPRETER_BACKEND', 'remote')
+SESSION_TIMEOUT_SECONDS = int(os.getenv('CODE_INTERPRETER_SESSION_TIMEOUT', '900'))
+POOL_MAX_SESSIONS = int(os.getenv('CODE_INTERPRETER_POOL_SIZE', '4'))
+POOL_IDLE_TIMEOUT = float(os.getenv('CODE_INTERPRETER_IDLE_TIMEOUT', '300'))
+# "invocation" gives every graph run its own sessions, "shared" lets runs reuse warm sessions
+SESSION_SCOPE_MODE = os.getenv('CODE_INTERPRETER_SESSION_SCOPE', 'invocation')
+PREINSTALL_LIBRARIES = "boto3 s3fs polars pyarrow"
+# Service errors meaning the session is gone before the snippet ran, so it is safe to run it on a new one
+SESSION_ERROR_CODES = {'ResourceNotFoundException'}
+
+_current_scope = contextvars.ContextVar('code_interpreter_scope', default=None)
+
+
+class CodeExecutionTimeout(Exception):
+    """Raised by a backend when a snippet overruns its time limit; not retried."""
+
+
+class SessionUnavailable(Exception):
+    """Raised by a backend when the session could not run the snippet at all (expired, unreachable).
+
+    Only these are retried on a fresh session: any other error may come after
+    the snippet ran in part, and running it again could repeat its side effects.
+    """
+
+
+class RemoteInterpreterBackend:
+    """Sessions on the Bedrock AgentCore Code Interpreter."""
+
+    def __init__(self, interpreter_id=CODE_INTERPRETER_ID, session_timeout=SESSION_TIMEOUT_SECONDS,
+                 libraries=PREINSTALL_LIBRARIES, client=None):
+        self.interpreter_id = interpreter_id
+        self.session_timeout = session_timeout
+        self.libraries = libraries
+        self.client = client or boto3.client('bedrock-agentcore')
+
+    def start_session(self):
+        response = self.client.start_code_interpreter_session(
+            codeInterpreterIdentifier=self.interpreter_id,
+            name=f"s3InteractionSession-{uuid.uuid4().hex[:8]}",
+            sessionTimeoutSeconds=self.session_timeout
+        )
+        return response["sessionId"]
+
+    def warm_up(self, session_id):
+        if not self.libraries:
+            return
+        try:
+            self._invoke(session_id, "executeCommand", {"command": f"pip install {self.libraries}"})
+        except Exception as e:
+            print(e)
+
+    def execute(self, session_id, code):
+        return self._invoke(session_id, "executeCode", {"language": "python", "code": code})
+
+    def ping(self, session_id):
+        return self.execute(session_id, "print('ok')").strip() == 'ok'
+
+    def stop_session(self, session_id):
+        self.client.stop_code_interpreter_session(
+            codeInterpreterIdentifier=self.interpreter_id,
+            sessionId=session_id
+        )
+
+    def _invoke(self, session_id, name, arguments):
+        try:
+            response = self.client.invoke_code_interpreter(
+                codeInterpreterIdentifier=self.interpreter_id,
+                name=name,
+                sessionId=session_id,
+                arguments=arguments
+            )
+        except (EndpointConnectionError, ConnectTimeoutError) as e:
+            raise SessionUnavailable(str(e)) from e
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in SESSION_ERROR_CODES:
+                raise SessionUnavailable(str(e)) from e
+            raise
+        output = ""
+        for event in response["stream"]:
+            if "result" in event:
+                result = event["result"]
+                if "content" in result:
+                    for content_item in result["content"]:
+                        if content_item["type"] == "text":
+                            output = output + content_item["text"]
+        return output
+
+
+class InProcessInterpreterBackend:
+    """In-process stand-in for the remote interpreter, used offline and in tests.
+
+    Each session keeps its own globals like a remote session does. Output is the
+    captured stdout, or the traceback when the snippet raises.
+    """
+
+    _stdout_lock = threading.Lock()
+
+    def __init__(self, session_timeout=SESSION_TIMEOUT_SECONDS):
+        self.session_timeout = session_timeout
+        self._namespaces = {}
+
+    def start_session(self):
+        session_id = uuid.uuid4().hex
+        self._namespaces[session_id] = {"__name__": "__main__"}
+        return session_id
+
+    def warm_up(self, session_id):
+        pass
+
+    def execute(self, session_id, code):
+        namespace = self._namespaces.get(session_id)
+        if namespace is None:
+            raise SessionUnavailable(f'Unknown session {session_id}')
+        buffer = io.StringIO()
+        with self._stdout_lock, contextlib.redirect_stdout(buffer):
+            try:
+                exec(compile(code, "<code_execution_tool>", "exec"), namespace)
+            except Exception:
+                traceback.print_exc(file=buffer)
+        return buffer.getvalue()
+
+    def reset(self, session_id):
+        self._namespaces[session_id] = {"__name__": "__main__"}
+
+    def ping(self, session_id):
+        return session_id in self._namespaces
+
+    def stop_session(self, session_id):
+        self._namespaces.pop(session_id, None)
+
+
+class InterpreterSession:
+    def __init__(self, session_id, scope):
+        self.session_id = session_id
+        self.scope = scope
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.healthy = True
+        self.needs_reset = False
+        self.executions = 0
+
+
+class InterpreterSessionPool:
+    """Pool of warm interpreter sessions.
+
+    Sessions are started and warmed up (libraries installed) once, then reused
+    by later executions. A session is bound to the scope it was started in
+    (``None`` for the shared pool) and is only handed out to that scope again,
+    so one graph invocation never sees another's interpreter state. Backends
+    that can cheaply ``reset`` a session (the local ones) get their sessions
+    handed back to the shared pool with a clean namespace instead of stopped.
+    """
+
+    def __init__(self, backend, max_sessions=POOL_MAX_SESSIONS, idle_timeout=POOL_IDLE_TIMEOUT,
+                 max_session_age=None, health_check_interval=120.0, acquire_timeout=300.0,
+                 reap_interval=30.0):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        # Retire sessions well before the service-side timeout kills them mid-run
+        self.max_session_age = max_session_age or max(backend.session_timeout - 60, 1)
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle = []
+        self._busy = set()
+        self._starting = 0
+        self._closed = False
+        self.stats = {"started": 0, "reused": 0, "evicted": 0, "failed": 0}
+        if reap_interval:
+            reaper = threading.Thread(target=self._reap_forever, args=(reap_interval,), daemon=True)
+            reaper.start()
+
+    def warm(self, count, scope=None):
+        """Start and warm up ``count`` sessions ahead of the first execution."""
+        sessions = [self.acquire(scope) for _ in range(min(count, self.max_sessions))]
+        for session in sessions:
+            self.release(session)
+
+    def acquire(self, scope=None):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError('Code interpreter pool is closed')
+                to_stop = self._collect_expired_locked()
+                session = self._take_idle_locked(scope)
+                if session is None and self._size_locked() >= self.max_sessions:
+                    victim = self._oldest_idle_locked()
+                    if victim is not None:
+                        self._idle.remove(victim)
+                        to_stop.append(victim)
+                if session is not None or self._size_locked() < self.max_sessions:
+                    if session is None:
+                        self._starting += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError('Timed out waiting for a code interpreter session')
+                self._stop_all(to_stop, wait_lock=True)
+                self._cond.wait(remaining)
+        self._stop_all(to_stop)
+
+        if session is not None:
+            if self._needs_ping(session) and not self._ping(session):
+                self._discard(session)
+                return self.acquire(scope)
+            if session.needs_reset:
+                try:
+                    self.backend.reset(session.session_id)
+                except Exception:
+                    self._discard(session)
+                    return self.acquire(scope)
+                session.needs_reset = False
+                session.scope = scope
+            self._count("reused")
+            return session
+
+        try:
+            with span('interpreter', 'start_session', backend=type(self.backend).__name__):
+                session_id = self.backend.start_session()
+            session = InterpreterSession(session_id, scope)
+            # For the remote backend this is the pip install of PREINSTALL_LIBRARIES
+            with span('interpreter', 'warm_up', backend=type(self.backend).__name__):
+                self.backend.warm_up(session_id)
+        except Exception:
+            with self._cond:
+                self._starting -= 1
+                self._cond.notify()
+            if session is not None:
+                self._stop(session)
+            raise
+        with self._cond:
+            self._starting -= 1
+            self._busy.add(session)
+        self._count("started")
+        return session
+
+    def release(self, session, discard=False):
+        with self._cond:
+            self._busy.discard(session)
+            if discard or self._closed or not session.healthy:
+                stop = True
+            else:
+                stop = False
+                session.last_used = time.monotonic()
+                self._idle.append(session)
+            self._cond.notify()
+        if stop:
+            self._stop(session)
+
+    def run(self, code, scope=None):
+        """Execute ``code`` on a pooled session, retrying once on a fresh session if the first was unavailable."""
+        if scope is None:
+            scope = _current_scope.get()
+        for attempt in range(2):
+            with span('interpreter', 'acquire'):
+                session = self.acquire(scope)
+            try:
+                with span('interpreter', 'execute', backend=type(self.backend).__name__):
+                    output = self.backend.execute(session.session_id, code)
+            except CodeExecutionTimeout as e:
+                self._fail(session)
+                return f"Error: {e}"
+            except SessionUnavailable:
+                self._fail(session)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self._fail(session)
+                raise
+            session.executions += 1
+            self.release(session)
+            return output
+
+    def close_scope(self, scope):
+        """Stop every session bound to ``scope``; busy ones are stopped on release."""
+        with self._cond:
+            to_stop = [s for s in self._idle if s.scope == scope]
+            self._idle = [s for s in self._idle if s.scope != scope]
+            if self._resettable:
+                for session in to_stop:
+                    session.scope = None
+                    session.needs_reset = True
+                self._idle.extend(to_stop)
+                to_stop = []
+            for session in self._busy:
+                if session.scope == scope:
+                    session.healthy = False
+            self._cond.notify_all()
+        self._stop_all(to_stop)
+
+    def evict_idle(self):
+        with self._cond:
+            to_stop = self._collect_expired_locked()
+            if to_stop:
+                self._cond.notify_all()
+        self._stop_all(to_stop)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            to_stop, self._idle = self._idle, []
+            for session in self._busy:
+                session.healthy = False
+            self._cond.notify_all()
+        self._stop_all(to_stop)
+
+    def _size_locked(self):
+        return len(self._idle) + len(self._busy) + self._starting
+
+    @property
+    def _resettable(self):
+        return hasattr(self.backend, 'reset')
+
+    def _take_idle_locked(self, scope):
+        candidates = [s for s in self._idle if s.scope == scope]
+        rebind = not candidates and self._resettable
+        if rebind:
+            candidates = [s for s in self._idle if s.scope is None]
+        if not candidates:
+            return None
+        session = candidates[-1]
+        if rebind:
+            session.needs_reset = True
+        self._idle.remove(session)
+        self._busy.add(session)
+        return session
+
+    def _oldest_idle_locked(self):
+        if not self._idle:
+            return None
+        return min(self._idle, key=lambda s: s.last_used)
+
+    def _collect_expired_locked(self):
+        now = time.monotonic()
+        expired = [s for s in self._idle
+                   if not s.healthy
+                   or now - s.last_used > self.idle_timeout
+                   or now - s.created_at > self.max_session_age]
+        if expired:
+            self._idle = [s for s in self._idle if s not in expired]
+        return expired
+
+    def _needs_ping(self, session):
+        return time.monotonic() - session.last_used > self.health_check_interval
+
+    def _ping(self, session):
+        try:
+            return self.backend.ping(session.session_id)
+        except Exception:
+            return False
+
+    def _count(self, name):
+        with self._cond:
+            self.stats[name] += 1
+
+    def _fail(self, session):
+        session.healthy = False
+        self._count("failed")
+        self.release(session)
+
+    def _discard(self, session):
+        session.healthy = False
+        self.release(session)
+
+    def _stop_all(self, sessions, wait_lock=False):
+        if not sessions:
+            return
+        if wait_lock:
+            # Called with the condition held: stop in the background so waiters are not blocked
+            threading.Thread(target=self._stop_all, args=(sessions,), daemon=True).start()
+            return
+        for session in sessions:
+            self._stop(session)
+
+    def _stop(self, session):
+        self._count("evicted")
+        try:
+            self.backend.stop_session(session.session_id)
+        except Exception as e:
+            print(f'Failed to stop code interpreter session {session.session_id}: {e}')
+
+    def _reap_forever(self, interval):
+        while not self._closed:
+            time.sleep(interval)
+            self.evict_idle()
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def create_backend(name=CODE_INTERPRETER_BACKEND):
+    if name == 'remote':
+        return RemoteInterpreterBackend()
+    if name == 'local':
+        from aws_tools.local_executor import LocalProcessBackend
+        return LocalProcessBackend()
+    if name == 'inprocess':
+        return InProcessInterpreterBackend()
+    raise ValueError(f'Unknown code interpreter backend: {name}')
+
+
+def backend_for_agent(agent_name):
+    """Backend name for an agent, e.g. CODE_INTERPRETER_BACKEND_CHARTS=local."""
+    return os.getenv(f'CODE_INTERPRETER_BACKEND_{agent_name.upper()}', CODE_INTERPRETER_BACKEND)
+
+
+def get_interpreter_pool(backend_name=None):
+    backend_name = backend_name or CODE_INTERPRETER_BACKEND
+    pool = _pools.get(backend_name)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(backend_name)
+            if pool is None:
+                pool = _create_pool(backend_name)
+                _pools[backend_name] = pool
+    return pool
+
+
+def _create_pool(backend_name):
+    backend = create_backend(backend_name)
+    if backend_name == 'local':
+        workers = int(os.getenv('LOCAL_EXECUTOR_WORKERS', str(max(os.cpu_count() or 1, 2))))
+        pool = InterpreterSessionPool(backend, max_sessions=workers)
+        prewarm = int(os.getenv('LOCAL_EXECUTOR_PREWARM', '2'))
+        if prewarm:
+            threading.Thread(target=pool.warm, args=(prewarm,), daemon=True).start()
+    else:
+        pool = InterpreterSessionPool(backend)
+    atexit.register(pool.close)
+    return pool
+
+
+@contextlib.contextmanager
+def interpreter_scope(key=None):
+    """Bind code executions in this context to sessions owned by ``key``.
+
+    The sessions are stopped when the block exits. In ``shared`` mode this is a
+    no-op and executions use the shared pool.
+    """
+    if SESSION_SCOPE_MODE == 'shared':
+        yield None
+        return
+    key = key or uuid.uuid4().hex
+    token = _current_scope.set(key)
+    try:
+        yield key
+    finally:
+        _current_scope.reset(token)
+        close_interpreter_scope(key)
+
+
+def enter_interpreter_scope(key=None):
+    """Non-context-manager form of :func:`interpreter_scope` for async tasks; pair with close_interpreter_scope."""
+    if SESSION_SCOPE_MODE == 'shared':
+        return None
+    key = key or uuid.uuid4().hex
+    _current_scope.set(key)
+    return key
+
+
+def close_interpreter_scope(key):
+    if key is None:
+        return
+    for pool in list(_pools.values()):
+        pool.close_scope(key)
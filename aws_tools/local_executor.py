@@ -0,0 +1,207 @@
+import contextlib
+import io
+import os
+import signal
+import subprocess
+import sys
+import threading
+import traceback
+from multiprocessing.connection import Connection, Pipe
+
+from aws_tools.code_interpreter import CodeExecutionTimeout, SessionUnavailable
+
+LOCAL_EXECUTOR_CPU_SECONDS = int(os.getenv('LOCAL_EXECUTOR_CPU_SECONDS', '300'))
+LOCAL_EXECUTOR_MEMORY_MB = int(os.getenv('LOCAL_EXECUTOR_MEMORY_MB', '4096'))
+LOCAL_EXECUTOR_WALL_SECONDS = float(os.getenv('LOCAL_EXECUTOR_WALL_SECONDS', '600'))
+LOCAL_EXECUTOR_MAX_OUTPUT = int(os.getenv('LOCAL_EXECUTOR_MAX_OUTPUT', str(1024 * 1024)))
+PRELOAD_MODULES = ('boto3', 's3fs', 'polars', 'pyarrow', 'pyarrow.parquet', 'matplotlib.pyplot')
+# Workers run model-generated code, so they get only these variables of the host environment (plus the
+# LOCAL_EXECUTOR_* settings); name more in LOCAL_EXECUTOR_ENV, e.g. credentials for reading the lake
+WORKER_ENV_VARIABLES = ('PATH', 'HOME', 'TMPDIR', 'LANG', 'LC_ALL', 'TZ')
+LOCAL_EXECUTOR_ENV = tuple(filter(None, os.getenv('LOCAL_EXECUTOR_ENV', '').split(',')))
+
+
+class _CPUTimeExceeded(Exception):
+    pass
+
+
+def _raise_cpu_exceeded(signum, frame):
+    raise _CPUTimeExceeded('CPU time limit exceeded')
+
+
+def _fresh_namespace():
+    return {'__name__': '__main__'}
+
+
+def _worker_main(conn, memory_mb, preload_modules):
+    """Worker loop: import the heavy libraries once, then run snippets until told to stop."""
+    import resource
+
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    for module in preload_modules:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    signal.signal(signal.SIGXCPU, _raise_cpu_exceeded)
+
+    namespace = _fresh_namespace()
+    conn.send('ready')
+    while True:
+        try:
+            command, payload = conn.recv()
+        except EOFError:
+            return
+        if command == 'stop':
+            return
+        if command == 'reset':
+            namespace = _fresh_namespace()
+            conn.send('ok')
+            continue
+
+        code, cpu_seconds = payload
+        if cpu_seconds:
+            # RLIMIT_CPU counts the whole process lifetime, so grant this snippet its budget on top
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(usage.ru_utime + usage.ru_stime) + 1
+            resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_seconds, resource.RLIM_INFINITY))
+        buffer = io.StringIO()
+        with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+            try:
+                exec(compile(code, '<code_execution_tool>', 'exec'), namespace)
+            except _CPUTimeExceeded:
+                print(f'Error: CPU time limit of {cpu_seconds}s exceeded')
+            except MemoryError:
+                print(f'Error: memory limit of {memory_mb} MB exceeded')
+            except BaseException:
+                traceback.print_exc()
+        output = buffer.getvalue()
+        if len(output) > LOCAL_EXECUTOR_MAX_OUTPUT:
+            output = output[:LOCAL_EXECUTOR_MAX_OUTPUT] + '\n... output truncated'
+        conn.send(output)
+
+
+def _project_root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker_env(passthrough=LOCAL_EXECUTOR_ENV):
+    """Environment of a worker: an allowlist of the host's, never its AWS credentials or API keys by default."""
+    names = set(WORKER_ENV_VARIABLES) | set(passthrough)
+    env = {name: value for name, value in os.environ.items()
+           if name in names or name.startswith('LOCAL_EXECUTOR_')}
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [_project_root(), os.getenv('PYTHONPATH')]))
+    env['MPLBACKEND'] = 'Agg'
+    return env
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.lock = threading.Lock()
+
+
+class LocalProcessBackend:
+    """Runs code in local worker processes with the analytics libraries pre-imported.
+
+    Each session is one long-lived worker process, so the session pool's
+    warm-up pre-spawns workers and executions reuse them. Snippets are limited
+    in CPU time and memory inside the worker and in wall clock time by the
+    parent, which kills a worker that overruns. Output follows the remote
+    interpreter contract: captured stdout/stderr as text, tracebacks included.
+    """
+
+    def __init__(self, cpu_seconds=LOCAL_EXECUTOR_CPU_SECONDS, memory_mb=LOCAL_EXECUTOR_MEMORY_MB,
+                 wall_seconds=LOCAL_EXECUTOR_WALL_SECONDS, preload_modules=PRELOAD_MODULES,
+                 start_timeout=120.0):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.wall_seconds = wall_seconds
+        self.preload_modules = preload_modules
+        self.start_timeout = start_timeout
+        # Workers are recycled by the pool's max session age rather than a service-side timeout
+        self.session_timeout = int(os.getenv('LOCAL_EXECUTOR_MAX_WORKER_AGE', '3600'))
+        self._workers = {}
+
+    def start_session(self):
+        # A fresh interpreter rather than multiprocessing spawn/fork: spawn would re-import
+        # the app's __main__ and forking a process full of client threads is unsafe
+        parent_conn, child_conn = Pipe()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'aws_tools.local_executor', str(child_conn.fileno()),
+             str(self.memory_mb), ','.join(self.preload_modules)],
+            pass_fds=(child_conn.fileno(),), cwd=_project_root(), env=worker_env(), stdin=subprocess.DEVNULL
+        )
+        child_conn.close()
+        try:
+            ready = parent_conn.poll(self.start_timeout) and parent_conn.recv() == 'ready'
+        except EOFError:
+            ready = False
+        if not ready:
+            process.kill()
+            parent_conn.close()
+            raise RuntimeError('Local code worker did not start')
+        self._workers[str(process.pid)] = _Worker(process, parent_conn)
+        return str(process.pid)
+
+    def warm_up(self, session_id):
+        pass
+
+    def execute(self, session_id, code):
+        worker = self._workers.get(session_id)
+        if worker is None:
+            raise SessionUnavailable(f'Unknown local code worker {session_id}')
+        with worker.lock:
+            try:
+                worker.conn.send(('exec', (code, self.cpu_seconds)))
+            except (BrokenPipeError, OSError) as e:
+                # The worker was gone before it got the snippet
+                self._kill(session_id)
+                raise SessionUnavailable(f'Local code worker is gone: {e}') from e
+            if not worker.conn.poll(self.wall_seconds):
+                self._kill(session_id)
+                raise CodeExecutionTimeout(f'Execution exceeded the wall clock limit of {self.wall_seconds:.0f}s')
+            try:
+                return worker.conn.recv()
+            except EOFError:
+                self._kill(session_id)
+                raise RuntimeError('Local code worker exited unexpectedly (resource limit exceeded?)')
+
+    def reset(self, session_id):
+        worker = self._workers[session_id]
+        with worker.lock:
+            worker.conn.send(('reset', None))
+            worker.conn.recv()
+
+    def ping(self, session_id):
+        worker = self._workers.get(session_id)
+        return worker is not None and worker.process.poll() is None
+
+    def stop_session(self, session_id):
+        worker = self._workers.pop(session_id, None)
+        if worker is None:
+            return
+        try:
+            worker.conn.send(('stop', None))
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            worker.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            worker.process.kill()
+        worker.conn.close()
+
+    def _kill(self, session_id):
+        worker = self._workers.pop(session_id, None)
+        if worker is not None:
+            worker.process.kill()
+            worker.process.wait(timeout=5)
+            worker.conn.close()
+
+
+if __name__ == '__main__':
+    _worker_main(Connection(int(sys.argv[1])), int(sys.argv[2]), tuple(filter(None, sys.argv[3].split(','))))
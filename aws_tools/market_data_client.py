@@ -0,0 +1,138 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from aws_runtime.instrumentation import span
+
+MARKET_API_BASE_URL = os.getenv('MARKET_API_BASE_URL', 'https://api.rrllgo.com')
+MARKET_API_CONNECT_TIMEOUT = float(os.getenv('MARKET_API_CONNECT_TIMEOUT', '3.05'))
+MARKET_API_READ_TIMEOUT = float(os.getenv('MARKET_API_READ_TIMEOUT', '15'))
+MARKET_API_MAX_RETRIES = int(os.getenv('MARKET_API_MAX_RETRIES', '3'))
+MARKET_API_MAX_CONCURRENCY = int(os.getenv('MARKET_API_MAX_CONCURRENCY', '8'))
+MARKET_API_BACKOFF_BASE = float(os.getenv('MARKET_API_BACKOFF_BASE', '0.5'))
+MARKET_API_BACKOFF_CAP = float(os.getenv('MARKET_API_BACKOFF_CAP', '8'))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _endpoint(path):
+    return path.strip('/').split('/')[0] or '/'
+
+
+class MarketDataError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def backoff_delay(attempt, retry_after=None, base=MARKET_API_BACKOFF_BASE, cap=MARKET_API_BACKOFF_CAP):
+    """Full-jitter exponential backoff, honouring a Retry-After header when given."""
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _api_key():
+    return os.getenv('MARKET_API_KEY', 'default-api-key')
+
+
+class MarketDataClient:
+    """Blocking client for the market API on a pooled keep-alive session."""
+
+    def __init__(self, base_url=MARKET_API_BASE_URL, api_key=None,
+                 connect_timeout=MARKET_API_CONNECT_TIMEOUT, read_timeout=MARKET_API_READ_TIMEOUT,
+                 max_retries=MARKET_API_MAX_RETRIES, max_concurrency=MARKET_API_MAX_CONCURRENCY):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['X-API-KEY'] = api_key or _api_key()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def attempt(self, path):
+        """One GET of ``path``: (json, None, None) on success, (None, error, Retry-After) when worth retrying.
+
+        Errors that are not worth retrying (4xx other than 429) are raised.
+        """
+        try:
+            with self._slots:
+                response = self.session.get(f'{self.base_url}{path}', timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            return None, MarketDataError(f'GET {path} failed: {e}'), None
+        if response.ok:
+            return response.json(), None, None
+        error = MarketDataError(f'GET {path} returned HTTP {response.status_code}', response.status_code)
+        if response.status_code not in RETRY_STATUS_CODES:
+            raise error
+        return None, error, response.headers.get('Retry-After')
+
+    def get_json(self, path):
+        with span('http', _endpoint(path)) as values:
+            for attempt in range(self.max_retries + 1):
+                values['attempts'] = attempt + 1
+                result, error, retry_after = self.attempt(path)
+                if error is None:
+                    return result
+                if attempt < self.max_retries:
+                    time.sleep(backoff_delay(attempt, retry_after))
+            raise error
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncMarketDataClient:
+    """asyncio variant of :class:`MarketDataClient` for code running on an event loop.
+
+    Each attempt runs on a worker thread over the blocking client's pooled
+    session, so both variants share one set of keep-alive connections and one
+    concurrency limit; backoff waits are ``asyncio.sleep`` and hold no thread.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or get_market_client()
+
+    async def get_json(self, path):
+        with span('http', _endpoint(path)) as values:
+            for attempt in range(self.client.max_retries + 1):
+                values['attempts'] = attempt + 1
+                result, error, retry_after = await asyncio.to_thread(self.client.attempt, path)
+                if error is None:
+                    return result
+                if attempt < self.client.max_retries:
+                    await asyncio.sleep(backoff_delay(attempt, retry_after))
+            raise error
+
+    async def get_many(self, paths):
+        """Fetch several paths concurrently; failures are returned in place of results."""
+        return await asyncio.gather(*(self.get_json(path) for path in paths), return_exceptions=True)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_market_client():
+    """Process-wide :class:`MarketDataClient`, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MarketDataClient()
+    return _client
+
+
+def get_async_market_client():
+    """:class:`AsyncMarketDataClient` over the process-wide client."""
+    return AsyncMarketDataClient(get_market_client())
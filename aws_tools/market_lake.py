@@ -0,0 +1,348 @@
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+
+import fsspec
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MARKET_LAKE_URI = os.getenv('MARKET_LAKE_URI', 's3://alpaca-market-data')
+MARKET_LAKE_CACHE_DIR = os.getenv('MARKET_LAKE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'market-lake-cache'))
+MARKET_LAKE_CACHE_MAX_BYTES = int(os.getenv('MARKET_LAKE_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+MARKET_LAKE_LISTING_TTL = float(os.getenv('MARKET_LAKE_LISTING_TTL', '900'))
+# Written by aws_jobs.compact_market_data, e.g. s3://alpaca-market-data/sorted/_index.json
+MARKET_LAKE_INDEX_URI = os.getenv('MARKET_LAKE_INDEX_URI')
+
+COLUMNS = ['Date', 'Close', 'High', 'Low', 'Open', 'Volume', 'year', 'symbol']
+OHLCV_SCHEMA = {'Date': pl.Datetime('ns'), 'Close': pl.Float64, 'High': pl.Float64, 'Low': pl.Float64,
+                'Open': pl.Float64, 'Volume': pl.Int64, 'year': pl.Int32, 'symbol': pl.String}
+_YEAR_PARTITION = re.compile(r'year=(\d{4})$')
+
+
+def _to_date(value):
+    if value is None or isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+class RowGroupCache:
+    """Size-bounded local disk cache of parquet row groups, evicting least recently used first."""
+
+    def __init__(self, directory=MARKET_LAKE_CACHE_DIR, max_bytes=MARKET_LAKE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith('.parquet'))
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.parquet')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            table = pq.read_table(path)
+        except (FileNotFoundError, pa.ArrowInvalid):
+            self.stats['misses'] += 1
+            return None
+        os.utime(path)
+        self.stats['hits'] += 1
+        return table
+
+    def put(self, key, table):
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        pq.write_table(table, tmp_path)
+        size = os.path.getsize(tmp_path)
+        if size > self.max_bytes:
+            os.remove(tmp_path)
+            return
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict_locked()
+
+    def _evict_locked(self):
+        entries = sorted((e for e in os.scandir(self.directory) if e.name.endswith('.parquet')),
+                         key=lambda e: e.stat().st_mtime)
+        for entry in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self.stats['evictions'] += 1
+
+
+class MarketLakeIndex:
+    """Maps each symbol to the files and row-group ranges holding its rows in the sorted layout.
+
+    ``symbols`` entries are ``[file, first_row_group, last_row_group, min_date, max_date]``
+    with ``file`` relative to the index's directory.
+    """
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.generation = data.get('generation')
+        self.max_date = data.get('max_date')
+        self.row_group_size = data.get('row_group_size')
+        self.files = data.get('files', {})
+        self.symbols = data.get('symbols', {})
+
+    @classmethod
+    def load(cls, fs, path):
+        try:
+            with fs.open(path, 'r') as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def save(self, fs, path):
+        with fs.open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    def to_dict(self):
+        return {'generation': self.generation, 'max_date': self.max_date, 'row_group_size': self.row_group_size,
+                'files': self.files, 'symbols': self.symbols}
+
+    def add_file(self, path, frame, row_group_size):
+        """Record ``frame`` (sorted by symbol, Date) as written to ``path`` with ``row_group_size`` rows per group."""
+        spans = (frame.with_row_index('row')
+                 .group_by('symbol', maintain_order=True)
+                 .agg(pl.col('row').min().alias('first'), pl.col('row').max().alias('last'),
+                      pl.col('Date').min().alias('min_date'), pl.col('Date').max().alias('max_date')))
+        for symbol, first, last, min_date, max_date in spans.iter_rows():
+            self.symbols.setdefault(symbol, []).append(
+                [path, first // row_group_size, last // row_group_size, str(min_date)[:10], str(max_date)[:10]])
+        self.files[path] = {'rows': frame.height, 'row_groups': math.ceil(frame.height / row_group_size)}
+        if frame.height:
+            last_date = str(frame['Date'].max())[:10]
+            if self.max_date is None or last_date > self.max_date:
+                self.max_date = last_date
+
+    def lookup(self, symbols, start_date=None, end_date=None):
+        """``{file: [row group indices]}`` covering ``symbols`` in the date range."""
+        start, end = start_date and start_date.isoformat(), end_date and end_date.isoformat()
+        selected = {}
+        for symbol in symbols:
+            for path, first, last, min_date, max_date in self.symbols.get(symbol, []):
+                if start and max_date < start or end and min_date > end:
+                    continue
+                selected.setdefault(path, set()).update(range(first, last + 1))
+        return {path: sorted(indices) for path, indices in selected.items()}
+
+
+class MarketLakeReader:
+    """Reads daily OHLCV rows from the year-partitioned parquet lake.
+
+    Only ``year=`` partitions overlapping the date range are listed, and only
+    row groups whose ``symbol``/``Date`` statistics can contain matching rows
+    are fetched. Fetched row groups are kept in a :class:`RowGroupCache`, and
+    the remaining predicates and the column projection run as a polars lazy
+    query. Works with any fsspec filesystem, e.g. a local directory in tests.
+
+    When a :class:`MarketLakeIndex` is configured, rows up to the index's last
+    date are read from the symbol-sorted layout instead, touching only the row
+    groups listed for the requested symbols; later dates still come from the
+    year partitions. Other datasets laid out the same way (year partitions,
+    ``symbol``/``Date`` columns) can be read by passing their ``schema``.
+    """
+
+    def __init__(self, root=MARKET_LAKE_URI, filesystem=None, cache=None, listing_ttl=MARKET_LAKE_LISTING_TTL,
+                 index_uri=MARKET_LAKE_INDEX_URI, index_filesystem=None, schema=None):
+        if filesystem is None:
+            filesystem, root = fsspec.core.url_to_fs(root)
+        self.fs = filesystem
+        self.root = root.rstrip('/')
+        self.schema = schema or OHLCV_SCHEMA
+        self.index_fs = self.index_path = None
+        if index_uri:
+            if index_filesystem is None:
+                index_filesystem, index_uri = fsspec.core.url_to_fs(index_uri)
+            self.index_fs, self.index_path = index_filesystem, index_uri
+        self._index = None
+        self.cache = cache if cache is not None else RowGroupCache()
+        self.listing_ttl = listing_ttl
+        self._listings = {}
+        self._metadata = {}
+        self._lock = threading.Lock()
+        self.stats = {'files': 0, 'row_groups': 0, 'row_groups_pruned': 0}
+
+    def read(self, symbols, start_date=None, end_date=None, columns=None):
+        """Rows for ``symbols`` between ``start_date`` and ``end_date`` (inclusive) as a polars DataFrame."""
+        symbols = sorted({s.strip().upper() for s in symbols})
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        columns = self._columns(columns)
+
+        tables = []
+        partition_start = start_date
+        index = self.index()
+        if index is not None and index.max_date:
+            for path, row_groups in index.lookup(symbols, start_date, end_date).items():
+                full_path = f'{os.path.dirname(self.index_path)}/{path}'
+                self.stats['files'] += 1
+                self.stats['row_groups'] += len(row_groups)
+                tables.extend(self._read_row_groups(self.index_fs, full_path, index.generation, row_groups))
+            indexed_until = datetime.date.fromisoformat(index.max_date)
+            partition_start = max(start_date, indexed_until) if start_date else indexed_until
+            partition_start += datetime.timedelta(days=1)
+        if end_date is None or partition_start is None or partition_start <= end_date:
+            for year in self.years(partition_start, end_date):
+                for path in self.files(year):
+                    tables.extend(self._read_file(path, symbols, partition_start, end_date))
+        if not tables:
+            return pl.DataFrame(schema={c: self.schema[c] for c in columns})
+
+        frame = pl.from_arrow(pa.concat_tables(tables, promote_options='default')).lazy()
+        frame = frame.filter(pl.col('symbol').is_in(symbols))
+        if start_date:
+            frame = frame.filter(pl.col('Date').dt.date() >= start_date)
+        if end_date:
+            frame = frame.filter(pl.col('Date').dt.date() <= end_date)
+        return frame.select(columns).sort(['symbol', 'Date']).collect()
+
+    def index(self):
+        """The sorted-layout index, reloaded at most every ``listing_ttl`` seconds."""
+        if self.index_path is None:
+            return None
+        if self._index is None or time.monotonic() - self._index[1] >= self.listing_ttl:
+            self._index = (MarketLakeIndex.load(self.index_fs, self.index_path), time.monotonic())
+        return self._index[0]
+
+    def years(self, start_date=None, end_date=None):
+        years = []
+        for path in self._list(self.root, dirs=True):
+            match = _YEAR_PARTITION.search(path.rstrip('/'))
+            if not match:
+                continue
+            year = int(match.group(1))
+            if start_date and year < start_date.year or end_date and year > end_date.year:
+                continue
+            years.append(year)
+        return sorted(years)
+
+    def files(self, year):
+        return sorted(p for p in self._list(f'{self.root}/year={year}') if p.endswith('.parquet'))
+
+    def row_groups(self, path, symbols, start_date=None, end_date=None):
+        """Indices of the row groups in ``path`` that may hold matching rows, judged by their statistics."""
+        metadata = self._file_metadata(path)[0]
+        names = metadata.schema.names
+        symbol_idx = names.index('symbol') if 'symbol' in names else None
+        date_idx = names.index('Date') if 'Date' in names else None
+        selected = []
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            if symbol_idx is not None:
+                low, high = _min_max(row_group.column(symbol_idx))
+                if low is not None and not any(low <= s <= high for s in symbols):
+                    continue
+            if date_idx is not None:
+                low, high = _min_max(row_group.column(date_idx))
+                if low is not None and (start_date and _to_date(high) < start_date
+                                        or end_date and _to_date(low) > end_date):
+                    continue
+            selected.append(i)
+        return selected
+
+    def _read_file(self, path, symbols, start_date, end_date):
+        metadata, version = self._file_metadata(path)
+        selected = self.row_groups(path, symbols, start_date, end_date)
+        self.stats['files'] += 1
+        self.stats['row_groups'] += len(selected)
+        self.stats['row_groups_pruned'] += metadata.num_row_groups - len(selected)
+        return self._read_row_groups(self.fs, path, version, selected)
+
+    def _read_row_groups(self, fs, path, version, indices):
+        tables = []
+        missing = []
+        for i in indices:
+            key = hashlib.sha1(f'{path}|{version}|{i}'.encode()).hexdigest()
+            table = self.cache.get(key)
+            if table is None:
+                missing.append((i, key))
+            tables.append(table)
+        if missing:
+            with fs.open(path, 'rb') as f:
+                parquet_file = pq.ParquetFile(f)
+                for i, key in missing:
+                    table = parquet_file.read_row_group(i)
+                    self.cache.put(key, table)
+                    tables[indices.index(i)] = table
+        return tables
+
+    def _file_metadata(self, path):
+        cached = self._metadata.get(path)
+        if cached is not None and time.monotonic() - cached[2] < self.listing_ttl:
+            return cached[0], cached[1]
+        info = self.fs.info(path)
+        version = info.get('ETag') or info.get('mtime') or info.get('LastModified') or info.get('size')
+        if cached is not None and cached[1] == version:
+            metadata = cached[0]
+        else:
+            with self.fs.open(path, 'rb') as f:
+                metadata = pq.ParquetFile(f).metadata
+        with self._lock:
+            self._metadata[path] = (metadata, version, time.monotonic())
+        return metadata, version
+
+    def _list(self, path, dirs=False):
+        cached = self._listings.get(path)
+        if cached is not None and time.monotonic() - cached[1] < self.listing_ttl:
+            return cached[0]
+        try:
+            entries = self.fs.ls(path, detail=True)
+        except FileNotFoundError:
+            entries = []
+        names = [e['name'] for e in entries if (e['type'] == 'directory') == dirs]
+        with self._lock:
+            self._listings[path] = (names, time.monotonic())
+        return names
+
+    def _columns(self, columns):
+        if not columns:
+            return list(self.schema)
+        unknown = [c for c in columns if c not in self.schema]
+        if unknown:
+            raise ValueError(f'Unknown columns {unknown}; available columns are {list(self.schema)}')
+        return ['symbol', 'Date'] + [c for c in columns if c not in ('symbol', 'Date')]
+
+
+def _min_max(column_chunk):
+    stats = column_chunk.statistics
+    if stats is None or not stats.has_min_max:
+        return None, None
+    low, high = stats.min, stats.max
+    if isinstance(low, bytes):
+        low, high = low.decode(), high.decode()
+    return low, high
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_market_lake():
+    """Process-wide :class:`MarketLakeReader` over ``MARKET_LAKE_URI``."""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                _reader = MarketLakeReader()
+    return _reader
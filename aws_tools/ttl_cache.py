@@ -0,0 +1,162 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SQLiteCacheTier:
+    """Shared on-disk tier so several workers/containers on one host reuse responses."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS cache '
+                               '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0], row[1] - time.time()
+
+    def set(self, key, text, ttl):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                               (key, text, time.time() + ttl))
+
+    def prune(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM cache')
+
+
+class TTLCache:
+    """In-process cache for JSON-serialisable values.
+
+    Entries expire after a per-call TTL and the least recently used ones are
+    evicted once the serialised size exceeds ``max_bytes``. Concurrent misses
+    for the same key are coalesced: one caller runs the loader and the others
+    wait for its result. An optional :class:`SQLiteCacheTier` sits behind the
+    memory tier.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_tier=None):
+        self.max_bytes = max_bytes
+        self.disk_tier = disk_tier
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'disk_hits': 0, 'evictions': 0, 'load_errors': 0}
+
+    def get_or_load(self, key, loader, ttl):
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self._stats['hits'] += 1
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = self._load(key, loader, ttl)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._stats['load_errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.disk_tier is not None:
+            self.disk_tier.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), bytes=self._size)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = round((stats['hits'] + stats['coalesced']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _load(self, key, loader, ttl):
+        if self.disk_tier is not None:
+            cached = self.disk_tier.get(key)
+            if cached is not None:
+                text, remaining = cached
+                value = json.loads(text)
+                self._store(key, value, len(text), remaining)
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                return value
+        value = loader()
+        text = json.dumps(value)
+        self._store(key, value, len(text), ttl)
+        if self.disk_tier is not None:
+            self.disk_tier.set(key, text, ttl)
+        return value
+
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, size = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._size -= size
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value, size, ttl):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[2]
+            self._entries[key] = (time.monotonic() + ttl, value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self._stats['evictions'] += 1
@@ -4,18 +4,23 @@ from dotenv import load_dotenv
 # Load environment variables from .env and secrets.env
 load_dotenv()  # Load .env first
 load_dotenv('secrets.env')  # Load secrets.env (overrides .env if conflicts)
-from strands.multiagent import Swarm, GraphBuilder
-from strands import Agent, tool
-from strands_tools import calculator  # Import the calculator tool
-import argparse
-import json
+import asyncio
+import time
 from bedrock_agentcore.runtime import BedrockAgentCoreApp
-import requests
+from bedrock_agentcore.runtime.utils import convert_complex_objects
 from starlette.middleware.cors import CORSMiddleware
-import boto3
-from datetime import datetime
-from aws_agents.all_agents import financial_analyst_agent, coding_agent, chart_agent, final_response_agent, market_data_agent, planner_agent, critic_agent
-import time
+from starlette.responses import JSONResponse
+from aws_tools.code_interpreter import close_interpreter_scope, enter_interpreter_scope
+from aws_tools.all_tools import market_cache
+from aws_runtime.result_cache import get_result_cache
+from aws_runtime.router import GRAPH, DIRECT, answer_direct, answer_fast, route_request
+from aws_runtime.scheduler import SchedulerBusy, get_scheduler
+from aws_runtime.streaming import normalize_event, stream_agent, stream_cached, stream_graph
+from aws_runtime.instrumentation import bind_trace, finish_request_trace, span, start_request_trace
+from aws_runtime.prewarm import start_prewarm
+from aws_agents.all_agents import create_quick_answer_agent
+# The research graph (strands.multiagent) and the job runner are imported on first use or by the pre-warm,
+# so the runtime answers its health check sooner after a cold start
 
 
 app = BedrockAgentCoreApp(debug=True)
@@ -28,42 +33,191 @@ app.add_middleware(
 )
 
 
-swarm = Swarm(
-    [financial_analyst_agent, coding_agent, chart_agent, market_data_agent, critic_agent],
-    max_handoffs=30,
-    max_iterations=90,
-    execution_timeout=7200.0,  # 15 minutes
-    node_timeout=1800.0,       # 5 minutes per agent
-    repetitive_handoff_detection_window=10,  # There must be >= 3 unique agents in the last 8 handoffs
-    repetitive_handoff_min_unique_agents=5
-)
+def remember_result(prompt, result):
+    """Store a completed graph or agent result in the result cache, keyed by the prompt as the user sent it."""
+    cache = get_result_cache()
+    if cache is None:
+        return
+    if hasattr(result, "results"):
+        output = result.results.get("output")
+        if output is None or getattr(result.status, "value", None) != "completed":
+            return
+        result = output.result
+    cache.store_result(prompt, {"response": convert_complex_objects(result), "html": str(result)})
 
-builder = GraphBuilder()
-builder.add_node(planner_agent, "planner")
-builder.add_node(swarm, "research")
-builder.add_node(final_response_agent, "output")
-builder.add_edge("planner", "research")
-builder.add_edge("research", "output")
 
+def timed_route(prompt):
+    with span("router", "classify") as values:
+        route = route_request(prompt)
+        values.update(route=route.kind, tier=route.tier)
+    return route
 
-graph = builder.build()
 
-@app.entrypoint
-def strands_agent_bedrock(payload):
-    """
-    Invoke the agent with a payload
-    """
-    user_input = payload.get("prompt") or payload.get("message")
-    today_date = time.ctime()
-    user_input = user_input + f"\n###For clarification today date is: {today_date}"
+def timed_lookup(cache, prompt):
+    with span("cache", "lookup") as values:
+        cached = cache.lookup(prompt)
+        values["hits"] = int(cached is not None)
+    return cached
+
 
-    result = graph(user_input)
+async def answer(prompt, user_input, route, on_result, research_mode=None, request_trace=None):
+    if route is not None and route.kind != GRAPH:
+        print("Fast path:", route)
+        result = await answer_fast(route, prompt, user_input)
+        if on_result is not None:
+            await asyncio.to_thread(on_result, result)
+        return result
+
+    from aws_runtime.graph_factory import prepare_research_graph
+
+    scope = enter_interpreter_scope()
+    try:
+        graph, plan = await prepare_research_graph(user_input, research_mode)
+        if plan is not None:
+            print("Research plan:", [(t.id, t.agent, t.depends_on) for t in plan.tasks])
+        result = None
+        async for event in graph.stream_async(user_input):
+            if request_trace is not None:
+                for normalized in normalize_event(event, token_nodes=()):
+                    request_trace.observe(normalized)
+            if event.get("type") == "multiagent_result":
+                result = event["result"]
+    finally:
+        await asyncio.to_thread(close_interpreter_scope, scope)
     from pprint import pprint
     print("--------------------- RESPONSE -------------------")
     pprint(result)
+    print("Market data cache:", market_cache.stats())
     print("--------------------- END RESPONSE -------------------")
-    return result.results["output"].result
+    if result is None:
+        return JSONResponse({"error": "The research graph ended without a result"}, status_code=502)
+    if on_result is not None:
+        await asyncio.to_thread(on_result, result)
+    output = result.results.get("output")
+    if output is None:
+        # Cancelled, timed out or the research swarm failed before the output agent ran
+        status = getattr(result.status, "value", str(result.status))
+        return JSONResponse({"error": f"The research graph ended without an answer (status: {status})"},
+                            status_code=502)
+    return output.result
+
+
+async def stream_answer(prompt, user_input, route, on_result, research_mode=None):
+    if route is not None and route.kind != GRAPH:
+        print("Fast path:", route)
+        direct = await asyncio.to_thread(answer_direct, route, prompt) if route.kind == DIRECT else None
+        if direct is None:
+            stream = stream_agent(create_quick_answer_agent(), user_input, on_result=on_result)
+        else:
+            if on_result is not None:
+                await asyncio.to_thread(on_result, direct)
+            stream = stream_cached(str(direct), route=route.kind)
+    else:
+        from aws_runtime.graph_factory import prepare_research_graph
+
+        graph, plan = await prepare_research_graph(user_input, research_mode)
+        if plan is not None:
+            yield {"type": "plan", "summary": plan.summary, "tasks": [t.model_dump() for t in plan.tasks]}
+        stream = stream_graph(graph, user_input, on_result=on_result)
+    async for event in stream:
+        yield event
+
+
+async def traced(stream, request_trace):
+    """Feed stream events into the request trace and finish it when the stream ends."""
+    bind_trace(request_trace)
+    status = "failed"
+    try:
+        async for event in stream:
+            request_trace.observe(event)
+            yield event
+        status = "completed"
+    finally:
+        finish_request_trace(request_trace, status=status)
+
+
+def with_date(prompt):
+    return prompt + f"\n###For clarification today date is: {time.ctime()}"
+
+
+async def job_request(payload):
+    """Submit a research job ("job": true) or check on one ("job_id" and "action": status, result or resume)."""
+    from aws_runtime.jobs import JobNotFound, get_job_runner
+
+    runner = get_job_runner(app=app, on_result=remember_result)
+    await runner.recover()
+    job_id = payload.get("job_id")
+    try:
+        if job_id is None:
+            prompt = payload.get("prompt") or payload.get("message")
+            cache = None if payload.get("no_cache") else get_result_cache()
+            cached = await asyncio.to_thread(timed_lookup, cache, prompt) if cache is not None else None
+            return await runner.submit(prompt, with_date(prompt), payload.get("research_mode"),
+                                       result_html=cached["html"] if cached is not None else None)
+        action = payload.get("action", "status")
+        if action == "resume":
+            return await runner.resume(job_id, force=bool(payload.get("force")))
+        if action == "result":
+            return await asyncio.to_thread(runner.result, job_id)
+        return await asyncio.to_thread(runner.status, job_id)
+    except JobNotFound:
+        return JSONResponse({"error": f"Unknown job {job_id}"}, status_code=404)
+
+
+@app.entrypoint
+async def strands_agent_bedrock(payload):
+    """
+    Invoke the agent with a payload. With "stream": true the progress events and the
+    final HTML tokens are streamed back as server-sent events instead of one response.
+    Answers are reused from the result cache unless the payload sets "no_cache". Simple lookups
+    skip the planner and swarm (see aws_runtime.router) unless the payload sets "full_graph".
+    Every request gets its own agents; the scheduler caps how many run at once.
+    Each request's stage timings, tokens and cost are printed as a JSON trace (see aws_runtime.instrumentation).
+    With "job": true the research runs in the background as a resumable job (see aws_runtime.jobs) and the
+    response is its id and status; poll with "job_id" and "action": "status" or "result".
+    """
+    if payload.get("job") or payload.get("job_id"):
+        return await job_request(payload)
+    prompt = payload.get("prompt") or payload.get("message")
+    user_input = with_date(prompt)
+    request_trace = start_request_trace(stream=bool(payload.get("stream")))
+    status = "failed"
+    try:
+        cache = None if payload.get("no_cache") else get_result_cache()
+        cached = await asyncio.to_thread(timed_lookup, cache, prompt) if cache is not None else None
+        if cached is not None:
+            print("Result cache hit:", cache.stats())
+            status = "cached"
+            return stream_cached(cached["html"], cached=True) if payload.get("stream") else cached["response"]
+        on_result = (lambda result: remember_result(prompt, result)) if cache is not None else None
+
+        scheduler = get_scheduler()
+        try:
+            slot = await scheduler.acquire()
+        except SchedulerBusy as e:
+            print("Rejected:", e, scheduler.stats())
+            status = "rejected"
+            return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": str(e.retry_after)})
+        try:
+            route = await asyncio.to_thread(timed_route, prompt) if not payload.get("full_graph") else None
+            request_trace.attributes["route"] = route.kind if route is not None else GRAPH
+            if payload.get("stream"):
+                stream = scheduler.hold(slot, stream_answer(prompt, user_input, route, on_result,
+                                                            payload.get("research_mode")))
+                slot = None
+                status = None
+                return traced(stream, request_trace)
+            result = await answer(prompt, user_input, route, on_result, payload.get("research_mode"), request_trace)
+            status = "failed" if isinstance(result, JSONResponse) else "completed"
+            return result
+        finally:
+            if slot is not None:
+                slot.release()
+    finally:
+        if status is not None:
+            finish_request_trace(request_trace, status=status)
 
 
 if __name__ == "__main__":
+    start_prewarm()
     app.run()
@@ -0,0 +1,22 @@
+import json
+
+from aws_tools import all_tools
+
+
+def test_one_failed_symbol_does_not_fail_the_batch(monkeypatch):
+    def fetch(endpoint, symbol, failure_message):
+        if symbol == 'NOPE':
+            raise Exception(f'{failure_message}: HTTP 404')
+        return {'symbol': symbol, 'rsi': 55}
+
+    monkeypatch.setattr(all_tools, '_fetch_json', fetch)
+    result = json.loads(all_tools.get_technical_analysis_for_stocks(['aapl', 'NOPE', ' msft', 'AAPL']))
+    assert result['symbols'] == ['AAPL', 'NOPE', 'MSFT']
+    assert result['results'] == {'AAPL': {'symbol': 'AAPL', 'rsi': 55}, 'MSFT': {'symbol': 'MSFT', 'rsi': 55}}
+    assert result['errors'] == {'NOPE': 'Failed to fetch technical analysis for NOPE: HTTP 404'}
+
+
+def test_symbols_may_be_a_comma_separated_string(monkeypatch):
+    monkeypatch.setattr(all_tools, '_fetch_json', lambda endpoint, symbol, message: {'endpoint': endpoint})
+    result = json.loads(all_tools.get_news_for_stocks('AAPL; msft,'))
+    assert result['symbols'] == ['AAPL', 'MSFT'] and not result['errors']
@@ -0,0 +1,65 @@
+import datetime
+
+import polars as pl
+import pytest
+
+from aws_tools.backtest import BacktestError, metrics, run_backtest, run_sweep
+
+
+def _frame(closes):
+    """Daily rows from {symbol: [close, ...]} on consecutive weekdays from 2024-01-01."""
+    dates = [datetime.datetime(2024, 1, 1) + datetime.timedelta(days=d) for d in range(400)]
+    dates = [date for date in dates if date.weekday() < 5]
+    return pl.DataFrame([{'symbol': symbol, 'Date': date, 'Close': close, 'Volume': 1000.0}
+                         for symbol, values in closes.items() for date, close in zip(dates, values)]
+                        ).sort(['symbol', 'Date'])
+
+
+def test_metrics_of_a_steady_return():
+    values = metrics(pl.Series([0.001] * 252))
+    assert values['days'] == 252
+    assert values['total_return'] == pytest.approx(1.001 ** 252 - 1, abs=1e-4)
+    assert values['cagr'] == values['total_return']
+    assert values['max_drawdown'] == 0
+    assert values['hit_rate'] == 1
+    # No volatility, so no risk-adjusted ratios
+    assert values['sharpe'] is None and values['calmar'] is None
+
+
+def test_buy_and_hold_return_drawdown_and_cost():
+    frame = _frame({'AAA': [100.0, 120.0, 90.0, 110.0]})
+    result = run_backtest(frame, 'buy_and_hold', cost_bps=0)
+    assert result['metrics']['total_return'] == pytest.approx(0.1)
+    assert result['metrics']['max_drawdown'] == pytest.approx(90 / 120 - 1)
+    assert result['benchmark']['total_return'] == pytest.approx(0.1)
+    # Buying on the first close pays the cost once
+    costly = run_backtest(frame, 'buy_and_hold', cost_bps=10)
+    assert costly['metrics']['total_return'] == pytest.approx(0.999 * 1.1 - 1, abs=1e-4)
+
+
+def test_positions_earn_from_the_next_day():
+    # The signal turns on at the close of the jump day, so the strategy must not earn the jump itself
+    closes = [100.0] * 30 + [200.0] * 10
+    result = run_backtest(_frame({'AAA': closes}), 'momentum', {'lookback': 5}, cost_bps=0)
+    assert result['metrics']['total_return'] == 0
+    assert result['by_symbol'][0]['buy_and_hold_return'] == pytest.approx(1.0)
+
+
+def test_benchmark_is_not_rebalanced():
+    # Rebalanced daily these would gain 25% twice; held, each ends where it started
+    result = run_backtest(_frame({'AAA': [1.0, 2.0, 1.0], 'BBB': [1.0, 0.5, 1.0]}), 'buy_and_hold', cost_bps=0)
+    assert result['benchmark']['total_return'] == pytest.approx(0)
+    assert result['metrics']['total_return'] == pytest.approx(1.25 * 1.25 - 1)
+
+
+def test_sweep_ranks_by_sharpe():
+    closes = [100 * (1 + 0.01 * ((day % 7) - 3)) * (1.002 ** day) for day in range(280)]
+    ranked = run_sweep(_frame({'AAA': closes, 'BBB': closes[::-1]}), 'sma_crossover',
+                       {'fast': [5, 10, 50], 'slow': [20, 40]}, cost_bps=0)
+    # fast=50 is not below either slow window, so it is skipped
+    assert sorted((item['params']['fast'], item['params']['slow']) for item in ranked) == [(5, 20), (5, 40), (10, 20),
+                                                                                             (10, 40)]
+    sharpes = [item['metrics']['sharpe'] for item in ranked]
+    assert sharpes == sorted(sharpes, reverse=True)
+    with pytest.raises(BacktestError):
+        run_sweep(_frame({'AAA': closes}), 'sma_crossover', {'fast': [50], 'slow': [20]})
@@ -0,0 +1,12 @@
+import pytest
+
+from aws_jobs.benchmark import percentile
+
+
+@pytest.mark.parametrize('q, expected', [(0, 1), (5, 1), (50, 10), (90, 18), (95, 19), (99, 20), (100, 20)])
+def test_percentile_is_nearest_rank(q, expected):
+    assert percentile(list(range(20, 0, -1)), q) == expected
+
+
+def test_percentile_of_one_value():
+    assert percentile([7.5], 50) == percentile([7.5], 95) == 7.5
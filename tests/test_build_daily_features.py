@@ -0,0 +1,56 @@
+import datetime
+
+import fsspec
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+from polars.testing import assert_frame_equal
+
+from aws_jobs.build_daily_features import full_build, update
+from aws_tools.analytics import FEATURE_COLUMNS
+
+
+def _prices(end, symbols=('AAA', 'BBB', 'CCC'), start=datetime.date(2018, 1, 1)):
+    dates = pl.date_range(start, end, '1d', eager=True)
+    dates = dates.filter(dates.dt.weekday() <= 5)
+    rng = np.random.default_rng(7)
+    frames = []
+    for symbol in symbols:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        frames.append(pl.DataFrame({
+            'symbol': symbol, 'Date': dates.cast(pl.Datetime('ns')), 'Open': close, 'High': close * 1.01,
+            'Low': close * 0.99, 'Close': close, 'Volume': rng.integers(1_000, 100_000, len(dates)).astype(float),
+        }))
+    return pl.concat(frames)
+
+
+def _write_lake(fs, root, frame):
+    for (year,), part in frame.with_columns(pl.col('Date').dt.year().alias('_year')).partition_by(
+            '_year', as_dict=True).items():
+        fs.makedirs(f'{root}/year={year}', exist_ok=True)
+        with fs.open(f'{root}/year={year}/part-0.parquet', 'wb') as f:
+            pq.write_table(part.drop('_year').to_arrow(), f)
+
+
+def _read_features(fs, root):
+    frames = []
+    for path in sorted(fs.find(root)):
+        with fs.open(path, 'rb') as f:
+            frames.append(pl.from_arrow(pq.read_table(f)))
+    return pl.concat(frames).select(FEATURE_COLUMNS).sort(['symbol', 'Date'])
+
+
+def test_incremental_update_matches_full_build(tmp_path):
+    fs = fsspec.filesystem('file')
+    prices = _prices(datetime.date(2023, 6, 30))
+    cutoff = datetime.datetime(2023, 3, 31)
+    _write_lake(fs, f'{tmp_path}/lake-old', prices.filter(pl.col('Date') <= cutoff))
+    _write_lake(fs, f'{tmp_path}/lake', prices)
+
+    full_build(fs, f'{tmp_path}/lake', fs, f'{tmp_path}/full')
+    full_build(fs, f'{tmp_path}/lake-old', fs, f'{tmp_path}/incremental')
+    added = update(fs, f'{tmp_path}/lake', fs, f'{tmp_path}/incremental')
+
+    assert added == prices.filter(pl.col('Date') > cutoff).height
+    assert_frame_equal(_read_features(fs, f'{tmp_path}/incremental'), _read_features(fs, f'{tmp_path}/full'),
+                       check_exact=False, rel_tol=1e-9, abs_tol=1e-9)
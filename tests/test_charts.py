@@ -0,0 +1,75 @@
+import pytest
+
+from aws_tools.charts import ChartError, ChartRenderer, chart_key, normalize_spec
+
+PRICES = {'source': 'market_data', 'start_date': '2024-01-01'}
+
+
+@pytest.mark.parametrize('args, message', [
+    (('pie', [{'y': [1]}]), 'chart_type must be one of'),
+    (('line', []), 'at least one series'),
+    (('line', [{'symbol': 'AAPL'}]), 'no data reference'),
+    (('line', [{'symbol': 'AAPL'}], {'source': 'news'}), 'data.source must be one of'),
+    (('line', [{'y': [1, 'high']}]), 'series 0: y values must be numbers or null'),
+    (('line', [{'y': [1, 2]}, {'x': ['a'], 'y': [1, 2]}]), 'series 1: x has 1 values and y has 2'),
+    (('line', [{'x': [1, 2]}]), 'series 0 needs either y values or a symbol'),
+])
+def test_normalize_spec_rejects_invalid_specs(args, message):
+    chart_type, series, *data = args
+    with pytest.raises(ChartError, match=message):
+        normalize_spec(chart_type, series, data=data[0] if data else None)
+
+
+def test_normalize_spec_canonical_form():
+    spec = normalize_spec('line', [{'symbol': ' aapl '}, {'symbol': 'msft', 'field': 'sma_50', 'label': 'MSFT trend'},
+                                   {'y': ['1.5', None, 3]}], title=None, data=PRICES, rebase=1)
+    assert spec == {
+        'type': 'line', 'title': '', 'x_label': '', 'y_label': '', 'rebase': True,
+        'data': {'source': 'market_data', 'start_date': '2024-01-01', 'end_date': None},
+        'series': [{'label': 'AAPL Close', 'symbol': 'AAPL', 'field': 'Close'},
+                   {'label': 'MSFT trend', 'symbol': 'MSFT', 'field': 'sma_50'},
+                   {'label': 'series 3', 'x': [0, 1, 2], 'y': [1.5, None, 3.0]}]}
+    assert normalize_spec('bar', [{'y': [1]}])['data'] is None
+
+
+def test_chart_key_is_a_content_address():
+    spec = normalize_spec('line', [{'symbol': 'AAPL'}], title='Apple', data=PRICES)
+    series = [{'label': 'AAPL Close', 'x': ['2024-01-02', '2024-01-03'], 'y': [185.6, 184.3]}]
+    key = chart_key(spec, series, 'reports/charts')
+    assert key.startswith('reports/charts/') and key.endswith('.png')
+    assert chart_key(normalize_spec('line', [{'symbol': 'aapl'}], title='Apple', data=PRICES), series,
+                     'reports/charts') == key
+    assert chart_key(spec, series) == key.removeprefix('reports/charts/')
+    # New data or a different title is a new chart
+    assert chart_key(spec, [dict(series[0], y=[185.6, 186.0])], 'reports/charts') != key
+    assert chart_key(dict(spec, title='Apple Inc.'), series, 'reports/charts') != key
+
+
+def _rendered_axes(spec, series):
+    renderer = ChartRenderer()
+    renderer.warm_up()
+    figure, figures = renderer._figure, []
+    renderer._figure = lambda: figures.append(figure()) or figures[-1]
+    png = renderer.render(spec, series)
+    assert png.startswith(b'\x89PNG')
+    return figures[0].axes[0]
+
+
+@pytest.mark.parametrize('chart_type', ['line', 'scatter'])
+def test_series_over_different_dates_share_a_time_axis(chart_type):
+    spec = normalize_spec(chart_type, [{'y': [1, 2]}])
+    series = [{'label': 'AAPL', 'x': ['2024-01-03', '2024-01-05'], 'y': [1.0, 2.0]},
+              {'label': 'MSFT', 'x': ['2024-01-02', '2024-01-04'], 'y': [3.0, 4.0]}]
+    ax = _rendered_axes(spec, series)
+    if chart_type == 'line':
+        aapl, msft = (line.get_xydata()[:, 0] for line in ax.lines)
+    else:
+        aapl, msft = (collection.get_offsets()[:, 0] for collection in ax.collections)
+    # As categories AAPL's dates would come first; on a time axis they interleave
+    assert msft[0] < aapl[0] < msft[1] < aapl[1]
+
+
+def test_non_date_x_values_stay_categories():
+    spec = normalize_spec('line', [{'y': [1, 2]}])
+    ax = _rendered_axes(spec, [{'label': 'EPS', 'x': ['Q3', 'Q4'], 'y': [1.0, 2.0]}])
+    assert [label.get_text() for label in ax.get_xticklabels()] == ['Q3', 'Q4']
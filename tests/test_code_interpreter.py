@@ -0,0 +1,97 @@
+import pytest
+
+from aws_tools import code_interpreter
+from aws_tools.code_interpreter import (CodeExecutionTimeout, InProcessInterpreterBackend, InterpreterSessionPool,
+                                        SessionUnavailable, close_interpreter_scope, enter_interpreter_scope)
+
+
+class FlakyBackend(InProcessInterpreterBackend):
+    """Raises the queued errors on the next executions, then behaves."""
+
+    def __init__(self, *errors):
+        super().__init__()
+        self.errors = list(errors)
+        self.executions = 0
+
+    def execute(self, session_id, code):
+        self.executions += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().execute(session_id, code)
+
+
+def _pool(backend=None, **options):
+    return InterpreterSessionPool(backend or InProcessInterpreterBackend(), reap_interval=0, **options)
+
+
+def test_sessions_are_reused_within_a_scope():
+    pool = _pool()
+    pool.run('x = 41', scope='a')
+    assert pool.run('print(x + 1)', scope='a') == '42\n'
+    assert (pool.stats['started'], pool.stats['reused']) == (1, 1)
+
+
+def test_scopes_do_not_share_state():
+    pool = _pool()
+    pool.run('x = 1', scope='a')
+    assert 'NameError' in pool.run('print(x)', scope='b')
+    assert pool.stats['started'] == 2
+
+
+def test_closed_scope_sessions_are_reset_and_reused():
+    pool = _pool()
+    pool.run('x = 1', scope='a')
+    pool.close_scope('a')
+    assert 'NameError' in pool.run('print(x)', scope='b')
+    assert pool.stats['started'] == 1
+
+
+def test_checkout_waits_for_a_release():
+    pool = _pool(max_sessions=1, acquire_timeout=0.1)
+    session = pool.acquire('a')
+    with pytest.raises(TimeoutError):
+        pool.acquire('a')
+    pool.release(session)
+    assert pool.acquire('a') is session
+
+
+def test_interpreter_scope_closes_its_sessions(monkeypatch):
+    pool = _pool()
+    monkeypatch.setattr(code_interpreter, '_pools', {'inprocess': pool})
+    monkeypatch.setattr(code_interpreter, 'SESSION_SCOPE_MODE', 'invocation')
+    key = enter_interpreter_scope()
+    pool.run('x = 1')
+    [session] = pool._idle
+    assert session.scope == key
+    close_interpreter_scope(key)
+    assert session.scope is None and session.needs_reset
+
+
+def test_unavailable_session_is_retried_on_a_new_one():
+    backend = FlakyBackend(SessionUnavailable('expired'))
+    pool = _pool(backend)
+    assert pool.run('print("ok")') == 'ok\n'
+    assert backend.executions == 2
+    assert (pool.stats['started'], pool.stats['failed']) == (2, 1)
+
+
+def test_unavailable_twice_is_raised():
+    pool = _pool(FlakyBackend(SessionUnavailable('down'), SessionUnavailable('down')))
+    with pytest.raises(SessionUnavailable):
+        pool.run('print("ok")')
+
+
+def test_other_errors_are_not_retried():
+    # The snippet may have run in part, so running it again could repeat its side effects
+    backend = FlakyBackend(RuntimeError('stream broke'))
+    with pytest.raises(RuntimeError):
+        _pool(backend).run('print("ok")')
+    assert backend.executions == 1
+
+
+def test_timeout_is_returned_as_an_error():
+    backend = FlakyBackend(CodeExecutionTimeout('ran longer than 30s'))
+    pool = _pool(backend)
+    assert pool.run('while True: pass') == 'Error: ran longer than 30s'
+    assert backend.executions == 1
+    assert pool.stats['failed'] == 1
@@ -0,0 +1,88 @@
+import datetime
+
+import fsspec
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+from polars.testing import assert_frame_equal
+
+from aws_jobs.compact_market_data import INDEX_FILE, append, full_rewrite
+from aws_tools.market_lake import MarketLakeIndex, MarketLakeReader, RowGroupCache
+
+SYMBOLS = [f'S{number:02d}' for number in range(30)]
+
+
+def _prices(start, end):
+    dates = pl.date_range(start, end, '1d', eager=True)
+    dates = dates.filter(dates.dt.weekday() <= 5).cast(pl.Datetime('ns'))
+    rng = np.random.default_rng(start.toordinal())
+    return pl.concat([pl.DataFrame({
+        'Date': dates, 'Close': rng.uniform(10, 100, len(dates)), 'High': 101.0, 'Low': 9.0, 'Open': 50.0,
+        'Volume': rng.integers(1_000, 100_000, len(dates)), 'year': dates.dt.year().cast(pl.Int32), 'symbol': symbol,
+    }) for symbol in SYMBOLS])
+
+
+def _write_lake(fs, root, frame):
+    # The source layout: one file per year, in date order, so statistics cannot prune by symbol
+    for (year,), part in frame.partition_by('year', as_dict=True).items():
+        fs.makedirs(f'{root}/year={year}', exist_ok=True)
+        with fs.open(f'{root}/year={year}/part-0.parquet', 'wb') as f:
+            pq.write_table(part.sort('Date').to_arrow(), f, row_group_size=512)
+
+
+def _readers(tmp_path, fs):
+    partitions = MarketLakeReader(f'{tmp_path}/lake', filesystem=fs, index_uri=None,
+                                  cache=RowGroupCache(str(tmp_path / 'cache-partitions')))
+    indexed = MarketLakeReader(f'{tmp_path}/lake', filesystem=fs, index_uri=f'{tmp_path}/sorted/{INDEX_FILE}',
+                               index_filesystem=fs, cache=RowGroupCache(str(tmp_path / 'cache-indexed')),
+                               listing_ttl=0)
+    return partitions, indexed
+
+
+QUERIES = [(['S07'], None, None), (['S00', 'S29', 'S13'], '2021-06-01', '2022-02-15'),
+           (['S20'], '2022-12-20', '2023-01-10'), (['S05', 'NOPE'], '2023-01-01', None)]
+
+
+def test_index_reads_match_partition_reads(tmp_path):
+    fs = fsspec.filesystem('file')
+    _write_lake(fs, f'{tmp_path}/lake', _prices(datetime.date(2021, 1, 1), datetime.date(2022, 12, 30)))
+    index = full_rewrite(fs, f'{tmp_path}/lake', fs, f'{tmp_path}/sorted', row_group_size=128, rows_per_file=1024)
+
+    assert index.max_date == '2022-12-30'
+    assert len(index.files) > 1 and sorted(index.symbols) == SYMBOLS
+    partitions, indexed = _readers(tmp_path, fs)
+    for symbols, start, end in QUERIES:
+        assert_frame_equal(indexed.read(symbols, start, end), partitions.read(symbols, start, end))
+    # A symbol's rows sit together in the sorted layout, so the index reads far fewer row groups
+    partitions.stats['row_groups'] = indexed.stats['row_groups'] = 0
+    partitions.read(['S07'], '2022-01-01', '2022-12-31')
+    indexed.read(['S07'], '2022-01-01', '2022-12-31')
+    assert indexed.stats['row_groups'] * 3 <= partitions.stats['row_groups']
+
+
+def test_append_adds_a_delta_and_reads_still_match(tmp_path):
+    fs = fsspec.filesystem('file')
+    _write_lake(fs, f'{tmp_path}/lake', _prices(datetime.date(2022, 1, 1), datetime.date(2022, 12, 30)))
+    base = full_rewrite(fs, f'{tmp_path}/lake', fs, f'{tmp_path}/sorted', row_group_size=128, rows_per_file=1024)
+    _write_lake(fs, f'{tmp_path}/lake', _prices(datetime.date(2023, 1, 2), datetime.date(2023, 1, 31)))
+
+    index = append(fs, f'{tmp_path}/lake', fs, f'{tmp_path}/sorted', row_group_size=128)
+
+    assert index.generation == base.generation and index.max_date == '2023-01-31'
+    assert [path for path in index.files if '/delta-' in path]
+    assert MarketLakeIndex.load(fs, f'{tmp_path}/sorted/{INDEX_FILE}').to_dict() == index.to_dict()
+    partitions, indexed = _readers(tmp_path, fs)
+    for symbols, start, end in QUERIES:
+        assert_frame_equal(indexed.read(symbols, start, end), partitions.read(symbols, start, end))
+    # Nothing new: the index is left as it is
+    assert append(fs, f'{tmp_path}/lake', fs, f'{tmp_path}/sorted').to_dict() == index.to_dict()
+
+
+def test_rows_after_the_index_come_from_the_partitions(tmp_path):
+    fs = fsspec.filesystem('file')
+    _write_lake(fs, f'{tmp_path}/lake', _prices(datetime.date(2022, 1, 1), datetime.date(2022, 12, 30)))
+    full_rewrite(fs, f'{tmp_path}/lake', fs, f'{tmp_path}/sorted', row_group_size=128, rows_per_file=1024)
+    # Days the compaction job has not picked up yet
+    _write_lake(fs, f'{tmp_path}/lake', _prices(datetime.date(2023, 1, 2), datetime.date(2023, 1, 13)))
+    partitions, indexed = _readers(tmp_path, fs)
+    assert_frame_equal(indexed.read(['S01'], '2022-12-01'), partitions.read(['S01'], '2022-12-01'))
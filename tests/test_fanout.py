@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from aws_runtime.fanout import (InvalidPlan, ResearchPlan, ResearchTask, TimeboxedAgent, build_fanout_graph,
+                                final_tasks, order_tasks)
+
+
+def _plan(*tasks):
+    return ResearchPlan(summary='Compare two stocks', tasks=[
+        ResearchTask(id=task_id, agent=agent, instruction=f'Do {task_id}', depends_on=list(depends_on))
+        for task_id, agent, depends_on in tasks])
+
+
+DIAMOND = _plan(('chart', 'charts', ['prices', 'ratios']), ('prices', 'marketDataResearch', []),
+                ('ratios', 'financialAnalyst', []), ('model', 'coder', ['prices']))
+
+
+def test_order_tasks_puts_dependencies_first():
+    assert [task.id for task in order_tasks(DIAMOND)] == ['prices', 'ratios', 'chart', 'model']
+
+
+@pytest.mark.parametrize('plan, message', [
+    (_plan(('a', 'coder', []), ('a', 'charts', [])), 'Duplicate task id a'),
+    (_plan(('a', 'critic', [])), 'Unknown agent critic'),
+    (_plan(('a', 'coder', ['b'])), r"unknown tasks \['b'\]"),
+    (_plan(('a', 'coder', ['b']), ('b', 'coder', ['a'])), 'cycle'),
+    (_plan(('a', 'coder', ['a'])), 'cycle'),
+    (_plan(), 'Plan has 0 tasks'),
+    (_plan(*[(f't{n}', 'coder', []) for n in range(4)]), 'Plan has 4 tasks, expected 1 to 3'),
+])
+def test_order_tasks_rejects_invalid_plans(plan, message):
+    with pytest.raises(InvalidPlan, match=message):
+        order_tasks(plan, max_tasks=3)
+
+
+def test_only_final_tasks_feed_the_critic_and_output():
+    assert final_tasks(order_tasks(DIAMOND)) == ['chart', 'model']
+    graph = build_fanout_graph(DIAMOND)
+    edges = sorted((edge.from_node.node_id, edge.to_node.node_id) for edge in graph.edges)
+    assert edges == [('chart', 'critic'), ('chart', 'output'), ('critic', 'output'), ('model', 'critic'),
+                     ('model', 'output'), ('prices', 'chart'), ('prices', 'model'), ('ratios', 'chart')]
+    assert sorted(node.node_id for node in graph.entry_points) == ['prices', 'ratios']
+
+
+class StubAgent:
+    name = 'coder'
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.messages = []
+        self.closed = False
+
+    async def stream_async(self, prompt=None, **kwargs):
+        try:
+            yield {'data': 'working'}
+            await asyncio.sleep(self.delay)
+            yield {'result': f'done: {prompt}'}
+        finally:
+            self.closed = True
+
+
+def test_timeboxed_agent_passes_through_a_branch_in_time():
+    agent = StubAgent(delay=0)
+    boxed = TimeboxedAgent(agent, timeout=5)
+    assert boxed('prices') == 'done: prices'
+    assert agent.closed
+    boxed.messages = [{'role': 'user', 'content': []}]
+    assert agent.messages == boxed.messages
+
+
+def test_timeboxed_agent_reports_a_slow_branch_as_missing():
+    async def main():
+        agent = StubAgent(delay=5)
+        events = [event async for event in TimeboxedAgent(agent, timeout=0.05).stream_async('prices')]
+        return agent, events
+
+    agent, events = asyncio.run(main())
+    assert events[0] == {'data': 'working'}
+    result = events[-1]['result']
+    assert result.stop_reason == 'end_turn'
+    assert 'Research task coder did not finish within 0s' in str(result)
+    assert 'findings are missing' in str(result)
+    assert agent.closed
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from aws_runtime import checkpoints
+from aws_runtime.checkpoints import SQLiteDocumentStore
+from aws_runtime.jobs import (COMPLETED, FAILED, INTERRUPTED, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, QUEUED, RUNNING,
+                              JobConflict, JobRunner)
+
+
+class RacingStore(SQLiteDocumentStore):
+    """Every get_versioned waits until ``readers`` callers have read, so all of them write against one version."""
+
+    def __init__(self, path, readers):
+        super().__init__(path)
+        self.barrier = threading.Barrier(readers, timeout=5)
+
+    def get_versioned(self, collection, doc_id):
+        found = super().get_versioned(collection, doc_id)
+        self.barrier.wait()
+        return found
+
+
+def _runner(store, owner, **options):
+    runner = JobRunner(store=store, **options)
+    runner.owner = owner
+    return runner
+
+
+def _job(store, status, attempts=1, age=0, owner='old-host:1', job_id='job-1'):
+    stamp = time.time() - age
+    store.put('jobs', job_id, {
+        'job_id': job_id, 'prompt': 'Compare AAPL and MSFT', 'user_input': 'Compare AAPL and MSFT',
+        'research_mode': 'fanout', 'plan': None, 'status': status, 'attempts': attempts, 'owner': owner,
+        'created_at': stamp, 'updated_at': stamp, 'heartbeat_at': stamp, 'checkpoints': 0, 'completed_nodes': [],
+        'result_html': None, 'error': None})
+    return job_id
+
+
+def test_job_store_paths_do_not_depend_on_the_working_directory():
+    assert os.path.isabs(checkpoints.JOB_STORE_PATH) and os.path.isabs(checkpoints.JOB_STORE_DIR)
+
+
+def test_only_one_process_claims_an_interrupted_job(tmp_path):
+    store = RacingStore(str(tmp_path / 'jobs.db'), readers=3)
+    job_id = _job(store, RUNNING, age=JOB_LEASE_SECONDS + 60)
+    runners = [_runner(store, f'host-{n}:1') for n in range(3)]
+    claims = {}
+    threads = [threading.Thread(target=lambda r=runner: claims.__setitem__(r.owner, r.claim(job_id)))
+               for runner in runners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    winners = [owner for owner, claimed in claims.items() if claimed]
+    assert len(winners) == 1
+    job = store.get('jobs', job_id)
+    assert (job['status'], job['owner']) == (QUEUED, winners[0])
+
+
+def test_concurrent_updates_are_not_lost(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / 'jobs.db'))
+    job_id = _job(store, RUNNING)
+    # Separate runners stand for separate processes: nothing but the conditional write keeps them apart
+    runners = [_runner(store, f'host-{n}:1') for n in range(4)]
+
+    def record(runner):
+        for n in range(10):
+            runner.update(job_id, lambda job: job.update(checkpoints=job['checkpoints'] + 1,
+                                                          completed_nodes=job['completed_nodes'] + [runner.owner]))
+
+    threads = [threading.Thread(target=record, args=(runner,)) for runner in runners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    job = store.get('jobs', job_id)
+    assert job['checkpoints'] == 40
+    assert sorted(set(job['completed_nodes'])) == [runner.owner for runner in runners]
+
+
+def test_update_reapplies_the_change_after_a_conflict(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / 'jobs.db'))
+    job_id = _job(store, RUNNING)
+    runner = _runner(store, 'host-a:1')
+    seen = []
+
+    def change(job):
+        seen.append(job['owner'])
+        if len(seen) == 1:
+            # Another process takes the job over between this read and the write
+            _job(store, QUEUED, owner='host-b:1')
+        job['checkpoints'] += 1
+
+    job = runner.update(job_id, change)
+    assert seen == ['old-host:1', 'host-b:1']
+    assert (job['owner'], job['checkpoints']) == ('host-b:1', 1)
+    assert store.get('jobs', job_id)['owner'] == 'host-b:1'
+
+
+def test_update_gives_up_when_every_write_conflicts(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / 'jobs.db'))
+    job_id = _job(store, RUNNING)
+    store.put_if_unchanged = lambda *args: False
+    with pytest.raises(JobConflict, match='gave up after 3 attempts'):
+        _runner(store, 'host-a:1').update(job_id, lambda job: None, attempts=3)
+
+
+def _finished_graph(runner, html='<p>AAPL vs MSFT</p>', status='completed'):
+    async def run_graph(job, request_trace):
+        runner.ran.append(job['job_id'])
+        return SimpleNamespace(status=SimpleNamespace(value=status),
+                               results={'output': SimpleNamespace(result=html)} if html else {})
+    runner.ran = []
+    runner._run_graph = run_graph
+
+
+async def _settle(runner):
+    while runner._tasks:
+        await asyncio.gather(*runner._tasks.values())
+
+
+def test_resume_runs_a_failed_job_again(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / 'jobs.db'))
+    job_id = _job(store, FAILED)
+    results = []
+    runner = _runner(store, 'host-a:1', on_result=lambda prompt, result: results.append(prompt))
+    _finished_graph(runner)
+
+    async def main():
+        started = await runner.resume(job_id)
+        await _settle(runner)
+        return started
+
+    started = asyncio.run(main())
+    assert started['status'] == QUEUED
+    assert runner.result(job_id) == {'job_id': job_id, 'status': COMPLETED, 'html': '<p>AAPL vs MSFT</p>'}
+    assert store.get('jobs', job_id)['attempts'] == 2
+    assert (runner.ran, results) == ([job_id], ['Compare AAPL and MSFT'])
+
+
+def test_resume_stops_at_max_attempts_unless_forced(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / 'jobs.db'))
+    job_id = _job(store, FAILED, attempts=JOB_MAX_ATTEMPTS)
+    runner = _runner(store, 'host-a:1')
+    _finished_graph(runner, html=None, status='failed')
+
+    async def main():
+        refused = await runner.resume(job_id)
+        await runner.resume(job_id, force=True)
+        await _settle(runner)
+        return refused
+
+    refused = asyncio.run(main())
+    assert (refused['status'], refused['resumable']) == (FAILED, False)
+    job = store.get('jobs', job_id)
+    assert (job['status'], job['attempts']) == (FAILED, JOB_MAX_ATTEMPTS + 1)
+    assert job['error'] == 'The graph did not complete'
+
+
+def test_recover_resumes_only_interrupted_jobs(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / 'jobs.db'))
+    stale = _job(store, RUNNING, age=JOB_LEASE_SECONDS + 60, job_id='stale')
+    _job(store, RUNNING, job_id='alive')
+    _job(store, FAILED, age=JOB_LEASE_SECONDS + 60, job_id='failed')
+    runner = _runner(store, 'host-a:1')
+    _finished_graph(runner)
+
+    async def main():
+        assert runner.status(stale)['status'] == INTERRUPTED
+        resumed = await runner.recover()
+        await _settle(runner)
+        return resumed, await runner.recover()
+
+    resumed, again = asyncio.run(main())
+    assert (resumed, again, runner.ran) == (['stale'], [], ['stale'])
+    assert [store.get('jobs', job_id)['status'] for job_id in ('stale', 'alive', 'failed')] == [
+        COMPLETED, RUNNING, FAILED]
+
+
+def test_a_job_claimed_elsewhere_while_queued_is_left_alone(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / 'jobs.db'))
+    job_id = _job(store, QUEUED, owner='host-b:1')
+    runner = _runner(store, 'host-a:1')
+    _finished_graph(runner)
+    asyncio.run(runner._execute(job_id))
+    job = store.get('jobs', job_id)
+    assert (runner.ran, job['status'], job['attempts']) == ([], QUEUED, 1)
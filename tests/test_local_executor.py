@@ -0,0 +1,53 @@
+import pytest
+
+from aws_tools.code_interpreter import CodeExecutionTimeout, InterpreterSessionPool, SessionUnavailable
+from aws_tools.local_executor import LocalProcessBackend
+
+
+@pytest.fixture
+def backend():
+    # No preloaded libraries: the limits are what is under test, not the start-up time
+    backend = LocalProcessBackend(cpu_seconds=1, memory_mb=1024, wall_seconds=3, preload_modules=())
+    yield backend
+    for session_id in list(backend._workers):
+        backend.stop_session(session_id)
+
+
+def test_sessions_keep_state_until_reset(backend):
+    pool = InterpreterSessionPool(backend, reap_interval=0)
+    pool.run('import os; x = os.getpid()', scope='a')
+    assert pool.run('print(x == os.getpid())', scope='a') == 'True\n'
+    pool.close_scope('a')
+    assert 'NameError' in pool.run('print(x)', scope='b')
+    assert pool.stats['started'] == 1
+    pool.close()
+
+
+def test_worker_gets_no_host_secrets(backend, monkeypatch):
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'secret')
+    monkeypatch.setenv('MARKET_API_KEY', 'key')
+    session = backend.start_session()
+    output = backend.execute(session, 'import os; print(sorted(k for k in os.environ if "KEY" in k), '
+                                      'os.environ["MPLBACKEND"])')
+    assert output == "[] Agg\n"
+
+
+def test_cpu_limit(backend):
+    session = backend.start_session()
+    assert 'CPU time limit of 1s exceeded' in backend.execute(session, 'while True: pass')
+    # The worker survives and gets a fresh budget for the next snippet
+    assert backend.execute(session, 'print(1)') == '1\n'
+
+
+def test_memory_limit(backend):
+    session = backend.start_session()
+    assert 'memory limit of 1024 MB exceeded' in backend.execute(session, 'x = bytearray(2 * 1024 ** 3)')
+    assert backend.execute(session, 'print(1)') == '1\n'
+
+
+def test_wall_clock_limit_kills_the_worker(backend):
+    session = backend.start_session()
+    with pytest.raises(CodeExecutionTimeout):
+        backend.execute(session, 'import time; time.sleep(30)')
+    with pytest.raises(SessionUnavailable):
+        backend.execute(session, 'print(1)')
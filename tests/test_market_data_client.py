@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+import requests
+
+from aws_tools import market_data_client
+from aws_tools.market_data_client import AsyncMarketDataClient, MarketDataClient, MarketDataError, backoff_delay
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """Serves the queued responses (or raises the queued exceptions) in order."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(market_data_client.time, 'sleep', delays.append)
+    monkeypatch.setattr(market_data_client.random, 'uniform', lambda low, high: high)
+    return delays
+
+
+def _client(*responses, max_retries=3):
+    client = MarketDataClient(base_url='https://api.test', api_key='key', max_retries=max_retries)
+    client.session = FakeSession(*responses)
+    return client
+
+
+def test_backoff_is_jittered_exponential_and_capped():
+    for attempt in range(8):
+        for _ in range(50):
+            assert 0 <= backoff_delay(attempt, base=0.5, cap=8) <= min(8, 0.5 * 2 ** attempt)
+    assert backoff_delay(0, retry_after='3', cap=8) == 3
+    assert backoff_delay(0, retry_after='120', cap=8) == 8
+
+
+def test_retries_transient_failures_with_backoff(sleeps):
+    client = _client(FakeResponse(503), requests.ConnectionError('reset'),
+                     FakeResponse(429, headers={'Retry-After': '2'}), FakeResponse(200, {'price': 1}))
+    assert client.get_json('/price/AAPL') == {'price': 1}
+    assert client.session.urls == ['https://api.test/price/AAPL'] * 4
+    assert sleeps == [0.5, 1.0, 2.0]
+
+
+def test_client_errors_are_not_retried(sleeps):
+    client = _client(FakeResponse(404), FakeResponse(200, {}))
+    with pytest.raises(MarketDataError) as error:
+        client.get_json('/news/NOPE')
+    assert error.value.status_code == 404
+    assert sleeps == []
+
+
+def test_gives_up_after_max_retries(sleeps):
+    client = _client(*[FakeResponse(500)] * 3, max_retries=2)
+    with pytest.raises(MarketDataError, match='HTTP 500'):
+        client.get_json('/price/AAPL')
+    assert len(sleeps) == 2
+
+
+def test_async_client_retries_without_blocking(monkeypatch, sleeps):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(market_data_client.asyncio, 'sleep', fake_sleep)
+    client = AsyncMarketDataClient(_client(FakeResponse(502), FakeResponse(200, {'a': 1}), FakeResponse(404)))
+
+    async def run():
+        first = await client.get_json('/price/AAPL')
+        [second] = await client.get_many(['/price/NOPE'])
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == {'a': 1}
+    assert isinstance(second, MarketDataError) and second.status_code == 404
+    assert delays == [0.5] and sleeps == []
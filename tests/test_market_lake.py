@@ -0,0 +1,90 @@
+import datetime
+
+import fsspec
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+from polars.testing import assert_frame_equal
+
+from aws_tools.market_lake import MarketLakeReader, RowGroupCache
+
+SYMBOLS = [f'S{number:02d}' for number in range(20)]
+
+
+def _prices(start=datetime.date(2021, 1, 1), end=datetime.date(2023, 12, 31)):
+    dates = pl.date_range(start, end, '1d', eager=True)
+    dates = dates.filter(dates.dt.weekday() <= 5).cast(pl.Datetime('ns'))
+    rng = np.random.default_rng(11)
+    frames = []
+    for symbol in SYMBOLS:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        frames.append(pl.DataFrame({
+            'Date': dates, 'Close': close, 'High': close * 1.01, 'Low': close * 0.99, 'Open': close,
+            'Volume': rng.integers(1_000, 100_000, len(dates)), 'year': dates.dt.year().cast(pl.Int32),
+            'symbol': symbol,
+        }))
+    return pl.concat(frames)
+
+
+def write_lake(fs, root, frame, row_group_size=128):
+    """Year partitions sorted by symbol, so row-group statistics can prune by symbol and date."""
+    for (year,), part in frame.partition_by('year', as_dict=True).items():
+        fs.makedirs(f'{root}/year={year}', exist_ok=True)
+        with fs.open(f'{root}/year={year}/part-0.parquet', 'wb') as f:
+            pq.write_table(part.sort(['symbol', 'Date']).to_arrow(), f, row_group_size=row_group_size)
+
+
+def expected(frame, symbols, start, end, columns):
+    return (frame.filter(pl.col('symbol').is_in(symbols), pl.col('Date').dt.date().is_between(start, end))
+            .select(columns).sort(['symbol', 'Date']))
+
+
+def test_pruned_reads_match_full_reads(tmp_path):
+    fs = fsspec.filesystem('file')
+    prices = _prices()
+    write_lake(fs, f'{tmp_path}/lake', prices)
+    reader = MarketLakeReader(f'{tmp_path}/lake', filesystem=fs, cache=RowGroupCache(str(tmp_path / 'cache')),
+                              index_uri=None)
+    start, end = datetime.date(2022, 3, 1), datetime.date(2022, 9, 30)
+
+    frame = reader.read(['s03', 'S11'], start.isoformat(), end.isoformat(), ['Close', 'Volume'])
+
+    assert_frame_equal(frame, expected(prices, ['S03', 'S11'], start, end, ['symbol', 'Date', 'Close', 'Volume']))
+    # Only the 2022 partition is opened, and most of its row groups are skipped
+    assert reader.stats['files'] == 1
+    assert reader.stats['row_groups_pruned'] > 4 * reader.stats['row_groups']
+
+
+def test_whole_range_and_unknown_symbols(tmp_path):
+    fs = fsspec.filesystem('file')
+    prices = _prices()
+    write_lake(fs, f'{tmp_path}/lake', prices)
+    reader = MarketLakeReader(f'{tmp_path}/lake', filesystem=fs, cache=RowGroupCache(str(tmp_path / 'cache')),
+                              index_uri=None)
+    assert_frame_equal(reader.read(['S00']), expected(prices, ['S00'], datetime.date(2021, 1, 1),
+                                                      datetime.date(2023, 12, 31), list(reader.schema)))
+    assert reader.read(['NOPE'], '2022-01-01', '2022-12-31').is_empty()
+
+
+def test_row_groups_are_served_from_the_local_cache(tmp_path):
+    fs = fsspec.filesystem('file')
+    write_lake(fs, f'{tmp_path}/lake', _prices())
+    cache = RowGroupCache(str(tmp_path / 'cache'))
+    first = MarketLakeReader(f'{tmp_path}/lake', filesystem=fs, cache=cache, index_uri=None)
+    frame = first.read(['S05'], '2023-01-01', '2023-06-30')
+    fetched = cache.stats['misses']
+
+    # A new reader (another worker on the host) reads the same row groups from disk, not from the lake
+    second = MarketLakeReader(f'{tmp_path}/lake', filesystem=fs, cache=RowGroupCache(str(tmp_path / 'cache')),
+                              index_uri=None)
+    assert_frame_equal(second.read(['S05'], '2023-01-01', '2023-06-30'), frame)
+    assert second.cache.stats == {'hits': fetched, 'misses': 0, 'evictions': 0}
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = RowGroupCache(str(tmp_path / 'cache'), max_bytes=10_000)
+    table = _prices(end=datetime.date(2021, 1, 31)).filter(pl.col('symbol') == 'S00').to_arrow()
+    for key in range(20):
+        cache.put(str(key), table)
+    assert cache.stats['evictions'] > 0
+    assert cache.get('19') is not None and cache.get('0') is None
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from strands.types.exceptions import ModelThrottledException
+
+from aws_runtime.model_limits import ConcurrencyLimiter, LimitedModel
+from aws_runtime.model_tiers import TieredModel
+
+
+class StubModel:
+    """Answers with its name after ``delay`` seconds, or raises ``error`` instead."""
+
+    def __init__(self, name, delay=0.0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def get_config(self):
+        return {'model_id': self.name}
+
+    def update_config(self, **model_config):
+        pass
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        yield {'contentBlockDelta': {'delta': {'text': self.name}}}
+        yield {'messageStop': {'stopReason': 'end_turn'}}
+
+
+def _answer(model):
+    async def run():
+        return [event['contentBlockDelta']['delta']['text'] async for event in model.stream([], None, None)
+                if 'contentBlockDelta' in event]
+    return asyncio.run(run())
+
+
+def test_first_model_answers():
+    second = StubModel('second')
+    assert _answer(TieredModel('role', [StubModel('first'), second], hedge_delay=1)) == ['first']
+    assert second.calls == 0
+
+
+def test_fails_over_when_throttled():
+    first = StubModel('first', error=ModelThrottledException('slow down'))
+    assert _answer(TieredModel('role', [first, StubModel('second')])) == ['second']
+
+
+def test_other_errors_are_raised():
+    second = StubModel('second')
+    with pytest.raises(ValueError):
+        _answer(TieredModel('role', [StubModel('first', error=ValueError('bad request')), second]))
+    assert second.calls == 0
+
+
+def test_last_error_is_raised_when_every_model_fails():
+    models = [StubModel(name, error=ModelThrottledException(name)) for name in ('first', 'second')]
+    with pytest.raises(ModelThrottledException, match='second'):
+        _answer(TieredModel('role', models))
+
+
+def test_fails_over_when_the_first_token_is_late():
+    assert _answer(TieredModel('role', [StubModel('first', delay=5), StubModel('second')],
+                               first_token_timeout=0.1)) == ['second']
+
+
+def test_hedge_answers_when_the_first_model_is_slow():
+    second = StubModel('second', delay=0.01)
+    assert _answer(TieredModel('role', [StubModel('first', delay=5), second], hedge_delay=0.05)) == ['second']
+    assert second.calls == 1
+
+
+def test_clocks_wait_for_a_limiter_slot():
+    limiter = ConcurrencyLimiter(1)
+    models = [LimitedModel(StubModel(name, delay=0.05), limiter) for name in ('first', 'second')]
+
+    async def run():
+        async def hold():
+            async with limiter.slot():
+                await asyncio.sleep(0.3)
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        tier = TieredModel('role', models, first_token_timeout=0.2, hedge_delay=0.1)
+        answer = [event async for event in tier.stream([], None, None) if 'contentBlockDelta' in event]
+        await holder
+        return answer
+
+    # Queued longer than the timeout and the hedge delay, yet neither fires: only time holding the slot counts
+    [event] = asyncio.run(run())
+    assert event['contentBlockDelta']['delta']['text'] == 'first'
+    assert models[1].model.calls == 0
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from strands import tool
+from strands.types._events import ToolResultEvent
+
+from aws_runtime.recording import (Recorder, RecordingMissing, RecordingModel, RecordingTool, recorded_function,
+                                   request_key)
+
+DATED = 'Price of AAPL?\n###For clarification today date is: {}'
+
+
+class EchoModel:
+    def __init__(self):
+        self.calls = 0
+
+    def get_config(self):
+        return {'model_id': 'echo'}
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        self.calls += 1
+        yield {'contentBlockDelta': {'delta': {'text': messages[-1]['content'][0]['text']}}}
+        yield {'messageStop': {'stopReason': 'end_turn'}}
+
+
+class OfflineModel(EchoModel):
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        raise AssertionError('replay must not call the model')
+        yield
+
+
+@tool
+def lookup(symbol: str) -> str:
+    """Look a symbol up.
+
+    Args:
+        symbol: Ticker symbol
+    """
+    return f'{symbol}: 42'
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+def _messages(text):
+    return [{'role': 'user', 'content': [{'text': text}]}]
+
+
+def test_request_key_ignores_the_date_and_line_order():
+    assert request_key('m', DATED.format('2025-01-02 10:00')) == request_key('m', DATED.format('2026-03-04 16:30'))
+    # Outputs of parallel graph nodes arrive in either order
+    assert request_key('m', 'Inputs:\nfrom a\nfrom b\nEnd') == request_key('m', 'Inputs:\nfrom b\nfrom a\nEnd')
+    assert request_key('m', {'b': 1, 'a': 2}) == request_key('m', {'a': 2, 'b': 1})
+    assert request_key('m', 'Price of AAPL?') != request_key('m', 'Price of MSFT?')
+    assert request_key('m', 'Price of AAPL?') != request_key('n', 'Price of AAPL?')
+
+
+def test_model_record_then_replay(tmp_path):
+    model = EchoModel()
+    recorded = asyncio.run(_collect(RecordingModel(model, Recorder(str(tmp_path), 'record')).stream(
+        _messages('hello'), None, 'system')))
+    assert model.calls == 1
+
+    replay = RecordingModel(OfflineModel(), Recorder(str(tmp_path), 'replay', latency_scale=0))
+    assert asyncio.run(_collect(replay.stream(_messages('hello'), None, 'system'))) == recorded
+    with pytest.raises(RecordingMissing):
+        asyncio.run(_collect(replay.stream(_messages('something else'), None, 'system')))
+
+
+def test_tool_record_then_replay(tmp_path):
+    tool_use = {'toolUseId': 'first', 'name': 'lookup', 'input': {'symbol': 'AAPL'}}
+    events = asyncio.run(_collect(RecordingTool(lookup, Recorder(str(tmp_path), 'record')).stream(tool_use, {})))
+    result = next(event for event in events if isinstance(event, ToolResultEvent)).tool_result
+
+    replay = RecordingTool(lookup, Recorder(str(tmp_path), 'replay', latency_scale=0))
+    [event] = asyncio.run(_collect(replay.stream(dict(tool_use, toolUseId='second'), {})))
+    assert event.tool_result == dict(result, toolUseId='second')
+    # Direct calls are recorded under their own key
+    RecordingTool(lookup, Recorder(str(tmp_path), 'record'))(symbol='MSFT')
+    assert replay(symbol='MSFT') == 'MSFT: 42'
+
+
+def test_function_record_then_replay(tmp_path):
+    calls = []
+
+    def converse(**kwargs):
+        calls.append(kwargs)
+        return {'output': kwargs['prompt'].upper()}
+
+    assert recorded_function('router', converse, Recorder(str(tmp_path), 'record'))(prompt='hi') == {'output': 'HI'}
+    replay = recorded_function('router', converse, Recorder(str(tmp_path), 'replay', latency_scale=0))
+    assert replay(prompt='hi') == {'output': 'HI'}
+    assert len(calls) == 1
@@ -0,0 +1,89 @@
+import datetime
+import json
+
+import pytest
+
+from aws_runtime import router
+from aws_runtime.router import AGENT, DIRECT, GRAPH, Route, answer_direct, classify_rules, extract_symbols
+
+RULES = [
+    # prompt, kind, intent, symbols, horizon
+    ('What is the price of AAPL?', DIRECT, 'price', ['AAPL'], None),
+    ('May I get the price of AAPL?', DIRECT, 'price', ['AAPL'], None),
+    ('RSI of MSFT', DIRECT, 'indicators', ['MSFT'], None),
+    ('AAPL return over the last 3 months', DIRECT, 'returns', ['AAPL'], 63),
+    ('AAPL 52 week return', DIRECT, 'returns', ['AAPL'], 252),
+    ('TSLA half year return', DIRECT, 'returns', ['TSLA'], 126),
+    ('How did Amazon perform this week?', DIRECT, 'returns', ['AMZN'], 5),
+    ('Latest news on NVDA', AGENT, 'lookup', ['NVDA'], None),
+    ('What is the P/E of AAPL?', AGENT, 'lookup', ['AAPL'], None),
+    ('What is the EPS of MSFT?', AGENT, 'lookup', ['MSFT'], None),
+    ('AAPL return this year', AGENT, 'lookup', ['AAPL'], None),
+    # Anything dated reads past prices, which the direct answer (latest features only) cannot
+    ("What was AAPL's closing price on March 3, 2023?", AGENT, 'historical', ['AAPL'], None),
+    ('How did NVDA do in 2022?', AGENT, 'historical', ['NVDA'], None),
+    ('return of MSFT between 2019-01-01 and 2020-01-01', AGENT, 'historical', ['MSFT'], None),
+    ('AAPL close on 3/15', AGENT, 'historical', ['AAPL'], None),
+    ('AAPL price 2 days ago', AGENT, 'historical', ['AAPL'], None),
+    ('How has AMZN done since the IPO', AGENT, 'historical', ['AMZN'], None),
+    ('Explain why TSLA fell', GRAPH, 'research', [], None),
+    ('Price of AAPL, MSFT, GOOGL, AMZN, META and NFLX', GRAPH, 'research',
+     ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META', 'NFLX'], None),
+]
+
+
+@pytest.mark.parametrize('prompt, kind, intent, symbols, horizon', RULES)
+def test_classify_rules(prompt, kind, intent, symbols, horizon):
+    route = classify_rules(prompt)
+    assert (route.kind, route.intent, route.symbols, route.horizon) == (kind, intent, symbols, horizon)
+
+
+@pytest.mark.parametrize('prompt', ['What is a stock split?', 'Tell me about tech stocks'])
+def test_unclear_prompts_go_to_the_model(prompt):
+    assert classify_rules(prompt) is None
+
+
+def test_extract_symbols_skips_ratio_and_index_tokens():
+    assert extract_symbols('What is the P/E ratio of S&P companies like MSFT and $TSLA?') == ['MSFT', 'TSLA']
+    assert extract_symbols('Is Netflix cheaper than NFLX was a year ago?') == ['NFLX']
+
+
+@pytest.mark.parametrize('prompt, symbols', [
+    ('Price of AAPL TODAY please', ['AAPL']),
+    ('Is NVDA listed on the NYSE or NASDAQ?', ['NVDA']),
+    ('MSFT close at EOD, before the FOMC and CPI news', ['MSFT']),
+    ('SHOW ME THE PRICE OF TSLA', ['TSLA']),
+    ('$NOW price', ['NOW']),
+])
+def test_extract_symbols_skips_capitalised_words(prompt, symbols):
+    assert extract_symbols(prompt) == symbols
+
+
+def _features(monkeypatch, *dates):
+    rows = [{'symbol': f'S{n}', 'Date': date, 'close': 10.0} for n, date in enumerate(dates)]
+    monkeypatch.setattr(router, 'get_daily_features', lambda stock_symbols, fields: json.dumps(
+        {'missing_symbols': [], 'rows': rows}))
+    monkeypatch.setattr(router, 'last_completed_session', lambda: datetime.date(2024, 3, 8))
+    return Route(DIRECT, 'price', [row['symbol'] for row in rows], None, 'rules')
+
+
+def test_answer_direct_uses_rows_from_the_last_session(monkeypatch):
+    route = _features(monkeypatch, '2024-03-08', '2024-03-08')
+    assert 'Latest close' in str(answer_direct(route, 'price of S0 and S1'))
+
+
+def test_answer_direct_leaves_stale_rows_to_the_agent(monkeypatch):
+    route = _features(monkeypatch, '2024-03-08', '2024-03-07')
+    assert answer_direct(route, 'price of S0 and S1') is None
+
+
+def test_last_completed_session():
+    from aws_runtime.result_cache import MARKET_TIMEZONE, last_completed_session
+
+    def at(day, hour):
+        return datetime.datetime.combine(day, datetime.time(hour), MARKET_TIMEZONE)
+
+    # Friday during the session, Friday after the close, and the weekend after
+    assert last_completed_session(at(datetime.date(2024, 3, 8), 11)) == datetime.date(2024, 3, 7)
+    assert last_completed_session(at(datetime.date(2024, 3, 8), 17)) == datetime.date(2024, 3, 8)
+    assert last_completed_session(at(datetime.date(2024, 3, 10), 11)) == datetime.date(2024, 3, 8)
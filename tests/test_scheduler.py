@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from aws_runtime.scheduler import RequestScheduler, SchedulerBusy
+
+
+async def _work(scheduler, gate, log, name):
+    async def job():
+        log.append(('start', name))
+        await gate.wait()
+        log.append(('end', name))
+        return name
+    return await scheduler.run(job)
+
+
+def test_admission_limit_and_first_come_first_served_queue():
+    async def main():
+        scheduler = RequestScheduler(max_concurrent=2, max_queued=10, queue_timeout=5)
+        gate, log = asyncio.Event(), []
+        tasks = [asyncio.create_task(_work(scheduler, gate, log, n)) for n in range(5)]
+        await asyncio.sleep(0.01)
+        running = scheduler.stats()
+        gate.set()
+        return running, await asyncio.gather(*tasks), log, scheduler.stats()
+
+    running, results, log, stats = asyncio.run(main())
+    assert (running['active'], running['queued']) == (2, 3)
+    assert results == [0, 1, 2, 3, 4]
+    assert [name for event, name in log if event == 'start'] == [0, 1, 2, 3, 4]
+    # Never more than two jobs between their start and end
+    active = peak = 0
+    for event, _ in log:
+        active += 1 if event == 'start' else -1
+        peak = max(peak, active)
+    assert peak == 2
+    assert (stats['active'], stats['queued'], stats['admitted'], stats['completed']) == (0, 0, 5, 5)
+
+
+def test_rejects_beyond_the_queue_without_waiting():
+    async def main():
+        scheduler = RequestScheduler(max_concurrent=1, max_queued=1, queue_timeout=5)
+        gate, log = asyncio.Event(), []
+        tasks = [asyncio.create_task(_work(scheduler, gate, log, n)) for n in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(SchedulerBusy) as busy:
+            await scheduler.acquire()
+        gate.set()
+        await asyncio.gather(*tasks)
+        return busy.value, scheduler.stats()
+
+    busy, stats = asyncio.run(main())
+    assert 'Server busy: 1 requests running and 1 waiting' in str(busy)
+    assert busy.retry_after == 1
+    assert (stats['admitted'], stats['rejected'], stats['completed']) == (2, 1, 2)
+
+
+def test_queue_timeout_rejects_and_frees_the_queue_place():
+    async def main():
+        scheduler = RequestScheduler(max_concurrent=1, max_queued=1, queue_timeout=0.05)
+        slot = await scheduler.acquire()
+        with pytest.raises(SchedulerBusy, match='no capacity within'):
+            await scheduler.acquire()
+        after_timeout = scheduler.stats()
+        slot.release()
+        slot.release()
+        (await scheduler.acquire()).release()
+        return after_timeout, scheduler.stats()
+
+    after_timeout, stats = asyncio.run(main())
+    assert (after_timeout['active'], after_timeout['queued'], after_timeout['timed_out']) == (1, 0, 1)
+    # Releasing a slot twice frees one place only
+    assert (stats['active'], stats['admitted'], stats['completed']) == (0, 2, 2)
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        scheduler = RequestScheduler(max_concurrent=1, max_queued=1, queue_timeout=5)
+        slot = await scheduler.acquire()
+        waiter = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        queued = scheduler.stats()['queued']
+        slot.release()
+        return queued, scheduler.stats()
+
+    queued, stats = asyncio.run(main())
+    assert queued == 0
+    assert (stats['active'], stats['rejected']) == (0, 0)
+
+
+def test_hold_releases_the_slot_when_the_stream_is_closed_early():
+    async def stream():
+        for n in range(10):
+            yield n
+
+    async def main():
+        scheduler = RequestScheduler(max_concurrent=1, max_queued=0, queue_timeout=5)
+        held = scheduler.hold(await scheduler.acquire(), stream())
+        first = [await held.__anext__(), await held.__anext__()]
+        during = scheduler.stats()['active']
+        await held.aclose()
+        (await scheduler.acquire()).release()
+        return first, during, scheduler.stats()
+
+    first, during, stats = asyncio.run(main())
+    assert (first, during) == ([0, 1], 1)
+    assert (stats['active'], stats['completed']) == (0, 2)
+
@@ -0,0 +1,18 @@
+import json
+import os
+import subprocess
+import sys
+
+from aws_runtime.prewarm import DEFERRED_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_main_defers_heavy_modules():
+    # A fresh interpreter: this one has already imported whatever other tests needed
+    script = ('import json, sys; import main; '
+              f'print(json.dumps([name for name in {DEFERRED_MODULES + ["aiohttp"]!r} if name in sys.modules]))')
+    env = dict(os.environ, PREWARM='off')
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == []
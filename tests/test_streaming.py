@@ -0,0 +1,120 @@
+import asyncio
+import json
+import types
+
+import pytest
+from starlette.testclient import TestClient
+
+import main
+from aws_runtime import graph_factory
+from aws_runtime.streaming import normalize_event, stream_graph
+
+COMPLETED = types.SimpleNamespace(value='completed')
+FAILED = types.SimpleNamespace(value='failed')
+
+
+def _node_result(status=COMPLETED, result=None):
+    return types.SimpleNamespace(status=status, execution_time=12, result=result)
+
+
+def _graph_result(status, **results):
+    return types.SimpleNamespace(status=status, execution_time=34, results=results)
+
+
+class FakeGraph:
+    def __init__(self, *events):
+        self.events = events
+
+    async def stream_async(self, task):
+        for event in self.events:
+            yield event
+
+
+RUN = [
+    {'type': 'multiagent_node_start', 'node_id': 'research', 'node_type': 'multiagent'},
+    {'type': 'multiagent_node_stream', 'node_id': 'research', 'event': {
+        'type': 'multiagent_node_stream', 'node_id': 'coder', 'event': {'message': {'content': [
+            {'text': 'Let me compute that'},
+            {'toolUse': {'name': 'code_execution_tool', 'toolUseId': 't1', 'input': {'code': 'print(1)'}}}]}}}},
+    {'type': 'multiagent_node_stream', 'node_id': 'research', 'event': {
+        'type': 'multiagent_node_stream', 'node_id': 'coder', 'event': {
+            'type': 'tool_result', 'tool_result': {'toolUseId': 't1', 'status': 'success'}}}},
+    {'type': 'multiagent_node_stream', 'node_id': 'research', 'event': {
+        'type': 'multiagent_handoff', 'from_node_ids': ['coder'], 'to_node_ids': ['charts'], 'message': 'plot it'}},
+    {'type': 'multiagent_node_stream', 'node_id': 'research', 'event': {
+        'type': 'multiagent_node_stream', 'node_id': 'coder', 'event': {'data': 'thinking out loud'}}},
+    {'type': 'multiagent_node_stop', 'node_id': 'research', 'node_result': _node_result()},
+    {'type': 'multiagent_node_stream', 'node_id': 'output', 'event': {'data': '<p>Hi'}},
+    {'type': 'multiagent_node_stream', 'node_id': 'output', 'event': {'data': '</p>'}},
+]
+
+
+def _collect(stream):
+    async def run():
+        return [event async for event in stream]
+    return asyncio.run(run())
+
+
+def test_normalize_event_walks_nested_envelopes():
+    events = [normalized for event in RUN for normalized in normalize_event(event)]
+    assert events == [
+        {'type': 'node_start', 'node': 'research', 'node_type': 'multiagent', 'parent': None},
+        {'type': 'tool_call', 'node': 'coder', 'tool': 'code_execution_tool', 'tool_use_id': 't1',
+         'input': {'code': 'print(1)'}},
+        {'type': 'tool_result', 'node': 'coder', 'tool_use_id': 't1', 'status': 'success'},
+        {'type': 'handoff', 'parent': 'research', 'from': ['coder'], 'to': ['charts'], 'message': 'plot it'},
+        # Only the output node's text is streamed as tokens
+        {'type': 'node_stop', 'node': 'research', 'parent': None, 'status': 'completed', 'execution_time_ms': 12},
+        {'type': 'token', 'node': 'output', 'data': '<p>Hi'},
+        {'type': 'token', 'node': 'output', 'data': '</p>'},
+    ]
+
+
+def test_stream_graph_ends_with_the_result():
+    result = _graph_result(COMPLETED, output=_node_result(result='<p>Hi</p>'))
+    seen = []
+    events = _collect(stream_graph(FakeGraph(*RUN, {'type': 'multiagent_result', 'result': result}), 'task',
+                                   on_result=seen.append))
+    assert events[-1] == {'type': 'result', 'status': 'completed', 'html': '<p>Hi</p>', 'execution_time_ms': 34}
+    assert seen == [result]
+
+
+@pytest.mark.parametrize('events, status', [
+    ([{'type': 'multiagent_result', 'result': _graph_result(FAILED, research=_node_result(FAILED))}], 'failed'),
+    ([], 'failed'),
+])
+def test_stream_graph_reports_a_missing_answer(events, status):
+    final = _collect(stream_graph(FakeGraph(*events), 'task'))[-1]
+    assert final['type'] == 'result' and final['status'] == status
+    assert final['html'] is None and 'without' in final['error']
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, 'get_result_cache', lambda: None)
+    return TestClient(main.app)
+
+
+def _use_graph(monkeypatch, graph):
+    async def prepare(user_input, research_mode=None, **kwargs):
+        return graph, None
+    monkeypatch.setattr(graph_factory, 'prepare_research_graph', prepare)
+
+
+def test_sse_stream(client, monkeypatch):
+    result = _graph_result(COMPLETED, output=_node_result(result='<p>Hi</p>'))
+    _use_graph(monkeypatch, FakeGraph(*RUN, {'type': 'multiagent_result', 'result': result}))
+    response = client.post('/invocations', json={'prompt': 'Research AAPL', 'stream': True, 'full_graph': True})
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = [json.loads(line[len('data: '):]) for line in response.text.splitlines() if line.startswith('data: ')]
+    assert [event['type'] for event in events] == ['node_start', 'tool_call', 'tool_result', 'handoff', 'node_stop',
+                                                    'token', 'token', 'result']
+    assert events[-1]['html'] == '<p>Hi</p>'
+
+
+def test_blocking_answer_without_output_is_an_error(client, monkeypatch):
+    result = _graph_result(FAILED, research=_node_result(FAILED))
+    _use_graph(monkeypatch, FakeGraph({'type': 'multiagent_result', 'result': result}))
+    response = client.post('/invocations', json={'prompt': 'Research AAPL', 'full_graph': True})
+    assert response.status_code == 502
+    assert response.json() == {'error': 'The research graph ended without an answer (status: failed)'}
@@ -0,0 +1,85 @@
+import asyncio
+import copy
+from types import SimpleNamespace
+
+from aws_runtime.token_budget import ContextBudget, compact_tool_results, estimate_tokens
+
+
+def _conversation(turns=10, result_chars=8000):
+    """The task, then ``turns`` tool call/result pairs with ``result_chars`` characters of result each."""
+    messages = [{'role': 'user', 'content': [{'text': 'Task: compare AAPL and MSFT'}]}]
+    for turn in range(turns):
+        messages.append({'role': 'assistant', 'content': [
+            {'toolUse': {'toolUseId': f't{turn}', 'name': 'get_stock_data', 'input': {'symbol': 'AAPL'}}}]})
+        messages.append({'role': 'user', 'content': [
+            {'toolResult': {'toolUseId': f't{turn}', 'status': 'success',
+                            'content': [{'text': str(turn) * result_chars}]}}]})
+    return messages
+
+
+class StubSummarizer:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.prompts = []
+
+    async def invoke_async(self, prompt):
+        self.prompts.append(prompt)
+        if self.fail:
+            raise RuntimeError('throttled')
+        return 'Fetched AAPL prices eight times.'
+
+
+def _enforce(messages, summarizer=None, **options):
+    agent = SimpleNamespace(name='coder', system_prompt='You write code.', messages=messages)
+    hook = ContextBudget(summarizer_factory=(lambda: summarizer) if summarizer else None, keep_recent=4, **options)
+    asyncio.run(hook._enforce(SimpleNamespace(agent=agent)))
+    return agent.messages
+
+
+def test_compact_tool_results_cuts_only_older_turns():
+    messages = _conversation()
+    original = copy.deepcopy(messages)
+    first_result = messages[2]['content'][0]['toolResult']
+    assert compact_tool_results(messages, keep_recent=4, max_chars=100) == 8
+    assert messages[0] == original[0]
+    assert messages[-4:] == original[-4:]
+    for message in messages[2:-4:2]:
+        text = message['content'][0]['toolResult']['content'][0]['text']
+        assert len(text) == 100 and text.endswith('characters trimmed to fit the context budget]')
+    # The old result objects (maybe still held by a cache or a trace) are not modified
+    assert first_result['content'][0]['text'] == '0' * 8000
+
+
+def test_within_budget_nothing_changes():
+    messages = _conversation()
+    assert _enforce(copy.deepcopy(messages), StubSummarizer(), budget=30000) == messages
+
+
+def test_trimming_alone_brings_the_prompt_within_budget():
+    summarizer = StubSummarizer()
+    messages = _conversation()
+    compacted = _enforce(copy.deepcopy(messages), summarizer, budget=10000)
+    assert estimate_tokens('You write code.') + estimate_tokens(compacted) <= 10000
+    assert len(compacted) == len(messages) and compacted[-4:] == messages[-4:]
+    assert summarizer.prompts == []
+
+
+def test_summary_keeps_the_task_and_the_newest_turns_within_the_agent_budget():
+    summarizer = StubSummarizer()
+    messages = _conversation()
+    compacted = _enforce(copy.deepcopy(messages), summarizer, budget=100000, budgets={'coder': 6000})
+    assert estimate_tokens('You write code.') + estimate_tokens(compacted) <= 6000
+    assert len(summarizer.prompts) == 1 and 'tool call get_stock_data' in summarizer.prompts[0]
+    assert compacted[0]['content'] == messages[0]['content'] + [
+        {'text': 'Summary of your work on this task so far:\nFetched AAPL prices eight times.'}]
+    # The newest turns stay as they were, starting with a whole tool call/result pair
+    assert compacted[1:] == messages[-4:]
+    assert compacted[1]['role'] == 'assistant'
+
+
+def test_failed_summary_keeps_the_trimmed_history():
+    messages = _conversation()
+    compacted = _enforce(copy.deepcopy(messages), StubSummarizer(fail=True), budget=6000)
+    assert len(compacted) == len(messages)
+    assert compacted[-4:] == messages[-4:]
+    assert estimate_tokens(compacted) < estimate_tokens(messages)
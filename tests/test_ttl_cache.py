@@ -0,0 +1,112 @@
+import threading
+import types
+
+import pytest
+
+from aws_tools import all_tools, ttl_cache
+from aws_tools.ttl_cache import SQLiteCacheTier, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock the cache reads instead of the real one; advance it with ``clock.now += seconds``."""
+    fake = types.SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(ttl_cache, 'time', types.SimpleNamespace(monotonic=lambda: fake.now, time=lambda: fake.now))
+    return fake
+
+
+class CountingLoader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, value='value'):
+        self.calls += 1
+        return {'value': value, 'call': self.calls}
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache, loader = TTLCache(), CountingLoader()
+    assert cache.get_or_load('k', loader, ttl=60)['call'] == 1
+    clock.now += 59
+    assert cache.get_or_load('k', loader, ttl=60)['call'] == 1
+    clock.now += 2
+    assert cache.get_or_load('k', loader, ttl=60)['call'] == 2
+
+
+def test_each_endpoint_has_its_own_ttl(monkeypatch, clock):
+    calls = []
+    client = types.SimpleNamespace(get_json=lambda path: calls.append(path) or {'path': path})
+    monkeypatch.setattr(all_tools, 'market_cache', TTLCache())
+    monkeypatch.setattr(all_tools, 'get_market_client', lambda: client)
+    monkeypatch.setitem(all_tools.MARKET_CACHE_TTLS, 'news', 300)
+    monkeypatch.setitem(all_tools.MARKET_CACHE_TTLS, 'stock', 21600)
+    for endpoint in ('news', 'stock'):
+        all_tools._fetch_json(endpoint, 'aapl', 'failed')
+    clock.now += 301
+    for endpoint in ('news', 'stock'):
+        all_tools._fetch_json(endpoint, 'AAPL', 'failed')
+    assert calls == ['/news/AAPL', '/stock/AAPL', '/news/AAPL']
+
+
+def test_concurrent_misses_make_one_fetch():
+    cache, release = TTLCache(), threading.Event()
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        release.wait(5)
+        return {'value': 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', slow_loader, 60)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 7:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{'value': 1}] * 8
+
+
+def test_a_failed_load_reaches_every_waiter_and_is_not_cached():
+    cache = TTLCache()
+
+    def failing():
+        raise ValueError('down')
+
+    with pytest.raises(ValueError):
+        cache.get_or_load('k', failing, 60)
+    assert cache.get_or_load('k', lambda: {'value': 2}, 60) == {'value': 2}
+    assert cache.stats()['load_errors'] == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    # Each entry serialises to 8 bytes, so three fit
+    cache = TTLCache(max_bytes=24)
+    for key in 'abc':
+        cache.get_or_load(key, lambda: {'v': 1}, 60)
+    cache.get_or_load('a', lambda: {'v': 2}, 60)
+    cache.get_or_load('d', lambda: {'v': 1}, 60)
+    loader = CountingLoader()
+    cache.get_or_load('a', loader, 60)
+    cache.get_or_load('c', loader, 60)
+    assert loader.calls == 0
+    cache.get_or_load('b', loader, 60)
+    assert loader.calls == 1
+    assert cache.stats()['evictions'] >= 1
+
+
+def test_sqlite_tier_is_shared_and_expires(tmp_path, clock):
+    path = str(tmp_path / 'cache.db')
+    first, second = TTLCache(disk_tier=SQLiteCacheTier(path)), TTLCache(disk_tier=SQLiteCacheTier(path))
+    loader = CountingLoader()
+    first.get_or_load('k', loader, 60)
+    clock.now += 30
+    assert second.get_or_load('k', loader, 60) == {'value': 'value', 'call': 1}
+    assert second.stats()['disk_hits'] == 1
+    # The memory tier keeps the disk entry's remaining lifetime, not a fresh TTL
+    clock.now += 31
+    assert second.get_or_load('k', loader, 60)['call'] == 2